@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query, status
+from typing import List, Optional
+
+from fastapi import APIRouter, Body, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from fastapi_versioning import versioned_api_route
 
 from cells import CellFetcher
-from cells.models import NearbyCellTower
+from cells.models import CellIdentity, NearbyCellTower, OfflineCellsInfo
+from cells.offline import OfflineCellIndex
 from settings import CellLocationSettings
 
 
@@ -31,9 +35,56 @@ async def fetch_cell_coordinate(
     return cell
 
 
+@cells_router_v1.post("/coordinates", status_code=status.HTTP_200_OK)
+async def fetch_cells_coordinates(
+    cells: List[CellIdentity] = Body(..., description="Cells to locate")
+) -> StreamingResponse:
+    """
+    Locate many cells in one request, e.g. the serving and neighbor cells of a modem. Returns a newline-delimited
+    JSON stream with one line for each cell, cached cells first and the others as they are resolved, location is
+    null for cells that could not be located.
+    """
+    async def lines():
+        async for coordinate in cell_fetcher.fetch_cells(cell.key() for cell in cells):
+            yield coordinate.model_dump_json() + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @cells_router_v1.get("/nearby", status_code=status.HTTP_200_OK)
 async def fetch_nearby_cells(
     lat: float = Query(..., description="Latitude"),
     lon: float = Query(..., description="Longitude"),
 ) -> list[NearbyCellTower]:
     return await cell_fetcher.fetch_nearby_cells(lat, lon)
+
+
+@cells_router_v1.get("/offline", status_code=status.HTTP_200_OK)
+async def fetch_offline_cells_info() -> OfflineCellsInfo:
+    return OfflineCellIndex().info()
+
+
+@cells_router_v1.put("/offline", status_code=status.HTTP_200_OK)
+async def import_offline_cells(
+    request: Request,
+    mcc: Optional[List[int]] = Query(None, description="Only import cells of these countries"),
+) -> OfflineCellsInfo:
+    """
+    Import an OpenCelliD CSV dump, gzip compressed or not, sent as the request body. It replaces the current offline
+    cell dataset, which is used to locate cells before OpenCelliD.
+    """
+    try:
+        await OfflineCellIndex().import_dataset(request.stream(), mcc)
+    except RuntimeError as error:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(error)) from error
+    except Exception as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+
+    return OfflineCellIndex().info()
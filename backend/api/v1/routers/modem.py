@@ -1,25 +1,36 @@
+import time
 from functools import wraps
-from typing import Any, Callable, Tuple
+from typing import Any, Callable, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException, Body, Query, status
+from fastapi import APIRouter, HTTPException, Body, Header, Query, status
+from fastapi.responses import StreamingResponse
 from fastapi_versioning import versioned_api_route
 
 from modem import Modem
 from modem.exceptions import ATConnectionTimeout, InvalidModemDevice, InexistentModemPosition
 from modem.models import (
+    ATPortQueueStats,
+    DataUsageBucket,
+    DataUsageHistory,
     ModemCellInfo,
     ModemClockDetails,
     ModemDevice,
     ModemDeviceDetails,
     ModemPosition,
+    ModemSignalHistory,
     ModemSignalQuality,
+    ModemStatus,
     ModemFunctionality,
+    ModemRegistration,
     ModemSIMStatus,
     OperatorInfo,
     PDPContext,
     PDPAuthentication,
     USBNetMode,
 )
+from modem.sampler import SAMPLE_INTERVAL, ModemSignalSampler
+from modem.status import STATUS_FIELDS, ModemStatusMonitor
+from modem.stream import ModemStatusStreams, StreamFormat
 from settings import DataUsageSettings, DataUsageControlSettings
 
 
@@ -80,6 +91,53 @@ async def fetch_by_id(modem_id: str) -> ModemDeviceDetails:
     return await modem.get_mt_info()
 
 
+@modem_router_v1.get("/{modem_id}/status", status_code=status.HTTP_200_OK)
+@modem_to_http_exception
+async def fetch_status_by_id(
+    modem_id: str,
+    fields: Optional[str] = Query(
+        None, description=f"Comma separated fields, all if not given: {', '.join(STATUS_FIELDS)}"
+    ),
+) -> ModemStatus:
+    """
+    Get a snapshot of the status of a modem by modem id, kept fresh by a single background task, with the age of
+    each field. Serving it does not access the modem.
+    """
+    modem = Modem.get_device(modem_id)
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    try:
+        return await ModemStatusMonitor().status(modem, requested)
+    except ValueError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)) from error
+
+
+@modem_router_v1.get("/{modem_id}/stream", status_code=status.HTTP_200_OK)
+@modem_to_http_exception
+async def stream_status_by_id(
+    modem_id: str,
+    since: Optional[int] = Query(None, description="Resume after this sequence number instead of a snapshot"),
+    stream_format: StreamFormat = Query(StreamFormat.NDJSON, alias="format", description="ndjson or sse"),
+    last_event_id: Optional[int] = Header(None, description="SSE resume, same as since"),
+) -> StreamingResponse:
+    """
+    Stream status changes of a modem by modem id. Starts with a snapshot of all streamed fields, followed by a delta
+    event with the changed field each time one changes, all numbered with a sequence number.
+    """
+    modem = Modem.get_device(modem_id)
+
+    media_type = "text/event-stream" if stream_format == StreamFormat.SSE else "application/x-ndjson"
+    return StreamingResponse(
+        ModemStatusStreams().subscribe(modem.id, since if since is not None else last_event_id, stream_format),
+        media_type=media_type,
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @modem_router_v1.get("/{modem_id}/signal", status_code=status.HTTP_200_OK)
 @modem_to_http_exception
 async def fetch_signal_strength_by_id(modem_id: str) -> ModemSignalQuality:
@@ -91,6 +149,22 @@ async def fetch_signal_strength_by_id(modem_id: str) -> ModemSignalQuality:
     return await modem.get_signal_strength()
 
 
+@modem_router_v1.get("/{modem_id}/signal/history", status_code=status.HTTP_200_OK)
+@modem_to_http_exception
+async def fetch_signal_history_by_id(
+    modem_id: str,
+    since: Optional[float] = Query(None, description="Only samples taken after this time, in seconds since epoch"),
+    resolution: float = Query(SAMPLE_INTERVAL, gt=0, description="Bucket size in seconds"),
+) -> ModemSignalHistory:
+    """
+    Get signal strength and serving cell history of a modem by modem id, sampled in background and downsampled to
+    min, max and mean in buckets of resolution seconds.
+    """
+    modem = Modem.get_device(modem_id)
+
+    return ModemSignalSampler().history(modem.id, since, resolution)
+
+
 @modem_router_v1.get("/{modem_id}/cell", status_code=status.HTTP_200_OK)
 @modem_to_http_exception
 async def fetch_serving_cell_info_by_id(modem_id: str) -> ModemCellInfo:
@@ -113,6 +187,17 @@ async def fetch_functionality_by_id(modem_id: str) -> ModemFunctionality:
     return await modem.get_functionality()
 
 
+@modem_router_v1.get("/{modem_id}/queue", status_code=status.HTTP_200_OK)
+@modem_to_http_exception
+async def fetch_at_queue_stats_by_id(modem_id: str) -> list[ATPortQueueStats]:
+    """
+    Get AT command queue depth and wait times by priority class for each AT port of a modem by modem id.
+    """
+    modem = Modem.get_device(modem_id)
+
+    return modem.get_at_queue_stats()
+
+
 @modem_router_v1.post("/{modem_id}/commander", status_code=status.HTTP_200_OK)
 @modem_to_http_exception
 async def command_by_id(
@@ -245,6 +330,17 @@ async def fetch_operator_info_by_id(modem_id: str) -> OperatorInfo:
     return await modem.get_operator_info()
 
 
+@modem_router_v1.get("/{modem_id}/registration", status_code=status.HTTP_200_OK)
+@modem_to_http_exception
+async def fetch_registration_by_id(modem_id: str) -> ModemRegistration:
+    """
+    Get network registration of a modem by modem id, kept up to date by the modem unsolicited result codes.
+    """
+    modem = Modem.get_device(modem_id)
+
+    return await modem.get_registration()
+
+
 @modem_router_v1.put("/{modem_id}/pdp/{profile}/apn/{apn}", status_code=status.HTTP_204_NO_CONTENT)
 @modem_to_http_exception
 async def set_apn_by_profile_by_id(modem_id: str, profile: int, apn: str) -> None:
@@ -282,6 +378,25 @@ async def fetch_data_usage_by_id(modem_id: str) -> DataUsageSettings:
     return await modem.get_data_usage_details()
 
 
+@modem_router_v1.get("/{modem_id}/usage/history", status_code=status.HTTP_200_OK)
+@modem_to_http_exception
+async def fetch_data_usage_history_by_id(
+    modem_id: str,
+    start: Optional[float] = Query(None, alias="from", description="Seconds since epoch, default is 30 days before to"),
+    end: Optional[float] = Query(None, alias="to", description="Seconds since epoch, default is now"),
+    bucket: DataUsageBucket = Query(DataUsageBucket.DAY, description="raw, hour or day"),
+) -> DataUsageHistory:
+    """
+    Get data received and transmitted by a modem by modem id, in hourly or daily buckets or between each read of
+    the modem counters.
+    """
+    modem = Modem.get_device(modem_id)
+
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 30 * 24 * 3600
+    return await modem.get_data_usage_history(start, end, bucket)
+
+
 @modem_router_v1.put("/{modem_id}/usage/control", status_code=status.HTTP_200_OK)
 async def set_data_usage_control_by_id(
     modem_id: str,
@@ -1,5 +1,6 @@
 import argparse
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass
@@ -7,6 +8,8 @@ class CommandLineArgs:
     debug: bool
     host: str
     port: int
+    simulator: Optional[str]
+    record_at: Optional[str]
 
     @staticmethod
     def from_args() -> "CommandLineArgs":
@@ -15,8 +18,27 @@ class CommandLineArgs:
         parser.add_argument("--debug", action="store_true", default=False, help="Enable debug mode")
         parser.add_argument("--host", type=str, default="0.0.0.0", help="Host to server Modem Manager extension on")
         parser.add_argument("--port", type=int, default=20038, help="Port to server Modem Manager extension on")
+        parser.add_argument(
+            "--simulator",
+            type=str,
+            choices=["EG25-G", "EC25"],
+            default=None,
+            help="Attach a simulated modem of the given product, for development without hardware",
+        )
+        parser.add_argument(
+            "--record-at",
+            type=str,
+            default=None,
+            help="Folder where a binary transcript of the bytes written and read on each AT port is recorded",
+        )
 
         args = parser.parse_args()
-        client_args = CommandLineArgs(debug=args.debug, host=args.host, port=args.port)
+        client_args = CommandLineArgs(
+            debug=args.debug,
+            host=args.host,
+            port=args.port,
+            simulator=args.simulator,
+            record_at=args.record_at,
+        )
 
         return client_args
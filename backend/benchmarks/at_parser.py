@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of AT response framing and parsing, legacy string scanning parser against the line framer.
+
+Run from backend folder: python -m benchmarks.at_parser
+"""
+import timeit
+from typing import List, Optional
+
+from benchmarks.captures import CGDCONT, COPS, QENG_NEIGHBOURCELL, QENG_SERVINGCELL, chunked
+from modem.at import ATResultCode, final_result_code
+from modem.framer import ATLineFramer, split_fields
+
+
+def legacy_parse(chunks: List[bytes], cmd_id_response: Optional[str]) -> Optional[List[List[str]]]:
+    """Parser as it was before the line framer, each poll appends to a str and re-scans all of it"""
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk.decode("ascii")
+        if ATResultCode.ERROR.value in buffer:
+            raise ValueError("Error found in response")
+        if any(code.value in buffer for code in ATResultCode):
+            if cmd_id_response is None or cmd_id_response in buffer:
+                break
+
+    parts = [part for part in buffer.splitlines() if part]
+    return [
+        [
+            piece if piece != '-' else None
+            for piece in part
+                .replace(f'{cmd_id_response}: ', f'{cmd_id_response}:')
+                .split(f'{cmd_id_response}:')[1]
+                .replace('"', '')
+                .split(',')
+        ]
+        for part in parts
+        if cmd_id_response in part
+    ]
+
+
+def framed_parse(chunks: List[bytes], cmd_id_response: str) -> List[List[Optional[str]]]:
+    framer = ATLineFramer()
+    prefix = f"{cmd_id_response}:"
+    data = []
+    for chunk in chunks:
+        for line in framer.feed(chunk):
+            if final_result_code(line) is not None:
+                return data
+            if line.startswith(prefix):
+                data.append(split_fields(line, len(prefix)))
+    return data
+
+
+CASES = [
+    ("QENG servingcell", QENG_SERVINGCELL, "+QENG"),
+    ("QENG neighbourcell", QENG_NEIGHBOURCELL, "+QENG"),
+    ("CGDCONT", CGDCONT, "+CGDCONT"),
+    ("COPS", COPS, "+COPS"),
+]
+
+
+def main() -> None:
+    number = 20000
+    print(f"{'case':<20}{'legacy us':>12}{'framed us':>12}{'speedup':>10}")
+    for name, response, cmd_id in CASES:
+        chunks = chunked(response)
+        assert legacy_parse(chunks, cmd_id) == framed_parse(chunks, cmd_id), f"Parsers disagree on {name}"
+
+        legacy = timeit.timeit(lambda: legacy_parse(chunks, cmd_id), number=number) / number * 1e6
+        framed = timeit.timeit(lambda: framed_parse(chunks, cmd_id), number=number) / number * 1e6
+        print(f"{name:<20}{legacy:>12.2f}{framed:>12.2f}{legacy / framed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
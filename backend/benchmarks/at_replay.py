@@ -0,0 +1,89 @@
+"""
+Replays a recorded AT transcript through the AT stack, at the recorded speed and without delays, to turn latency
+traces of real modems into regression benchmarks. The transcript must record N rounds of get_signal_strength
+followed by get_cell_info, as the one recorded from the simulator when no transcript is given.
+
+Run from backend folder: python -m benchmarks.at_replay [transcript.attr]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from serial.tools.list_ports_linux import SysFS
+
+from modem import ATCommander, LTEEG25G, Modem
+from modem.discovery import ATPortIndex
+from modem.latency import ATLatencyTracker
+from modem.transcript import ATDirection, ATReplayTransport, read_transcript
+from simulator import QuectelSimulator, SimulatorConfig
+
+ROUNDS = 50
+
+
+def report(name: str, durations: List[float]) -> None:
+    print(f"{name:<12}{sum(durations) / len(durations) * 1e3:>12.2f}{max(durations) * 1e3:>12.2f}")
+
+
+async def run_rounds(modem: Modem) -> List[float]:
+    durations = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await modem.get_signal_strength()
+        await modem.get_cell_info()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def rounds_in(transcript: Path) -> int:
+    _, _, records = read_transcript(transcript)
+    return sum(1 for _, direction, payload in records if direction == ATDirection.TX and payload.startswith(b"AT+CSQ"))
+
+
+async def record(folder: Path) -> Tuple[Path, List[float]]:
+    config = SimulatorConfig(
+        latency=0.01,
+        command_latency={'AT+QENG="servingcell"': 0.03, 'AT+QENG="neighbourcell"': 0.06},
+    )
+    with QuectelSimulator(config) as simulator:
+        modem = next(modem for modem in Modem.connected_devices() if modem.device == simulator.device)
+        ATCommander.record_transcripts(folder)
+        durations = await run_rounds(modem)
+        ATCommander.record_transcripts(None)
+
+    # Every AT port of the modem gets a transcript, the replay needs the one of the port that served the rounds
+    transcript = max(folder.glob("*.attr"), key=rounds_in)
+    if rounds_in(transcript) != ROUNDS:
+        raise RuntimeError(f"Rounds were split between AT ports, {transcript.name} has {rounds_in(transcript)}")
+    return transcript, durations
+
+
+async def replay(transcript: Path, speed: float) -> List[float]:
+    port = f"replay:{transcript}"
+    ATCommander.set_transport(port, lambda: ATReplayTransport(transcript, speed))
+    try:
+        return await run_rounds(LTEEG25G(port, [SysFS(port)]))
+    finally:
+        ATCommander.set_transport(port, None)
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        # Keep learned timeouts and discovered ports of the benchmark out of the service settings
+        ATPortIndex(Path(folder) / "at_ports.json")
+        ATLatencyTracker(Path(folder) / "at_latency.json")
+
+        print(f"{'run':<12}{'round ms':>12}{'max ms':>12}")
+        if len(sys.argv) > 1:
+            transcript = Path(sys.argv[1])
+        else:
+            transcript, durations = await record(Path(folder))
+            report("recorded", durations)
+        report("replay 1x", await replay(transcript, 1.0))
+        report("no delay", await replay(transcript, 0.0))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
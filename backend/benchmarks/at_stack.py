@@ -0,0 +1,46 @@
+"""
+End to end benchmark of the AT stack against the simulated modem, measures the overhead the stack adds on top of
+the modem latency for the calls the service makes most.
+
+Run from backend folder: python -m benchmarks.at_stack
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from modem import Modem
+from modem.discovery import ATPortIndex
+from modem.latency import ATLatencyTracker
+from simulator import QuectelSimulator, SimulatorConfig
+
+LATENCY = 0.002
+
+
+async def measure(name: str, call: Callable[[], Awaitable[Any]], commands: int, number: int = 200) -> None:
+    await call()
+    started = time.perf_counter()
+    for _ in range(number):
+        await call()
+    elapsed = (time.perf_counter() - started) / number
+    overhead = elapsed - commands * LATENCY
+    print(f"{name:<20}{elapsed * 1e3:>12.2f}{overhead * 1e3:>14.2f}")
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as folder, QuectelSimulator(SimulatorConfig(latency=LATENCY)) as simulator:
+        # Keep learned timeouts and discovered ports of the benchmark out of the service settings
+        ATPortIndex(Path(folder) / "at_ports.json")
+        ATLatencyTracker(Path(folder) / "at_latency.json")
+
+        modem = next(modem for modem in Modem.connected_devices() if modem.device == simulator.device)
+        print(f"{'call':<20}{'total ms':>12}{'overhead ms':>14}")
+        await measure("get_signal_strength", modem.get_signal_strength, 1)
+        await measure("get_cell_info", modem.get_cell_info, 2)
+        await measure("get_mt_info", modem.get_mt_info, 5)
+        await measure("get_data_usage", modem.get_data_usage, 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+# Captured AT responses from EG25-G / EC25 modems, used by benchmarks to feed the AT stack with realistic data.
+# Identifiers were replaced by fake ones.
+
+QENG_SERVINGCELL = (
+    '\r\n+QENG: "servingcell","NOCONN","LTE","FDD",724,05,1A2B30C,264,1650,3,5,5,4F2B,-97,-11,-64,13,34\r\n'
+    '\r\nOK\r\n'
+)
+
+QENG_NEIGHBOURCELL = (
+    '\r\n+QENG: "neighbourcell intra","LTE",1650,264,-11,-97,-64,13,34,6,8,4,62\r\n'
+    '+QENG: "neighbourcell intra","LTE",1650,118,-15,-104,-71,2,21,6,8,4,62\r\n'
+    '+QENG: "neighbourcell intra","LTE",1650,402,-18,-109,-75,-3,16,6,8,4,62\r\n'
+    '+QENG: "neighbourcell inter","LTE",3050,87,-12,-95,-66,9,36,4,10,5\r\n'
+    '+QENG: "neighbourcell inter","LTE",3050,311,-16,-102,-70,1,29,4,10,5\r\n'
+    '+QENG: "neighbourcell inter","LTE",9410,20,-19,-112,-80,-5,13,2,12,6\r\n'
+    '+QENG: "neighbourcell","WCDMA",10713,1,22,91,-93,-55,0\r\n'
+    '+QENG: "neighbourcell","GSM",512,3,-,-,-,-,-,48,4\r\n'
+    '\r\nOK\r\n'
+)
+
+CGDCONT = (
+    '\r\n+CGDCONT: 1,"IP","zap.vivo.com.br","0.0.0.0",0,0,0,0\r\n'
+    '+CGDCONT: 2,"IPV4V6","ims","0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0",0,0,0,0\r\n'
+    '+CGDCONT: 3,"IPV4V6","SOS","0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0",0,0,0,1\r\n'
+    '\r\nOK\r\n'
+)
+
+COPS = '\r\n+COPS: 0,0,"VIVO",7\r\n\r\nOK\r\n'
+
+CSQ = '\r\n+CSQ: 22,99\r\n\r\nOK\r\n'
+
+ATI = '\r\nQuectel\r\nEG25\r\nRevision: EG25GGBR07A08M2G\r\n\r\nOK\r\n'
+
+
+# Generated responses, not captured from a modem. Rows follow the format of the captures above with made up values,
+# so they exercise the parser with more rows than we have captured but say nothing about real traffic.
+
+# As a dense urban site would answer, 24 neighbours over LTE intra/inter frequency, WCDMA and GSM
+QENG_NEIGHBOURCELL_DENSE = (
+    '\r\n+QENG: "neighbourcell intra","LTE",1650,165,-10,-102,-75,-4,12,6,8,4,62\r\n'
+    '+QENG: "neighbourcell intra","LTE",1650,420,-16,-93,-66,13,11,6,8,4,62\r\n'
+    '+QENG: "neighbourcell intra","LTE",1650,465,-16,-96,-56,-3,23,6,8,4,62\r\n'
+    '+QENG: "neighbourcell intra","LTE",1650,214,-9,-97,-57,12,23,6,8,4,62\r\n'
+    '+QENG: "neighbourcell intra","LTE",1650,30,-17,-93,-85,2,30,6,8,4,62\r\n'
+    '+QENG: "neighbourcell intra","LTE",1650,321,-17,-120,-56,13,28,6,8,4,62\r\n'
+    '+QENG: "neighbourcell intra","LTE",1650,203,-8,-97,-56,12,37,6,8,4,62\r\n'
+    '+QENG: "neighbourcell intra","LTE",1650,68,-12,-103,-59,12,13,6,8,4,62\r\n'
+    '+QENG: "neighbourcell inter","LTE",3050,292,-12,-107,-81,16,15,4,10,5\r\n'
+    '+QENG: "neighbourcell inter","LTE",3050,52,-17,-108,-75,1,21,4,10,5\r\n'
+    '+QENG: "neighbourcell inter","LTE",3050,49,-16,-112,-57,13,11,4,10,5\r\n'
+    '+QENG: "neighbourcell inter","LTE",9410,316,-11,-105,-76,12,23,4,10,5\r\n'
+    '+QENG: "neighbourcell inter","LTE",9410,397,-13,-104,-73,9,21,4,10,5\r\n'
+    '+QENG: "neighbourcell inter","LTE",9410,153,-11,-115,-60,17,34,4,10,5\r\n'
+    '+QENG: "neighbourcell inter","LTE",2850,124,-9,-108,-64,11,25,4,10,5\r\n'
+    '+QENG: "neighbourcell inter","LTE",2850,448,-13,-113,-69,4,29,4,10,5\r\n'
+    '+QENG: "neighbourcell","WCDMA",10713,1,22,57,-88,-66,0\r\n'
+    '+QENG: "neighbourcell","WCDMA",10713,1,22,234,-90,-60,0\r\n'
+    '+QENG: "neighbourcell","WCDMA",10713,1,22,97,-100,-63,0\r\n'
+    '+QENG: "neighbourcell","WCDMA",10713,1,22,40,-106,-52,0\r\n'
+    '+QENG: "neighbourcell","GSM",583,5,-,-,-,-,-,40,4\r\n'
+    '+QENG: "neighbourcell","GSM",555,6,-,-,-,-,-,42,4\r\n'
+    '+QENG: "neighbourcell","GSM",588,4,-,-,-,-,-,57,4\r\n'
+    '+QENG: "neighbourcell","GSM",570,1,-,-,-,-,-,25,4\r\n'
+    '\r\nOK\r\n'
+)
+
+
+def chunked(response: str, size: int = 32) -> list[bytes]:
+    """Split a response in chunks as they would arrive from the tty"""
+    data = response.encode("ascii")
+    return [data[i:i + size] for i in range(0, len(data), size)]
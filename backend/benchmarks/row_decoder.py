@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of the conversion of +QENG neighbourcell rows to models, per row model lookup and arr_to_model as
+they were against the dispatch tables and bulk row decoders.
+The 24 rows case is a generated response, not a capture, its speedup tells how the decoders scale with rows only.
+
+Run from backend folder: python -m benchmarks.row_decoder
+"""
+import timeit
+from typing import Any, List, Optional, Type
+
+from pydantic import BaseModel
+
+from benchmarks.captures import QENG_NEIGHBOURCELL, QENG_NEIGHBOURCELL_DENSE
+from modem.adapters.quectel.models import BaseNeighborCell, parse_neighbor_cells
+from modem.framer import ATLineFramer, split_fields
+from modem.models import AccessTechnology, NeighborCellType
+
+
+def rows_of(response: str) -> List[List[Optional[str]]]:
+    framer = ATLineFramer()
+    prefix = "+QENG:"
+    return [split_fields(line, len(prefix)) for line in framer.feed(response.encode("ascii")) if line.startswith(prefix)]
+
+
+def legacy_get_model(
+    cls: Type, serving_rat: AccessTechnology, rat: AccessTechnology, cell_type: NeighborCellType
+) -> Optional[Type]:
+    """Model lookup as it was before the dispatch tables, a walk over the subclasses for each row"""
+    cell_type_str = ""
+    if cell_type == NeighborCellType.NEIGHBOUR_CELL_INTRA:
+        cell_type_str = "Intra"
+    if cell_type == NeighborCellType.NEIGHBOUR_CELL_INTER:
+        cell_type_str = "Inter"
+
+    target_name = f"{serving_rat.value}NeighborCell{cell_type_str}{rat.value}"
+    for subcls in cls.__subclasses__():
+        if subcls.__name__ == target_name:
+            return subcls
+        found = legacy_get_model(subcls, serving_rat, rat, cell_type)
+        if found:
+            return found
+    return None
+
+
+def legacy_arr_to_model(array: List[Any], model: Type) -> Any:
+    """arr_to_model as it was before the row decoders"""
+    if not issubclass(model, BaseModel):
+        raise ValueError("Model must be a subclass of pydantic.BaseModel to be expanded")
+
+    data = array + [None] * (len(model.model_fields) - len(array))
+
+    return model(**dict(zip(list(model.model_fields), data)))
+
+
+def legacy_parse(serving_rat: AccessTechnology, rows: List[List[Any]]) -> List[BaseNeighborCell]:
+    cells = []
+    for row in rows:
+        model = legacy_get_model(BaseNeighborCell, serving_rat, AccessTechnology(row[1]), NeighborCellType(row[0]))
+        if model:
+            cells.append(legacy_arr_to_model(row, model))
+    return cells
+
+
+CASES = [
+    ("8 rows captured", QENG_NEIGHBOURCELL),
+    ("24 rows generated", QENG_NEIGHBOURCELL_DENSE),
+]
+
+
+def main() -> None:
+    number = 5000
+    serving_rat = AccessTechnology.LTE
+    print(f"{'case':<20}{'legacy us':>12}{'decoder us':>12}{'speedup':>10}")
+    for name, response in CASES:
+        rows = rows_of(response)
+        assert legacy_parse(serving_rat, rows) == parse_neighbor_cells(serving_rat, rows), f"Parsers disagree on {name}"
+
+        legacy = timeit.timeit(lambda: legacy_parse(serving_rat, rows), number=number) / number * 1e6
+        decoder = timeit.timeit(lambda: parse_neighbor_cells(serving_rat, rows), number=number) / number * 1e6
+        print(f"{name:<20}{legacy:>12.2f}{decoder:>12.2f}{legacy / decoder:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
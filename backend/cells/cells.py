@@ -1,89 +1,202 @@
-from typing import Any, Dict, List, Optional, cast
+import asyncio
+import time
+from typing import AsyncGenerator, Dict, Iterable, List, Optional, Tuple
 
 import aiohttp
 
-from commonwealth.settings.manager import PydanticManager
 from commonwealth.utils.Singleton import Singleton
-
-from cells.models import NearbyCellTower, NearbyCellRadio
-from config import SERVICE_NAME
-from settings import SettingsV1, CellLocationSettings
+from loguru import logger
+
+from cells.models import CellCoordinate, NearbyCellTower, NearbyCellRadio
+from cells.offline import OfflineCellIndex
+from cells.store import CellKey, SeenCellsStore
+from settings import CellLocationSettings
+
+# Cells OpenCelliD does not know are asked again after this many seconds, doubled on each miss up to the max
+NEGATIVE_TTL = 600
+NEGATIVE_TTL_MAX = 7 * 86400
+# Cells remembered as unknown, the oldest ones are forgotten above it
+NEGATIVE_CACHE_SIZE = 10000
+# Lookups sent to OpenCelliD at once over the shared session, others wait for one of them to finish
+MAX_CONCURRENT_LOOKUPS = 4
+# Lookups running or waiting, others are answered from cache only until one finishes
+MAX_OUTSTANDING_LOOKUPS = 64
+LOOKUP_TIMEOUT = 10
+# After OpenCelliD can not be reached (e.g. vehicle without internet) lookups are skipped for this many seconds
+UNREACHABLE_BACKOFF = 30
 
 
 class CellFetcher(metaclass=Singleton):
-    _manager: PydanticManager = PydanticManager(SERVICE_NAME, SettingsV1)
-
-    @property
-    def _settings(self) -> SettingsV1:
-        return cast(SettingsV1, self._manager.settings)
+    def __init__(self) -> None:
+        # Lookups running, shared by every request for the same cell
+        self._in_flight: Dict[CellKey, asyncio.Future] = {}
+        # Unknown cells, with the time they can be asked again and the misses so far
+        self._unknown: Dict[CellKey, Tuple[float, int]] = {}
+        self._outstanding = 0
+        self._concurrent_lookups = asyncio.Semaphore(MAX_CONCURRENT_LOOKUPS)
+        self._unreachable_until = 0.0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created on first use, inside the event loop, and shared by all requests to keep connections alive
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     def add_to_cache(self, mcc: int, mnc: int, lac: int, cell_id: int, location: CellLocationSettings) -> None:
-        current: Dict = self._settings.seen_cells
-        for key in [ mcc, mnc, lac ]:
-            if key not in current:
-                current[key] = {}
-            current = current[key]
-        current[cell_id] = location
-
-        self._manager.save()
+        SeenCellsStore().put(mcc, mnc, lac, cell_id, location)
 
     def fetch_from_cache(self, mcc: int, mnc: int, lac: int, cell_id: int) -> Optional[CellLocationSettings]:
-        current: Any = self._settings.seen_cells
-        for key in [ mcc, mnc, lac, cell_id ]:
-            if current is None:
-                return None
-            current = current.get(key)
+        return SeenCellsStore().get(mcc, mnc, lac, cell_id)
+
+    def fetch_from_offline(self, mcc: int, mnc: int, lac: int, cell_id: int) -> Optional[CellLocationSettings]:
+        return OfflineCellIndex().get(mcc, mnc, lac, cell_id)
 
-        return cast(CellLocationSettings, current)
+    def fetch_local(self, mcc: int, mnc: int, lac: int, cell_id: int) -> Optional[CellLocationSettings]:
+        """Location from the seen cells or the offline dataset, without going to the network"""
+        return self.fetch_from_cache(mcc, mnc, lac, cell_id) or self.fetch_from_offline(mcc, mnc, lac, cell_id)
 
     async def fetch_from_api(self, mcc: int, mnc: int, lac: int, cell_id: int) -> Optional[CellLocationSettings]:
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"https://opencellid.org/ajax/searchCell.php?mcc={mcc}&mnc={mnc}&lac={lac}&cell_id={cell_id}"
-                ) as resp:
-                    resp.raise_for_status()
-
-                    data = await resp.json()
-
-                    return CellLocationSettings(
-                        latitude=data["lat"],
-                        longitude=data["lon"],
-                        range=data["range"]
-                    )
-        except Exception:
-            return None
+        """Location from OpenCelliD, None if it does not know the cell, raises if it can not be reached or refuses it"""
+        async with self._get_session().get(
+            f"https://opencellid.org/ajax/searchCell.php?mcc={mcc}&mnc={mnc}&lac={lac}&cell_id={cell_id}",
+            timeout=aiohttp.ClientTimeout(total=LOOKUP_TIMEOUT),
+        ) as resp:
+            # Only a missing cell is an answer, rate limiting and key problems are retried after the backoff
+            if resp.status == 404:
+                return None
+            resp.raise_for_status()
+            try:
+                data = await resp.json(content_type=None)
+                return CellLocationSettings(
+                    latitude=data["lat"],
+                    longitude=data["lon"],
+                    range=data["range"],
+                    radio=data.get("radio"),
+                )
+            except (ValueError, KeyError, TypeError):
+                return None
 
     async def fetch_nearby_from_api(self, x1: float, x2: float, y1: float, y2: float) -> List[NearbyCellTower]:
+        if time.monotonic() < self._unreachable_until:
+            return []
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"https://opencellid.org/ajax/getCells.php?bbox={x1},{y1},{x2},{y2}"
-                ) as resp:
-                    resp.raise_for_status()
-                    data = await resp.json()
-
-                    if (data["type"] == "FeatureCollection"):
-                        return [
-                            NearbyCellTower(
-                                latitude=feature["geometry"]["coordinates"][1],
-                                longitude=feature["geometry"]["coordinates"][0],
-                                range=feature["properties"]["range"],
-                                radio=NearbyCellRadio(type=feature["properties"]["radio"])
-                            ) for feature in data["features"]
-                            if (feature["geometry"]["type"] == "Point")
-                        ]
+            async with self._get_session().get(
+                f"https://opencellid.org/ajax/getCells.php?bbox={x1},{y1},{x2},{y2}",
+                timeout=aiohttp.ClientTimeout(total=LOOKUP_TIMEOUT),
+            ) as resp:
+                resp.raise_for_status()
+                data = await resp.json()
+
+                if (data["type"] == "FeatureCollection"):
+                    return [
+                        NearbyCellTower(
+                            latitude=feature["geometry"]["coordinates"][1],
+                            longitude=feature["geometry"]["coordinates"][0],
+                            range=feature["properties"]["range"],
+                            radio=NearbyCellRadio(type=feature["properties"]["radio"])
+                        ) for feature in data["features"]
+                        if (feature["geometry"]["type"] == "Point")
+                    ]
         except Exception:
             return []
+        return []
 
     async def fetch_and_add(self, mcc: int, mnc: int, lac: int, cell_id: int) -> Optional[CellLocationSettings]:
-        location: CellLocationSettings = await self.fetch_from_api(mcc, mnc, lac, cell_id)
-        if location is not None:
-            self.add_to_cache(mcc, mnc, lac, cell_id, location)
+        key = (mcc, mnc, lac, cell_id)
+        lookup = self._in_flight.get(key)
+        if lookup is None:
+            if not self._should_look_up(key):
+                return None
+            self._outstanding += 1
+            lookup = self._in_flight[key] = asyncio.ensure_future(self._look_up_and_add(key))
+            lookup.add_done_callback(lambda _: self._look_up_done(key))
+        # A request that goes away does not cancel the lookup other requests wait on
+        return await asyncio.shield(lookup)
+
+    def _should_look_up(self, key: CellKey) -> bool:
+        now = time.monotonic()
+        if now < self._unreachable_until or self._outstanding >= MAX_OUTSTANDING_LOOKUPS:
+            return False
+        unknown = self._unknown.get(key)
+        return unknown is None or now >= unknown[0]
+
+    def _look_up_done(self, key: CellKey) -> None:
+        self._in_flight.pop(key, None)
+        self._outstanding -= 1
+
+    async def _look_up_and_add(self, key: CellKey) -> Optional[CellLocationSettings]:
+        try:
+            async with self._concurrent_lookups:
+                # OpenCelliD may have been found unreachable while this lookup waited
+                if time.monotonic() < self._unreachable_until:
+                    return None
+                location = await self.fetch_from_api(*key)
+        except Exception as e:
+            self._unreachable_until = time.monotonic() + UNREACHABLE_BACKOFF
+            logger.warning(f"OpenCelliD lookup failed, skipping cell lookups for {UNREACHABLE_BACKOFF}s: {e}")
+            return None
+
+        if location is None:
+            misses = self._unknown.pop(key, (0.0, 0))[1] + 1
+            self._unknown[key] = (time.monotonic() + min(NEGATIVE_TTL * 2 ** (misses - 1), NEGATIVE_TTL_MAX), misses)
+            if len(self._unknown) > NEGATIVE_CACHE_SIZE:
+                del self._unknown[next(iter(self._unknown))]
+            return None
+
+        self._unknown.pop(key, None)
+        self.add_to_cache(*key, location)
         return location
 
     async def fetch_cell(self, mcc: int, mnc: int, lac: int, cell_id: int) -> Optional[CellLocationSettings]:
-        return self.fetch_from_cache(mcc, mnc, lac, cell_id) or await self.fetch_and_add(mcc, mnc, lac, cell_id)
+        return self.fetch_local(mcc, mnc, lac, cell_id) or await self.fetch_and_add(mcc, mnc, lac, cell_id)
+
+    async def fetch_cells(self, cells: Iterable[CellKey]) -> AsyncGenerator[CellCoordinate, None]:
+        """Locations of cells as they resolve, cached ones right away and the others as their lookups finish"""
+        lookups = []
+        for key in dict.fromkeys(cells):
+            location = self.fetch_local(*key)
+            if location is not None:
+                yield CellCoordinate.from_key(key, location)
+            else:
+                lookups.append(asyncio.ensure_future(self._fetch_keyed(key)))
+
+        try:
+            for lookup in asyncio.as_completed(lookups):
+                key, location = await lookup
+                yield CellCoordinate.from_key(key, location)
+        finally:
+            # Shared lookups keep running for their other requests, fetch_and_add shields them
+            for lookup in lookups:
+                lookup.cancel()
+
+    async def _fetch_keyed(self, key: CellKey) -> Tuple[CellKey, Optional[CellLocationSettings]]:
+        return key, await self.fetch_and_add(*key)
+
+    def fetch_nearby_from_cache(self, x1: float, x2: float, y1: float, y2: float) -> List[NearbyCellTower]:
+        return [
+            NearbyCellTower(
+                latitude=location.latitude,
+                longitude=location.longitude,
+                range=location.range,
+                radio=NearbyCellRadio(type=location.radio or "UNKNOWN"),
+            )
+            for _, location in SeenCellsStore().within(y1, y2, x1, x2)
+        ]
 
     async def fetch_nearby_cells(self, lat: float, lon: float, range: float = 0.01) -> List[NearbyCellTower]:
-        return await self.fetch_nearby_from_api(lon - range, lon + range, lat - range, lat + range)
+        # The offline dataset answers wherever it has cells, e.g. at sea without internet
+        offline = OfflineCellIndex().within(lat - range, lat + range, lon - range, lon + range)
+        if offline:
+            return offline
+
+        # Seen cells are shown also when OpenCelliD can not be reached, the ones it returns too are kept once
+        seen = self.fetch_nearby_from_cache(lon - range, lon + range, lat - range, lat + range)
+        nearby = await self.fetch_nearby_from_api(lon - range, lon + range, lat - range, lat + range)
+        known = {(round(cell.latitude, 5), round(cell.longitude, 5)) for cell in nearby}
+        return nearby + [cell for cell in seen if (round(cell.latitude, 5), round(cell.longitude, 5)) not in known]
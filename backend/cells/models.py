@@ -1,5 +1,9 @@
+from typing import Optional, Tuple
+
 from pydantic import BaseModel
 
+from settings import CellLocationSettings
+
 class NearbyCellRadio(BaseModel):
     type: str
 
@@ -8,3 +12,30 @@ class NearbyCellTower(BaseModel):
     longitude: float
     range: int
     radio: NearbyCellRadio
+
+
+class CellIdentity(BaseModel):
+    mcc: int
+    mnc: int
+    lac: int
+    cell_id: int
+
+    def key(self) -> Tuple[int, int, int, int]:
+        return (self.mcc, self.mnc, self.lac, self.cell_id)
+
+
+class CellCoordinate(CellIdentity):
+    # None when the cell location is not known
+    location: Optional[CellLocationSettings] = None
+
+    @classmethod
+    def from_key(cls, key: Tuple[int, int, int, int], location: Optional[CellLocationSettings]) -> "CellCoordinate":
+        mcc, mnc, lac, cell_id = key
+        return cls(mcc=mcc, mnc=mnc, lac=lac, cell_id=cell_id, location=location)
+
+
+class OfflineCellsInfo(BaseModel):
+    cells: int
+    # Epoch of the import, None if no dataset was imported
+    imported: Optional[float] = None
+    importing: bool = False
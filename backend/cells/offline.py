@@ -0,0 +1,340 @@
+"""
+Offline OpenCelliD dataset, for vehicles that lose internet exactly when cell positioning matters.
+
+An OpenCelliD CSV dump (cell_towers.csv.gz) or a regional extract is imported into a single file of fixed width
+records sorted by cell identity, followed by a grid index of their locations. The file is memory-mapped, opening it
+only reads its header, cells are found by binary search on their key and areas through the grid.
+
+Import from backend folder: python -m cells.offline cell_towers.csv.gz [--mcc 724 --mcc 748]
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import heapq
+import io
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import IO, AsyncIterator, BinaryIO, Collection, Iterable, Iterator, List, Optional, Tuple
+
+from commonwealth.utils.Singleton import Singleton
+from loguru import logger
+
+from cells.models import NearbyCellRadio, NearbyCellTower, OfflineCellsInfo
+from config import SETTINGS_FOLDER
+from settings import CellLocationSettings
+
+_MAGIC = b"OCIDCELL"
+_VERSION = 1
+# Magic, version, grid resolution, records, grid directory entries and import time, padded to 64 bytes
+_HEADER = struct.Struct("<8sIdQQd20x")
+# Packed cell key, latitude, longitude, range in meters and radio
+_RECORD = struct.Struct("<QffIB3x")
+# Grid cell and index of its first posting
+_GRID_ENTRY = struct.Struct("<II")
+# Record index
+_POSTING = struct.Struct("<I")
+
+# Grid cells are this many degrees wide and high
+GRID_RESOLUTION = 0.1
+_GRID_COLUMNS = round(360 / GRID_RESOLUTION)
+_GRID_ROWS = round(180 / GRID_RESOLUTION)
+# Records sorted in memory at once during import, about 15 MB, the rest of the sort goes through temporary files
+RUN_SIZE = 100000
+# Runs merged at once, each reads blocks of about 100 KB, more runs are merged in passes through intermediate runs
+MERGE_FAN_IN = 16
+
+RADIOS = ("GSM", "UMTS", "CDMA", "LTE", "NR")
+
+# Bits of each key field, mcc and mnc are 3 digits, LTE TAC 16 bits and E-UTRAN cell identity 28 bits
+_MNC_BITS, _LAC_BITS, _CELL_BITS = 10, 16, 28
+_MCC_LIMIT, _MNC_LIMIT, _LAC_LIMIT, _CELL_LIMIT = 1 << 10, 1 << _MNC_BITS, 1 << _LAC_BITS, 1 << _CELL_BITS
+
+
+def pack_key(mcc: int, mnc: int, lac: int, cell_id: int) -> Optional[int]:
+    """Cell identity packed in 64 bits, ordered as the tuple, None if it does not fit (e.g. 5G NR cells)"""
+    if not (0 <= mcc < _MCC_LIMIT and 0 <= mnc < _MNC_LIMIT and 0 <= lac < _LAC_LIMIT and 0 <= cell_id < _CELL_LIMIT):
+        return None
+    return (((mcc << _MNC_BITS | mnc) << _LAC_BITS | lac) << _CELL_BITS) | cell_id
+
+
+def grid_cell(latitude: float, longitude: float) -> int:
+    row = min(max(int((latitude + 90) / GRID_RESOLUTION), 0), _GRID_ROWS - 1)
+    column = min(max(int((longitude + 180) / GRID_RESOLUTION), 0), _GRID_COLUMNS - 1)
+    return row * _GRID_COLUMNS + column
+
+
+def _read_rows(source: Path, mccs: Optional[Collection[int]]) -> Iterator[Tuple]:
+    """Records of the CSV dump: radio,mcc,net,area,cell,unit,lon,lat,range,... gzip compressed or not"""
+    with open(source, "rb") as raw:
+        compressed = raw.read(2) == b"\x1f\x8b"
+    binary: IO[bytes] = gzip.open(source, "rb") if compressed else open(source, "rb")
+    with io.TextIOWrapper(binary, encoding="ascii", errors="replace", newline="") as text:
+        for row in csv.reader(text):
+            try:
+                radio = RADIOS.index(row[0])
+                mcc = int(row[1])
+                if mccs and mcc not in mccs:
+                    continue
+                key = pack_key(mcc, int(row[2]), int(row[3]), int(row[4]))
+                longitude, latitude = float(row[6]), float(row[7])
+                cell_range = min(max(int(row[8]), 0), 0xFFFFFFFF)
+            except (ValueError, IndexError):
+                # Header, unknown radios and malformed rows
+                continue
+            if key is not None:
+                yield key, latitude, longitude, cell_range, radio
+
+
+def _write_runs(records: Iterable[Tuple], record: struct.Struct, folder: Path) -> List[Path]:
+    """Sorted runs of at most RUN_SIZE records in temporary files, sorted by their first field"""
+    runs = []
+    chunk: List[Tuple] = []
+
+    def flush() -> None:
+        chunk.sort(key=lambda item: item[0])
+        path = folder / f"run-{len(runs)}"
+        with open(path, "wb") as file:
+            file.write(b"".join(record.pack(*item) for item in chunk))
+        runs.append(path)
+        chunk.clear()
+
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= RUN_SIZE:
+            flush()
+    if chunk:
+        flush()
+    return runs
+
+
+def _read_run(path: Path, record: struct.Struct) -> Iterator[Tuple]:
+    with open(path, "rb") as file:
+        while True:
+            block = file.read(record.size * 4096)
+            if not block:
+                return
+            yield from record.iter_unpack(block)
+
+
+def _merge_runs(runs: List[Path], record: struct.Struct, folder: Path) -> Iterator[Tuple]:
+    """Records of sorted runs in order, never opening more than MERGE_FAN_IN runs at once"""
+    generation = 0
+    while len(runs) > MERGE_FAN_IN:
+        merged = []
+        for start in range(0, len(runs), MERGE_FAN_IN):
+            group = runs[start:start + MERGE_FAN_IN]
+            path = folder / f"run-{generation}-{len(merged)}"
+            with open(path, "wb") as file:
+                for item in heapq.merge(*(_read_run(run, record) for run in group), key=lambda item: item[0]):
+                    file.write(record.pack(*item))
+            for run in group:
+                run.unlink()
+            merged.append(path)
+        runs = merged
+        generation += 1
+    return heapq.merge(*(_read_run(path, record) for path in runs), key=lambda item: item[0])
+
+
+def import_opencellid(source: Path, destination: Path, mccs: Optional[Collection[int]] = None) -> int:
+    """
+    Imports an OpenCelliD CSV dump, optionally only the given countries, into destination and returns the number of
+    cells imported. Rows are sorted through temporary files merged a few at a time, so memory and open files do not
+    depend on the dump size. The new file replaces the old one atomically once complete.
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=destination.parent) as temporary:
+        folder = Path(temporary)
+
+        # Records sorted by key, duplicated cells are kept once
+        count = 0
+        with open(folder / "records", "wb") as records:
+            previous = None
+            for item in _merge_runs(_write_runs(_read_rows(source, mccs), _RECORD, folder), _RECORD, folder):
+                if item[0] == previous:
+                    continue
+                previous = item[0]
+                records.write(_RECORD.pack(*item))
+                count += 1
+        for run in folder.glob("run-*"):
+            run.unlink()
+
+        # Grid index, record indexes sorted by grid cell with the first posting of each cell
+        entries = 0
+        locations = (
+            (grid_cell(latitude, longitude), index)
+            for index, (_, latitude, longitude, _, _) in enumerate(_read_run(folder / "records", _RECORD))
+        )
+        with open(folder / "directory", "wb") as directory, open(folder / "postings", "wb") as postings:
+            previous = None
+            sorted_locations = _merge_runs(_write_runs(locations, _GRID_ENTRY, folder), _GRID_ENTRY, folder)
+            for position, (cell, index) in enumerate(sorted_locations):
+                if cell != previous:
+                    directory.write(_GRID_ENTRY.pack(cell, position))
+                    previous = cell
+                    entries += 1
+                postings.write(_POSTING.pack(index))
+
+        temp_path = destination.with_suffix(destination.suffix + ".tmp")
+        with open(temp_path, "wb") as output:
+            output.write(_HEADER.pack(_MAGIC, _VERSION, GRID_RESOLUTION, count, entries, time.time()))
+            for section in ("records", "directory", "postings"):
+                with open(folder / section, "rb") as file:
+                    shutil.copyfileobj(file, output, 1 << 20)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temp_path, destination)
+    return count
+
+
+class OfflineCellIndex(metaclass=Singleton):
+    """Imported OpenCelliD dataset, read through mmap, empty until a dataset is imported"""
+
+    def __init__(self, file_path: Path = SETTINGS_FOLDER / "opencellid.cells") -> None:
+        self.file_path = file_path
+        self._file: Optional[BinaryIO] = None
+        self._data: Optional[mmap.mmap] = None
+        self._count = 0
+        self._entries = 0
+        self._imported: Optional[float] = None
+        self._importing = False
+        self.reload()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def reload(self) -> None:
+        self.close()
+        if not self.file_path.exists():
+            return
+        try:
+            self._file = open(self.file_path, "rb")
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, resolution, count, entries, imported = _HEADER.unpack_from(self._data)
+            expected = _HEADER.size + count * _RECORD.size + entries * _GRID_ENTRY.size + count * _POSTING.size
+            if magic != _MAGIC or version != _VERSION or resolution != GRID_RESOLUTION or len(self._data) != expected:
+                raise ValueError("unknown format")
+        except Exception as e:
+            logger.error(f"Ignoring offline cell dataset {self.file_path}: {e}")
+            self.close()
+            return
+        self._count, self._entries, self._imported = count, entries, imported
+
+    def info(self) -> OfflineCellsInfo:
+        return OfflineCellsInfo(cells=self._count, imported=self._imported, importing=self._importing)
+
+    def _record(self, index: int) -> Tuple:
+        return _RECORD.unpack_from(self._data, _HEADER.size + index * _RECORD.size)  # type: ignore
+
+    def get(self, mcc: int, mnc: int, lac: int, cell_id: int) -> Optional[CellLocationSettings]:
+        key = pack_key(mcc, mnc, lac, cell_id)
+        if key is None or not self._count:
+            return None
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self._count:
+            return None
+        found, latitude, longitude, cell_range, radio = self._record(low)
+        if found != key:
+            return None
+        return CellLocationSettings(latitude=latitude, longitude=longitude, range=cell_range, radio=RADIOS[radio])
+
+    def _grid_entry(self, index: int) -> Tuple[int, int]:
+        offset = _HEADER.size + self._count * _RECORD.size + index * _GRID_ENTRY.size
+        return _GRID_ENTRY.unpack_from(self._data, offset)  # type: ignore
+
+    def _first_entry(self, cell: int) -> int:
+        """Index of the first grid directory entry of a cell at or after cell"""
+        low, high = 0, self._entries
+        while low < high:
+            middle = (low + high) // 2
+            if self._grid_entry(middle)[0] < cell:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def within(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> List[NearbyCellTower]:
+        """Cells located inside the box"""
+        if not self._count or min_lat > max_lat or min_lon > max_lon:
+            return []
+        postings_offset = _HEADER.size + self._count * _RECORD.size + self._entries * _GRID_ENTRY.size
+        first_cell, last_cell = grid_cell(min_lat, min_lon), grid_cell(max_lat, max_lon)
+        first_column = first_cell % _GRID_COLUMNS
+        columns = last_cell % _GRID_COLUMNS - first_column
+
+        cells = []
+        # Grid cells of a row are consecutive, so are their postings
+        for row in range(first_cell // _GRID_COLUMNS, last_cell // _GRID_COLUMNS + 1):
+            start_cell = row * _GRID_COLUMNS + first_column
+            first = self._first_entry(start_cell)
+            last = self._first_entry(start_cell + columns + 1)
+            if first == last:
+                continue
+            start = self._grid_entry(first)[1]
+            end = self._grid_entry(last)[1] if last < self._entries else self._count
+            postings = self._data[  # type: ignore
+                postings_offset + start * _POSTING.size:postings_offset + end * _POSTING.size
+            ]
+            for index, in _POSTING.iter_unpack(postings):
+                _, latitude, longitude, cell_range, radio = self._record(index)
+                if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon:
+                    cells.append(
+                        NearbyCellTower(
+                            latitude=latitude,
+                            longitude=longitude,
+                            range=cell_range,
+                            radio=NearbyCellRadio(type=RADIOS[radio]),
+                        )
+                    )
+        return cells
+
+    async def import_dataset(self, chunks: AsyncIterator[bytes], mccs: Optional[Collection[int]] = None) -> None:
+        """Imports a dataset received in chunks, e.g. an upload, replacing the current one once complete"""
+        if self._importing:
+            raise RuntimeError("An offline cell dataset is already being imported")
+        self._importing = True
+        upload = self.file_path.with_suffix(".upload")
+        try:
+            with open(upload, "wb") as file:
+                async for chunk in chunks:
+                    file.write(chunk)
+            count = await asyncio.get_running_loop().run_in_executor(
+                None, import_opencellid, upload, self.file_path, mccs
+            )
+            self.reload()
+            logger.info(f"Imported {count} cells into the offline cell dataset.")
+        finally:
+            self._importing = False
+            upload.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._count, self._entries, self._imported = 0, 0, None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import an OpenCelliD CSV dump as the offline cell dataset.")
+    parser.add_argument("source", type=Path, help="OpenCelliD CSV dump, gzip compressed or not")
+    parser.add_argument("--mcc", type=int, action="append", help="Only import cells of this country, repeatable")
+    parser.add_argument("--output", type=Path, default=SETTINGS_FOLDER / "opencellid.cells", help="Dataset file")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    imported = import_opencellid(args.source, args.output, args.mcc)
+    print(f"Imported {imported} cells into {args.output} in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,155 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from commonwealth.utils.Singleton import Singleton
+from loguru import logger
+
+from config import SETTINGS_FOLDER
+from settings import CellLocationSettings
+
+# Cells kept, about 100 bytes each with their indexes, least recently seen ones are evicted above it
+MAX_SEEN_CELLS = 50000
+# Eviction removes down to this fraction of the limit, so it runs once every few thousand new cells
+EVICTION_TARGET = 0.9
+# Last seen of a cell is only written again after this many seconds, so lookups rarely write
+TOUCH_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    mcc INTEGER NOT NULL,
+    mnc INTEGER NOT NULL,
+    lac INTEGER NOT NULL,
+    cell_id INTEGER NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    range INTEGER NOT NULL,
+    radio TEXT,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (mcc, mnc, lac, cell_id)
+);
+CREATE INDEX IF NOT EXISTS cells_last_seen ON cells (last_seen);
+CREATE VIRTUAL TABLE IF NOT EXISTS cells_location USING rtree (id, min_lat, max_lat, min_lon, max_lon);
+"""
+
+# Columns added after the first version of the schema, added to existing databases on open
+_ADDED_COLUMNS = {"radio": "TEXT"}
+
+# Cell identity, mcc, mnc, lac and cell id
+CellKey = Tuple[int, int, int, int]
+
+
+class SeenCellsStore(metaclass=Singleton):
+    """
+    Locations of the cells seen by the vehicle in an SQLite database, looked up by cell identity through the primary
+    key and by area through an R*-tree. The number of cells is bounded, the least recently seen ones are evicted.
+    """
+
+    def __init__(self, file_path: Path = SETTINGS_FOLDER / "seen_cells.db", capacity: int = MAX_SEEN_CELLS) -> None:
+        self.file_path = file_path
+        self.capacity = capacity
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(file_path))
+        self._db.executescript("PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;" + _SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(cells)")}
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE cells ADD COLUMN {column} {column_type}")
+        self._count: int = self._db.execute("SELECT COUNT(*) FROM cells").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, mcc: int, mnc: int, lac: int, cell_id: int) -> Optional[CellLocationSettings]:
+        row = self._db.execute(
+            "SELECT rowid, latitude, longitude, range, radio, last_seen FROM cells "
+            "WHERE mcc = ? AND mnc = ? AND lac = ? AND cell_id = ?",
+            (mcc, mnc, lac, cell_id),
+        ).fetchone()
+        if row is None:
+            return None
+
+        rowid, latitude, longitude, cell_range, radio, last_seen = row
+        now = time.time()
+        if now - last_seen > TOUCH_INTERVAL:
+            with self._db:
+                self._db.execute("UPDATE cells SET last_seen = ? WHERE rowid = ?", (now, rowid))
+        return CellLocationSettings(latitude=latitude, longitude=longitude, range=cell_range, radio=radio)
+
+    def put(self, mcc: int, mnc: int, lac: int, cell_id: int, location: CellLocationSettings) -> None:
+        with self._db:
+            self._put((mcc, mnc, lac, cell_id), location, time.time())
+        self._evict()
+
+    def _put(self, key: CellKey, location: CellLocationSettings, last_seen: float) -> None:
+        self._db.execute(
+            "INSERT INTO cells (mcc, mnc, lac, cell_id, latitude, longitude, range, radio, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (mcc, mnc, lac, cell_id) DO UPDATE SET "
+            "latitude = excluded.latitude, longitude = excluded.longitude, range = excluded.range, "
+            "radio = COALESCE(excluded.radio, radio), last_seen = excluded.last_seen",
+            (*key, location.latitude, location.longitude, location.range, location.radio, last_seen),
+        )
+        rowid = self._db.execute(
+            "SELECT rowid FROM cells WHERE mcc = ? AND mnc = ? AND lac = ? AND cell_id = ?", key
+        ).fetchone()[0]
+        if self._db.execute("SELECT 1 FROM cells_location WHERE id = ?", (rowid,)).fetchone() is None:
+            self._count += 1
+        self._db.execute(
+            "INSERT OR REPLACE INTO cells_location VALUES (?, ?, ?, ?, ?)",
+            (rowid, location.latitude, location.latitude, location.longitude, location.longitude),
+        )
+
+    def _evict(self) -> None:
+        if self._count <= self.capacity:
+            return
+        excess = self._count - int(self.capacity * EVICTION_TARGET)
+        with self._db:
+            evicted = [
+                rowid for rowid, in self._db.execute(
+                    "SELECT rowid FROM cells ORDER BY last_seen LIMIT ?", (excess,)
+                ).fetchall()
+            ]
+            self._db.executemany("DELETE FROM cells WHERE rowid = ?", ((rowid,) for rowid in evicted))
+            self._db.executemany("DELETE FROM cells_location WHERE id = ?", ((rowid,) for rowid in evicted))
+        self._count -= len(evicted)
+        logger.info(f"Evicted {len(evicted)} least recently seen cells.")
+
+    def within(
+        self, min_lat: float, max_lat: float, min_lon: float, max_lon: float
+    ) -> List[Tuple[CellKey, CellLocationSettings]]:
+        """Cells located inside the box"""
+        rows = self._db.execute(
+            "SELECT cells.mcc, cells.mnc, cells.lac, cells.cell_id, cells.latitude, cells.longitude, cells.range, "
+            "cells.radio "
+            "FROM cells_location JOIN cells ON cells.rowid = cells_location.id "
+            "WHERE cells_location.min_lat <= ? AND cells_location.max_lat >= ? "
+            "AND cells_location.min_lon <= ? AND cells_location.max_lon >= ?",
+            (max_lat, min_lat, max_lon, min_lon),
+        ).fetchall()
+        return [
+            (
+                (mcc, mnc, lac, cell_id),
+                CellLocationSettings(latitude=latitude, longitude=longitude, range=cell_range, radio=radio),
+            )
+            for mcc, mnc, lac, cell_id, latitude, longitude, cell_range, radio in rows
+        ]
+
+    def import_nested(self, seen_cells: Dict[Any, Any]) -> int:
+        """Imports cells kept in settings before the store, nested by mcc, mnc, lac and cell id"""
+        imported = 0
+        now = time.time()
+        with self._db:
+            for mcc, networks in seen_cells.items():
+                for mnc, areas in networks.items():
+                    for lac, cells in areas.items():
+                        for cell_id, location in cells.items():
+                            key = (int(mcc), int(mnc), int(lac), int(cell_id))
+                            self._put(key, CellLocationSettings.model_validate(location), now)
+                            imported += 1
+        self._evict()
+        return imported
+
+    def close(self) -> None:
+        self._db.close()
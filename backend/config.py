@@ -1,6 +1,12 @@
 # This file is used to define general configurations for the app
+from pathlib import Path
+
+from appdirs import user_config_dir
 
 SERVICE_NAME = "cellphone-modem-manager"
 
 BLUE_OS_HOST = "blueos.internal"
 MAV_LINK_2_REST_API = f"http://{BLUE_OS_HOST}:6040/v1"
+
+# Same folder used by commonwealth PydanticManager to store the settings file, other persisted data lives here too
+SETTINGS_FOLDER = Path(user_config_dir(SERVICE_NAME))
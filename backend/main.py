@@ -1,6 +1,7 @@
 #! /usr/bin/env python3
 import asyncio
 import logging
+from pathlib import Path
 
 from loguru import logger
 from uvicorn import Config, Server
@@ -10,6 +11,8 @@ from config import SERVICE_NAME
 
 from api import application
 from manager import ModemManager
+from modem import ATCommander
+from simulator import QuectelSimulator, SimulatorConfig
 
 modem_manager = ModemManager()
 
@@ -19,6 +22,14 @@ if __name__ == "__main__":
     if args.debug:
         logging.getLogger(SERVICE_NAME).setLevel(logging.DEBUG)
 
+    if args.simulator:
+        logger.info(f"Attaching simulated {args.simulator} modem.")
+        QuectelSimulator(SimulatorConfig(product=args.simulator)).start()
+
+    if args.record_at:
+        logger.info(f"Recording AT transcripts in {args.record_at}.")
+        ATCommander.record_transcripts(Path(args.record_at))
+
     logger.info("Releasing the extension Cellphone Modem Manager.")
     loop = asyncio.new_event_loop()
 
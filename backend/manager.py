@@ -5,9 +5,19 @@ from typing import Optional
 from commonwealth.utils.Singleton import Singleton
 from loguru import logger
 
+from cells import CellFetcher
+from cells.offline import OfflineCellIndex
+from cells.store import SeenCellsStore
 from mavlink import MAVLink2Rest, MAVSeverity
-from modem import Modem
+from modem import Modem, ATCommander
+from modem.hotplug import ModemHotplugMonitor
+from modem.latency import ATLatencyTracker
 from modem.models import USBNetMode
+from modem.sampler import ModemSignalSampler
+from modem.scheduler import ATPriority, at_priority
+from modem.status import ModemStatusMonitor
+from modem.usage import DataUsageStore
+from persistence import SettingsPersistence
 
 
 class ModemManager(metaclass=Singleton):
@@ -63,30 +73,25 @@ class ModemManager(metaclass=Singleton):
                 )
 
                 # If we pass one month since last reset, we should reset the modem accumulator or if user is running
-                # and we are in the reset day
+                # and we are in the reset day, only once a day since this runs several times in it
+                current_day = current_date.strftime("%Y-%m-%d")
                 if (
                     current_date - last_reset_date > timedelta(days=31) or
                     current_date.day == modem_settings.data_usage.data_reset_day
-                ):
-                    # In case more than one point is stored, we should clear modem accumulator
-                    if len(modem_settings.data_usage.data_points) > 1:
-                        await connected_modem.reset_data_usage()
-                        modem_settings.data_usage.last_reset_date = current_date.strftime("%Y-%m-%d")
-                    # As we clear the stored data, and after one point will be added, we will keep it updating but
-                    # we will not reset the modem accumulator next call since only one point will be stored
-                    modem_settings.data_usage.data_points = {}
-
-                data_usage = await connected_modem.get_data_usage()
-                modem_settings.data_usage.data_used = data_usage
-                modem_settings.data_usage.data_points[current_date.strftime("%Y-%m-%d")] = data_usage
-                connected_modem._save_modem_settings(modem_settings)
+                ) and modem_settings.data_usage.last_reset_date != current_day:
+                    await connected_modem.reset_data_usage()
+                    modem_settings.data_usage.last_reset_date = current_day
+                    connected_modem._save_modem_settings(modem_settings)
+
+                # Usage goes to the data usage log, settings are only written when the control settings change
+                data_usage = await connected_modem.record_data_usage()
 
-                await MAVLink2Rest.send_named_float("DATA_USED", modem_settings.data_usage.total_data_used())
+                await MAVLink2Rest.send_named_float("DATA_USED", data_usage.total_data_used())
 
-                if not modem_settings.data_usage.data_control_enabled:
+                if not data_usage.data_control_enabled:
                     continue
 
-                if modem_settings.data_usage.total_data_used() > modem_settings.data_usage.data_limit:
+                if data_usage.total_data_used() > data_usage.data_limit:
                     await MAVLink2Rest.send_status_text(
                         f"Data limit reached for modem: {imei[:15]}", MAVSeverity.ALERT
                     )
@@ -114,16 +119,19 @@ class ModemManager(metaclass=Singleton):
             logger.error(f"Error getting external positioning: {e}")
 
     async def start_modem_configure_task(self) -> None:
-        while not self.stop_event.is_set():
-            await self._configure_modem()
-            await self._wait_for_or_stop(30)
+        # Background jobs should always give way to user requests on the AT ports
+        with at_priority(ATPriority.BACKGROUND):
+            while not self.stop_event.is_set():
+                await self._configure_modem()
+                await self._wait_for_or_stop(30)
 
     async def start_modem_usage_task(self) -> None:
         # Apply a shift between tasks to reduce number of concurrent lock tries
         await asyncio.sleep(15)
-        while not self.stop_event.is_set():
-            await self._get_usage_metrics()
-            await self._wait_for_or_stop(120)
+        with at_priority(ATPriority.BACKGROUND):
+            while not self.stop_event.is_set():
+                await self._get_usage_metrics()
+                await self._wait_for_or_stop(120)
 
     async def start_external_positioning_task(self) -> None:
         while not self.stop_event.is_set():
@@ -131,6 +139,9 @@ class ModemManager(metaclass=Singleton):
             await self._wait_for_or_stop(60)
 
     def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        ModemHotplugMonitor().start(loop)
+        ModemStatusMonitor().start(loop)
+        ModemSignalSampler().start()
         self.modem_configure_task = loop.create_task(self.start_modem_configure_task())
         self.modem_usage_task = loop.create_task(self.start_modem_usage_task())
         self.external_positioning_task = loop.create_task(self.start_external_positioning_task())
@@ -146,3 +157,13 @@ class ModemManager(metaclass=Singleton):
         if self.modem_usage_task:
             logger.info("Waiting for the ModemManager.modem_usage_task to finish.")
             await self.modem_usage_task
+        ModemSignalSampler().stop()
+        ModemStatusMonitor().stop()
+        ModemHotplugMonitor().stop()
+        ATCommander.close_all()
+        ATLatencyTracker().save()
+        await SettingsPersistence().flush()
+        DataUsageStore().close()
+        await CellFetcher().close()
+        SeenCellsStore().close()
+        OfflineCellIndex().close()
@@ -1,8 +1,8 @@
 from modem.modem import Modem
-from modem.at import ATCommander, ATCommand, ATDivider
+from modem.at import ATBatchCommand, ATCommander, ATCommand, ATDivider
 
 # Modem implementations
 from modem.adapters.quectel.lte_eg25_g import LTEEG25G
 from modem.adapters.quectel.lte_ec25 import LTEEC25
 
-__all__ = ["Modem", "ATCommander", "ATCommand", "ATDivider"]
+__all__ = ["Modem", "ATBatchCommand", "ATCommander", "ATCommand", "ATDivider"]
@@ -15,3 +15,8 @@ class QuectelATCommand(Enum):
     NETWORK_INFO = "AT+QNWINFO"
     TCP_PDP_CONTEXT = "AT+QIACT"
     DNS_RESOLVE = "AT+QIDNSGIP"
+    URC_CONFIG = "AT+QURCCFG"
+
+
+# Quectel unsolicited result codes, routed to subscribers instead of being taken as part of a command response
+QUECTEL_URC_PREFIXES = ("+QPING:", "+QIURC:", "+QIND:", "+QUSIM:", "+QSIMSTAT:")
@@ -1,24 +1,26 @@
 import asyncio
 import time
-from typing import Dict, Optional, Tuple, cast
+from typing import Dict, List, Optional, Tuple
 
-from modem.adapters.quectel.at import QuectelATCommand
-from modem.adapters.quectel.models import BaseServingCell, BaseNeighborCell
-from modem.at import ATCommander, ATDivider
-from modem.exceptions import ATConnectionError, ATConnectionTimeout
+from modem.adapters.quectel.at import QUECTEL_URC_PREFIXES, QuectelATCommand
+from modem.adapters.quectel.models import parse_neighbor_cells, parse_serving_cell
+from modem.at import ATBatchCommand, ATCommand, ATCommander, ATDivider, ATResultCode
+from modem.discovery import ATPortIndex
+from modem.exceptions import ATConnectionError, ATConnectionTimeout, SerialSafeReadFailed
 from modem.models import (
     AccessTechnology,
     ModemDeviceDetails,
     ModemFirmwareRevision,
     ModemCellInfo,
     ModemSIMStatus,
-    NeighborCellType,
     PDPAuthentication,
     PDPType,
     USBNetMode,
 )
 from modem.modem import Modem
-from utils import arr_to_model
+
+# USB interface numbers of the ports AT+QURCCFG="urcport" can send unsolicited result codes to, usbat by default
+URC_PORT_INTERFACES: Dict[str, int] = {"usbat": 2, "usbmodem": 3}
 
 
 class QuectelLTEBase(Modem):
@@ -26,32 +28,113 @@ class QuectelLTEBase(Modem):
     Implement base configuration for LTE_ modems of Quectel.
     """
 
-    def _detected(self) -> bool:
-        # As base it should never be detected as a modem
-        return False
-
-    async def at_commander(self, timeout: int = 20) -> ATCommander:
-        # Usually the third port is the AT port in Quectel modems, so try it first
-        ports = [self.ports[2]] + self.ports[:2] + self.ports[3:] if len(self.ports) > 3 else self.ports
+    # USB interface numbers of the AT capable ttys, independent commands are spread between them
+    at_interfaces: Tuple[int, ...] = (2, 3)
+
+    def _interface_ports(self, interfaces: Tuple[int, ...]) -> List[str]:
+        """ttys of USB interfaces, by interface number or by position when the location is unknown"""
+        ports = []
+        for position, port in enumerate(self.ports):
+            location = port.location or ""
+            interface = int(location.rsplit(".", 1)[1]) if ":" in location else position
+            if interface in interfaces:
+                ports.append(port.device)
+        return ports
+
+    def _declared_at_ports(self) -> List[str]:
+        return self._interface_ports(self.at_interfaces)
+
+    async def _urc_port(self, at_ports: List[str], adapter: str, timeout: float) -> str:
+        """AT port unsolicited result codes are sent to, as configured with AT+QURCCFG="urcport" """
+        ttys = [port.device for port in self.ports]
+        urc_port = ATPortIndex().get_urc_port(self.device, adapter, ttys)
+        if urc_port in at_ports:
+            return urc_port
+
+        interface = URC_PORT_INTERFACES["usbat"]
+        try:
+            port = ATCommander.least_loaded(at_ports)
+            with await ATCommander.borrow(port, QUECTEL_URC_PREFIXES, timeout=timeout, model=adapter) as cmd:
+                # Expected: +QURCCFG: "urcport","usbat"
+                response = await cmd.command(QuectelATCommand.URC_CONFIG, ATDivider.EQ, '"urcport"')
+                interface = URC_PORT_INTERFACES.get(response.data[0][1], interface)
+        except ATConnectionTimeout:
+            raise
+        except Exception:
+            # Modems without AT+QURCCFG send them to the default port
+            pass
 
+        ports = [port for port in self._interface_ports((interface,)) if port in at_ports]
+        if not ports:
+            return ATCommander.least_loaded(at_ports)
+        ATPortIndex().set_urc_port(self.device, adapter, ports[0])
+        return ports[0]
+
+    async def _verify_at_ports(self, ports: List[str], adapter: str) -> Tuple[Optional[ATCommander], List[str]]:
+        """Returns a session borrowed from the first port answering AT and all ports that answered"""
+        commander: Optional[ATCommander] = None
+        verified: List[str] = []
+        for port in ports:
+            if ATCommander.is_locked(port):
+                # Held by another task, we only know it answers if its session completed setup
+                if ATCommander.is_ready(port):
+                    verified.append(port)
+                continue
+            try:
+                session = await ATCommander.borrow(port, QUECTEL_URC_PREFIXES, timeout=0, model=adapter)
+            except Exception:
+                continue
+            verified.append(port)
+            if commander is None:
+                commander = session
+            else:
+                session.release()
+        return commander, verified
+
+    async def at_commander(self, urc: bool = False, timeout: int = 20) -> ATCommander:
         end_time = time.monotonic() + timeout
+        adapter = type(self).__name__
+        ttys = [port.device for port in self.ports]
+
+        # When we already know the AT ports we wait in the queue of the least loaded one instead of probing, so a
+        # long command (e.g. AT+QPING) holding one port does not hold back commands that can go to the other.
+        # Commands answered with URCs go to the URC port, the only one their URCs arrive on.
+        at_ports = ATPortIndex().get(self.device, adapter, ttys)
+        if at_ports:
+            at_port = await self._urc_port(at_ports, adapter, timeout) if urc else ATCommander.least_loaded(at_ports)
+            try:
+                return await ATCommander.borrow(at_port, QUECTEL_URC_PREFIXES, timeout=timeout, model=adapter)
+            except ATConnectionTimeout:
+                raise
+            except Exception:
+                # Handshake failed, port may have changed without a replug (e.g. after usbnet mode change)
+                ATPortIndex().forget(self.device, adapter)
+
+        # Declared AT ports are verified together so all of them are used from the start, others are a fallback
+        declared = self._declared_at_ports()
+        others = [port for port in ttys if port not in declared]
+
         while time.monotonic() < end_time:
-            for port in ports:
-                if not ATCommander.is_locked(port.device):
-                    commander = None
-                    try:
-                        commander = ATCommander(port.device)
-                        await commander.setup()
-                        return commander
-                    except Exception:
-                        if commander is not None:
-                            commander._close()
+            commander, verified = await self._verify_at_ports(declared, adapter)
+            if commander is None:
+                for port in others:
+                    commander, verified = await self._verify_at_ports([port], adapter)
+                    if commander is not None:
+                        break
+            if commander is not None:
+                ATPortIndex().set(self.device, adapter, verified, ttys)
+                if urc:
+                    # Ports are known now, the URC port is picked among them
+                    commander.release()
+                    return await self.at_commander(urc, max(1, int(end_time - time.monotonic())))
+                return commander
             await asyncio.sleep(0.1)
 
         if time.monotonic() < end_time:
             raise ATConnectionError(f"Unable to detect any AT port for device {self.device}")
         raise ATConnectionTimeout(f"Timeout reached trying to connect to device {self.device}")
 
+    @Modem.cached_identity
     @Modem.with_at_commander
     async def get_mt_info(self, cmd: ATCommander) -> ModemDeviceDetails:
         # Since this modem provides all necessary info in a single command, we can override the default.
@@ -65,26 +148,27 @@ class QuectelLTEBase(Modem):
         # Apr 16 2020 20:32:01
         # Authors: QCT
         # OK
-        response = (await cmd.get_mt_info()).data[0]
-        firmware = (await cmd.get_firmware_version_details()).data[0]
+        mt_info, firmware_info, imei_info, serial_number_info, imsi_info = await cmd.batch([
+            ATBatchCommand(ATCommand.ATI, cmd_id_response=False),
+            ATBatchCommand(ATCommand.FIRMWARE_VERSION_DETAILS, cmd_id_response=False),
+            ATBatchCommand(ATCommand.IMEI_SN, cmd_id_response=False),
+            ATBatchCommand(ATCommand.IMEI_SN, ATDivider.EQ, '0'),
+            ATBatchCommand(ATCommand.IMSI, cmd_id_response=False),
+        ])
+        for info in (mt_info, firmware_info):
+            if info.status == ATResultCode.ERROR:
+                raise SerialSafeReadFailed(f"Error found in response: {info.error}")
+        response = mt_info.data[0]
+        firmware = firmware_info.data[0]
 
         imei = None
         try:
-            imei = (await cmd.get_imei()).data[0][0]
+            imei = imei_info.data[0][0] if imei_info.data else (await cmd.get_imei()).data[0][0]
         except Exception:
             pass
 
-        serial_number = None
-        try:
-            serial_number = (await cmd.get_serial_number()).data[0][0]
-        except Exception:
-            pass
-
-        imsi = None
-        try:
-            imsi = (await cmd.get_international_mobile_subscriber_id()).data[0][0]
-        except Exception:
-            pass
+        serial_number = serial_number_info.data[0][0] if serial_number_info.data else None
+        imsi = imsi_info.data[0][0] if imsi_info.data else None
 
         return ModemDeviceDetails(
             device=self.device,
@@ -115,41 +199,44 @@ class QuectelLTEBase(Modem):
 
     @Modem.with_at_commander
     async def get_cell_info(self, cmd: ATCommander) -> ModemCellInfo:
-        serving_cell_data = (await cmd.command(QuectelATCommand.ENGINEER_MODE, ATDivider.EQ, '"servingcell"')).data[0]
+        serving_cell_info, neighbor_cells_info = await cmd.batch([
+            ATBatchCommand(QuectelATCommand.ENGINEER_MODE, ATDivider.EQ, '"servingcell"'),
+            ATBatchCommand(QuectelATCommand.ENGINEER_MODE, ATDivider.EQ, '"neighbourcell"'),
+        ])
+        if serving_cell_info.status == ATResultCode.ERROR:
+            raise SerialSafeReadFailed(f"Error found in response: {serving_cell_info.error}")
+
+        serving_cell_data = serving_cell_info.data[0]
         serving_cell_data.pop(0)  # Discard the first element, which is always 'servingcell'
 
         serving_rat = AccessTechnology(serving_cell_data[1])
-        serving_model = BaseServingCell.get_model(serving_rat)
-        if not serving_model:
+        serving_cell = parse_serving_cell(serving_cell_data)
+        if serving_cell is None:
             raise NotImplementedError(f"Cell information for {serving_rat} is not implemented")
-        serving_cell = cast(BaseServingCell, arr_to_model(serving_cell_data, serving_model))
-
-        neighbor_cells_data = (await cmd.command(QuectelATCommand.ENGINEER_MODE, ATDivider.EQ, '"neighbourcell"')).data
-        neighbor_cells = []
-        for neighbor_data in neighbor_cells_data:
-            neighbor_type = NeighborCellType(neighbor_data[0])
-            neighbor_rat = AccessTechnology(neighbor_data[1])
-            neighbor_model = BaseNeighborCell.get_model(serving_rat, neighbor_rat, neighbor_type)
-            if neighbor_model:
-                neighbor_cell = cast(BaseNeighborCell, arr_to_model(neighbor_data, neighbor_model))
-                neighbor_cells.append(neighbor_cell.info())
+
+        neighbor_cells = parse_neighbor_cells(serving_rat, neighbor_cells_info.data or [])
 
         return ModemCellInfo(
             serving_cell=serving_cell.info(),
-            neighbor_cells=neighbor_cells
+            neighbor_cells=[neighbor_cell.info() for neighbor_cell in neighbor_cells]
         )
 
     @Modem.with_at_commander
     async def get_sim_status(self, cmd: ATCommander) -> ModemSIMStatus:
         response = await cmd.command(QuectelATCommand.SIM_STATUS, ATDivider.QUESTION)
 
-        return ModemSIMStatus(response.data[0][1])
+        status = ModemSIMStatus(response.data[0][1])
+        self._track_sim_status(status)
+        return status
 
-    @Modem.with_at_commander
+    @Modem.with_urc_at_commander
     async def ping(self, cmd: ATCommander, host: str) -> int:
-        response = await cmd.command(QuectelATCommand.PING, ATDivider.EQ, f'1,"{host}",1,1')
+        # Expected: OK and later the URC +QPING: <result>,<IP>,<bytes>,<time>,<ttl>
+        with cmd.subscribe("+QPING") as pings:
+            await cmd.command(QuectelATCommand.PING, ATDivider.EQ, f'1,"{host}",1,1', cmd_id_response=False)
+            response = await pings.get(timeout=cmd.timeout)
 
-        return int(response.data[0][0])
+        return int(response.data[0])
 
     @Modem.with_at_commander
     async def set_auto_data_usage_save(self, cmd: ATCommander, interval: int = 60) -> None:
@@ -157,8 +244,13 @@ class QuectelLTEBase(Modem):
 
     @Modem.with_at_commander
     async def reset_data_usage(self, cmd: ATCommander) -> None:
-        await cmd.command(QuectelATCommand.PACKET_DATA_COUNTER, ATDivider.EQ, "0")
-        await cmd.command(QuectelATCommand.PACKET_DATA_COUNTER, ATDivider.EQ, "1")
+        # Expected: OK for both, save the counter to NV and then reset it
+        for response in await cmd.batch([
+            ATBatchCommand(QuectelATCommand.PACKET_DATA_COUNTER, ATDivider.EQ, "0"),
+            ATBatchCommand(QuectelATCommand.PACKET_DATA_COUNTER, ATDivider.EQ, "1"),
+        ]):
+            if response.status == ATResultCode.ERROR:
+                raise SerialSafeReadFailed(f"Error found in response: {response.error}")
 
     @Modem.with_at_commander
     async def get_data_usage(self, cmd: ATCommander) -> Tuple[int, int]:
@@ -176,7 +268,7 @@ class QuectelLTEBase(Modem):
 
     @Modem.with_at_commander
     async def set_pdp_authentication(self, cmd: ATCommander, profile: int, authentication: PDPAuthentication) -> None:
-        await self.set_apn(profile, authentication.apn, authentication.protocol)
+        await self._set_apn(cmd, profile, authentication.apn, authentication.protocol)
 
         if authentication.username is None or authentication.password is None:
             return
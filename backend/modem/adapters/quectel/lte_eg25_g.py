@@ -6,8 +6,6 @@ class LTEEG25G(QuectelLTEBase):
     Implement configuration and control of Quectel EG25-G modems.
     """
 
-    def _detected(self) -> bool:
-        """
-        Any port with manufacturer "Quectel" and product "EG25-G" is considered detected for this implementation.
-        """
-        return any("Quectel" in port.manufacturer and "EG25-G" in port.product for port in self.ports)
+    # Quectel EG25-G and EC25 share USB ids, only the product string tells them apart
+    usb_ids = ((0x2C7C, 0x0125),)
+    usb_product = "EG25-G"
@@ -6,7 +6,7 @@
 import abc
 import math
 from enum import Enum
-from typing import Optional, Type
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 from pydantic import BaseModel, Field, field_validator
 
@@ -17,6 +17,7 @@ from modem.models import (
     NeighborCellInfo,
     NeighborCellType,
 )
+from utils import RowDecoder, row_decoder
 
 # Utils
 
@@ -74,14 +75,8 @@ class BaseServingCell(BaseModel):
 
     @classmethod
     def get_model(cls, rat: AccessTechnology) -> Optional[Type]:
-        target_name = f"ServingCell{rat.value}"
-        for subcls in cls.__subclasses__():
-            if subcls.__name__ == target_name:
-                return subcls
-            found = subcls.get_model(rat)
-            if found:
-                return found
-        return None
+        decoder = _SERVING_CELL_DECODERS.get(rat.value)
+        return decoder.model if decoder else None
 
 
 class BaseServingCellData(BaseServingCell):
@@ -224,6 +219,9 @@ class ServingCellLTE(BaseServingCell):
             signal_inr_db=self.sinr,
             up_bandwidth=self.ul_bandwidth.as_mhz() if self.ul_bandwidth else None,
             dl_bandwidth=self.dl_bandwidth.as_mhz() if self.dl_bandwidth else None,
+            signal_rsrq_db=self.rsrq,
+            signal_rssi_dbm=self.rssi,
+            band=self.freq_band_ind,
         )
 
 # Related to AT+QENG="neighbourcell"
@@ -246,20 +244,8 @@ class BaseNeighborCell(BaseModel):
         rat: AccessTechnology,
         cell_type: NeighborCellType,
     ) -> Optional[Type]:
-        cell_type_str = ""
-        if cell_type == NeighborCellType.NEIGHBOUR_CELL_INTRA:
-            cell_type_str = "Intra"
-        if cell_type == NeighborCellType.NEIGHBOUR_CELL_INTER:
-            cell_type_str = "Inter"
-
-        target_name = f"{serving_rat.value}NeighborCell{cell_type_str}{rat.value}"
-        for subcls in cls.__subclasses__():
-            if subcls.__name__ == target_name:
-                return subcls
-            found = subcls.get_model(serving_rat, rat, cell_type)
-            if found:
-                return found
-        return None
+        decoder = _NEIGHBOR_CELL_DECODERS.get((serving_rat.value, cell_type.value, rat.value))
+        return decoder.model if decoder else None
 
 ## If current serving cell is GSM
 
@@ -471,3 +457,64 @@ class LTENeighborCellInterLTE(BaseNeighborCell):
             signal_quality_dbm=self.rsrp,
             signal_inr_db=self.sinr,
         )
+
+# Dispatch tables, built once at import so parsing a row is a dict hit instead of a walk over model classes.
+# Keys use the raw values found in the rows, values are the row decoder of the model.
+
+
+def _all_subclasses(cls: Type) -> List[Type]:
+    subclasses = []
+    for subclass in cls.__subclasses__():
+        subclasses.append(subclass)
+        subclasses.extend(_all_subclasses(subclass))
+    return subclasses
+
+
+_CELL_TYPE_NAMES = {
+    NeighborCellType.NEIGHBOUR_CELL: "",
+    NeighborCellType.NEIGHBOUR_CELL_INTRA: "Intra",
+    NeighborCellType.NEIGHBOUR_CELL_INTER: "Inter",
+}
+
+_serving_models_by_name = {model.__name__: model for model in _all_subclasses(BaseServingCell)}
+_SERVING_CELL_DECODERS: Dict[str, RowDecoder] = {
+    rat.value: row_decoder(model)
+    for rat in AccessTechnology
+    if (model := _serving_models_by_name.get(f"ServingCell{rat.value}")) is not None
+}
+
+_neighbor_models_by_name = {model.__name__: model for model in _all_subclasses(BaseNeighborCell)}
+_NEIGHBOR_CELL_DECODERS: Dict[Tuple[str, str, str], RowDecoder] = {
+    (serving_rat.value, cell_type.value, rat.value): row_decoder(model)
+    for serving_rat in AccessTechnology
+    for cell_type, cell_type_name in _CELL_TYPE_NAMES.items()
+    for rat in AccessTechnology
+    if (model := _neighbor_models_by_name.get(f"{serving_rat.value}NeighborCell{cell_type_name}{rat.value}"))
+}
+
+
+def parse_serving_cell(row: List[Any]) -> Optional[BaseServingCell]:
+    """Serving cell model from a +QENG: "servingcell" row without its first field, None if the RAT is not handled"""
+    decoder = _SERVING_CELL_DECODERS.get(row[1])
+    if decoder is None:
+        return None
+    return decoder.decode(row)
+
+
+def parse_neighbor_cells(serving_rat: AccessTechnology, rows: List[List[Any]]) -> List[BaseNeighborCell]:
+    """
+    Neighbor cell models from +QENG: "neighbourcell..." rows, in the same order. Rows of combinations that are not
+    handled are skipped, rows of the same model are validated together.
+    """
+    groups: Dict[RowDecoder, List[Tuple[int, List[Any]]]] = {}
+    for index, row in enumerate(rows):
+        decoder = _NEIGHBOR_CELL_DECODERS.get((serving_rat.value, row[0], row[1]))
+        if decoder is not None:
+            groups.setdefault(decoder, []).append((index, row))
+
+    cells: List[Tuple[int, BaseNeighborCell]] = []
+    for decoder, indexed_rows in groups.items():
+        decoded = decoder.decode_many([row for _, row in indexed_rows])
+        cells.extend(zip((index for index, _ in indexed_rows), decoded))
+    cells.sort(key=lambda cell: cell[0])
+    return [cell for _, cell in cells]
@@ -1,12 +1,19 @@
 import asyncio
+import os
 import traceback
+from collections import deque
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, Literal, List, Optional
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
 import serial
 
 from modem.exceptions import ATConnectionError, SerialSafeReadFailed, SerialSafeWriteFailed
+from modem.framer import ATLineFramer, split_fields
+from modem.latency import ATLatencyTracker, latency_key
+from modem.scheduler import ATPortScheduler, ATPriority
+from modem.transcript import ATDirection, ATTranscriptWriter
 
 
 class ATCommand(Enum):
@@ -57,6 +64,29 @@ class ATResultCode(Enum):
     NO_ANSWER = "NO ANSWER"
 
 
+# Lines that end a command response, RING is left out since it is an unsolicited result code
+_FINAL_RESULT_CODES: Dict[str, ATResultCode] = {
+    code.value: code for code in ATResultCode if code != ATResultCode.RING
+}
+_EXTENDED_ERRORS = ("+CME ERROR", "+CMS ERROR")
+
+
+def final_result_code(line: str) -> Optional[ATResultCode]:
+    """Returns the result code if the line is a final result code line, including +CME/+CMS ERROR: <n>"""
+    code = _FINAL_RESULT_CODES.get(line)
+    if code is not None:
+        return code
+    if line.startswith(_EXTENDED_ERRORS):
+        return ATResultCode.ERROR
+    if line.startswith("CONNECT "):
+        return ATResultCode.CONNECT
+    return None
+
+
+# Unsolicited result codes common to most modems, vendor ones are supplied by adapters when borrowing a session
+URC_PREFIXES: Tuple[str, ...] = ("RDY", "RING", "POWERED DOWN", "+CREG:", "+CGREG:", "+CEREG:", "+CPIN:", "+CTZV:")
+
+
 @dataclass
 class ATResponse:
     status: ATResultCode
@@ -64,119 +94,476 @@ class ATResponse:
     # List of responses split by , for each line split by \r\n
     data: Optional[List[List[str]]] = None
 
+    # Error line (ERROR, +CME ERROR: <n>...) when a batched command fails, single commands raise instead
+    error: Optional[str] = None
+
+
+@dataclass
+class ATBatchCommand:
+    command: Enum
+    divider: ATDivider = ATDivider.UNDEFINED
+    data: str = ""
+    cmd_id_response: bool = True
+
+
+@dataclass
+class ATURC:
+    line: str
+
+    # Fields after the "+CMD:" prefix split by , same as ATResponse data rows
+    data: List[Optional[str]]
+
+
+class ATURCSubscription:
+    """
+    Receives unsolicited result codes starting with prefix while subscribed, use it as a context manager
+    so it is removed from the session when done.
+    """
+
+    def __init__(self, commander: "ATCommander", prefix: str) -> None:
+        self.commander = commander
+        self.prefix = prefix
+        self._queue: asyncio.Queue[ATURC] = asyncio.Queue()
+
+    def _put(self, urc: ATURC) -> None:
+        self._queue.put_nowait(urc)
+
+    async def get(self, timeout: float) -> ATURC:
+        """Wait for the next URC, raises asyncio.TimeoutError if none arrives in time"""
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    def pending(self) -> List[ATURC]:
+        """URCs received and not read yet, without waiting"""
+        urcs = []
+        while not self._queue.empty():
+            urcs.append(self._queue.get_nowait())
+        return urcs
+
+    async def collect(self, until: Callable[[List[ATURC]], bool], timeout: float) -> List[ATURC]:
+        """Gather URCs until the until predicate is satisfied or timeout is reached, returns what was received"""
+        urcs: List[ATURC] = []
+        deadline = self.commander._loop.time() + timeout
+        while (remaining := deadline - self.commander._loop.time()) > 0:
+            try:
+                urcs.append(await self.get(remaining))
+            except asyncio.TimeoutError:
+                break
+            if until(urcs):
+                break
+        return urcs
+
+    def __enter__(self) -> "ATURCSubscription":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.commander.unsubscribe(self)
+
 
 class ATCommander:
-    _locked_ports: Dict[str, Literal[True]] = {}
+    # Long-lived sessions, one per AT port, kept open between borrows to avoid the open/setup handshake every call
+    _sessions: Dict[str, "ATCommander"] = {}
+    # Factories of serial-like transports used instead of the tty for some ports, e.g. replay of a transcript
+    _transports: Dict[str, Callable[[], Any]] = {}
+    # When set, every new session records the bytes it writes and reads in a transcript in this folder
+    _transcript_folder: Optional[Path] = None
 
     def __init__(self, port: str, baud: int = 115200):
         self.port = port
         self.baud = baud
-        self._locked_ports[self.port] = True
+
+        # Set when setup succeeded, cleared when we detect a desync, reboot or factory reset so setup runs again
+        self.synced = False
+        # Set when the modem only answered once terminators were configured, so setup configures them right away
+        self.terminators_configured = False
 
         # Init as None to avoid errors on __del__ if we fail to connect
         self.ser = None
-        self.ser = serial.Serial(self.port, self.baud)
-        self.ser.timeout = 5 # Max timeout in seconds
+        self._transcript: Optional[ATTranscriptWriter] = None
+        transport = self._transports.get(self.port)
+        # Inode of the tty node when opened, if the device is hotplugged the node is recreated with a new one
+        self._inode = os.stat(self.port).st_ino if transport is None else None
+        self.ser = serial.Serial(self.port, self.baud) if transport is None else transport()
+        if self._transcript_folder is not None:
+            self._transcript = ATTranscriptWriter.for_port(self._transcript_folder, self.port)
+        # Reads are driven by the event loop, so serial reads should never block
+        self.ser.timeout = 0
+        # Default timeout in seconds waiting for a response, each command uses the one learned from its latency
+        self.timeout = 5
+        # Model of the modem using this port, latencies are learned by model and command
+        self.model = ""
+        self._latency = ATLatencyTracker()
 
         # Clear buffers
         self.ser.flush()
         self.ser.read_all()
 
+        # Data received from the modem and not yet consumed, filled by the event loop when the tty is readable.
+        # Raw bytes are only kept while a raw response is being captured, complete lines are kept for parsed ones.
+        self._rx = bytearray()
+        self._capture_raw = False
+        self._framer = ATLineFramer()
+        self._lines: Deque[str] = deque()
+
+        # Unsolicited result codes are routed to subscribers, the command waiting only receives its own lines
+        self.urc_prefixes: Tuple[str, ...] = URC_PREFIXES
+        self._subscriptions: List[ATURCSubscription] = []
+        self._urc_match: Tuple[str, ...] = self.urc_prefixes
+        # Prefixes of the responses the commands in flight are waiting for, these lines are never taken as URCs
+        self._expected_prefixes: Tuple[str, ...] = ()
+        self._rx_event = asyncio.Event()
+        self._rx_error: Optional[Exception] = None
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.ser.fileno(), self._on_readable)
+
+    @classmethod
+    async def borrow(
+        cls,
+        port: str,
+        urc_prefixes: Tuple[str, ...] = (),
+        priority: Optional[ATPriority] = None,
+        timeout: Optional[float] = None,
+        model: str = "",
+    ) -> "ATCommander":
+        """
+        Wait for the port in its priority queue and return its long-lived session, opening it and running setup
+        only when needed. Should be released with release() or by using it as a context manager.
+        urc_prefixes are vendor unsolicited result codes that should be routed to subscribers and model is used to
+        learn command timeouts of this kind of modem.
+        Priority defaults to the one of the current task, raises ATConnectionTimeout if not granted before timeout.
+        """
+        scheduler = ATPortScheduler.get(port)
+        await scheduler.acquire(priority, timeout)
+
+        try:
+            session = cls._sessions.get(port)
+            if session is not None and not session.is_alive:
+                cls.discard(port)
+                session = None
+
+            if session is None:
+                session = cls(port)
+                cls._sessions[port] = session
+            session._add_urc_prefixes(urc_prefixes)
+            session.model = model or session.model
+
+            if not session.synced:
+                await session.setup()
+
+            return session
+        except Exception:
+            cls.discard(port)
+            scheduler.release()
+            raise
+
+    @classmethod
+    def discard(cls, port: str) -> None:
+        """Close the session of a port and remove it from the pool, next borrow will open a new one"""
+        session = cls._sessions.pop(port, None)
+        if session is not None:
+            session._close()
+
+    @classmethod
+    def close_all(cls) -> None:
+        for port in list(cls._sessions):
+            cls.discard(port)
+
+    @classmethod
+    def record_transcripts(cls, folder: Optional[Path]) -> None:
+        """Record the bytes written and read by sessions opened from now on in folder, None stops recording"""
+        cls._transcript_folder = folder
+        # Open sessions are dropped so next borrow opens a new one, recording from its setup
+        cls.close_all()
+
+    @classmethod
+    def set_transport(cls, port: str, factory: Optional[Callable[[], Any]]) -> None:
+        """Use the serial-like object returned by factory for port instead of opening it, None restores the tty"""
+        if factory is None:
+            cls._transports.pop(port, None)
+        else:
+            cls._transports[port] = factory
+        cls.discard(port)
+
+    @property
+    def is_alive(self) -> bool:
+        if not self.ser or not self.ser.is_open or self._rx_error is not None:
+            return False
+        if self._inode is None:
+            return True
+        try:
+            return os.stat(self.port).st_ino == self._inode
+        except OSError:
+            return False
+
+    def invalidate(self) -> None:
+        """Drop this session from the pool, used when the modem is going to re-enumerate (e.g. reboot)"""
+        self.synced = False
+        if self._sessions.get(self.port) is self:
+            self._sessions.pop(self.port)
+        self._close()
+
+    def release(self) -> None:
+        """Give back the port to the pool keeping the session open"""
+        if self._sessions.get(self.port) is not self:
+            self._close()
+        ATPortScheduler.get(self.port).release()
+
     async def setup(self) -> None:
         """Async continuation of __init__ must call this method after creating the instance"""
+        # The modem may have restarted with default terminators, which it did not work with before
+        if self.terminators_configured:
+            await self._configure_terminators()
         # If we fail to connect we try configure terminators and check again
-        if not await self.check_ok() and not await self._configure_terminators() and not await self.check_ok():
-            raise ATConnectionError(f"Failed to connect to {self.port}")
-        # Terminators we can get to work even when not perfect, but echo mode should be disabled
+        if not await self.check_ok():
+            await self._configure_terminators()
+            if not await self.check_ok():
+                raise ATConnectionError(f"Failed to connect to {self.port}")
+            self.terminators_configured = True
+        # Terminators we can get to work even when not perfect, but echo mode should be disabled. Echo may have been
+        # enabled again since the last setup (e.g. ATE1 or AT&F through the raw commander), so it is always sent.
         await self.command(ATCommand.SET_ECHO_MODE, ATDivider.UNDEFINED, "0", delay=0.1)
+        self.synced = True
 
     async def _configure_terminators(self) -> None:
         # Set terminators
         await self.command(ATCommand.SET_CMD_LINE_TERM, ATDivider.EQ, "13", delay=0.1)
         await self.command(ATCommand.SET_RESP_FORMAT_CHAR, ATDivider.EQ, "10", delay=0.1)
 
+    def _add_urc_prefixes(self, prefixes: Tuple[str, ...]) -> None:
+        new_prefixes = tuple(prefix for prefix in prefixes if prefix not in self.urc_prefixes)
+        if new_prefixes:
+            self.urc_prefixes += new_prefixes
+            self._update_urc_match()
+
+    def _update_urc_match(self) -> None:
+        self._urc_match = self.urc_prefixes + tuple(sub.prefix for sub in self._subscriptions)
+
+    def subscribe(self, prefix: str) -> ATURCSubscription:
+        """Start receiving unsolicited result codes starting with prefix, e.g. "+QPING" or "RDY" """
+        subscription = ATURCSubscription(self, prefix)
+        self._subscriptions.append(subscription)
+        self._update_urc_match()
+        return subscription
+
+    def unsubscribe(self, subscription: ATURCSubscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            self._update_urc_match()
+
+    def _dispatch_urc(self, line: str) -> None:
+        if line.startswith("RDY"):
+            # Modem restarted, echo and terminators are back to defaults
+            self.synced = False
+
+        separator = line.find(":")
+        urc = ATURC(line=line, data=split_fields(line, separator + 1) if separator != -1 else [])
+        for subscription in self._subscriptions:
+            if line.startswith(subscription.prefix):
+                subscription._put(urc)
+
+    def _route_line(self, line: str) -> None:
+        if line.startswith(self._urc_match) and not line.startswith(self._expected_prefixes):
+            self._dispatch_urc(line)
+        else:
+            self._lines.append(line)
+
+    def _on_readable(self) -> None:
+        try:
+            data = self.ser.read(self.ser.in_waiting or 1)
+            if self._transcript is not None:
+                self._transcript.write(ATDirection.RX, data)
+            if self._capture_raw:
+                self._rx += data
+            for line in self._framer.feed(data):
+                self._route_line(line)
+        except Exception as e:
+            # Usually the device was disconnected, stop watching it and wake any waiting command
+            self._rx_error = e
+            self.synced = False
+            self._remove_reader()
+        self._rx_event.set()
+
+    def _remove_reader(self) -> None:
+        if self.ser and self.ser.is_open and not self._loop.is_closed():
+            self._loop.remove_reader(self.ser.fileno())
+
     def _close(self) -> None:
+        # Port lock is owned by borrow/release, so closing here never unlocks a port borrowed by a newer session
         if self.ser and self.ser.is_open:
+            self._remove_reader()
             self.ser.close()
-        # Unlock port
-        self._locked_ports.pop(self.port, None)
+        if self._transcript is not None:
+            self._transcript.close()
 
     @staticmethod
     def is_locked(port: str) -> bool:
-        return port in ATCommander._locked_ports
-
-    def _parse_response(self, response: str, cmd_id_response: Optional[str] = None) -> ATResponse:
-        parts = [part for part in response.splitlines() if part]
-
-
-        data = [parts] if len(parts) > 1 else None
-        if cmd_id_response:
-            data = [
-                [
-                    piece if piece != '-' else None
-                    for piece in part
-                        .replace(f'{cmd_id_response}: ', f'{cmd_id_response}:')
-                        .split(f'{cmd_id_response}:')[1]
-                        .replace('"', '')
-                        .split(',')
-                ]
-                for part in parts
-                if cmd_id_response in part
-            ]
-        status = next((code for code in ATResultCode if code.value in response), ATResultCode.ERROR)
-
-        return ATResponse(status=status, data=data)
-
-    async def _cmd_read_response(self, cmd_id_response: Optional[str] = None) -> ATResponse:
-        buffer: str = ""
+        return ATPortScheduler.is_busy(port)
+
+    @staticmethod
+    def least_loaded(ports: List[str]) -> str:
+        """Port of ports with the shortest queue, to spread independent commands between AT ports of a modem"""
+        return ATPortScheduler.least_loaded(ports)
+
+    @property
+    def is_pooled(self) -> bool:
+        """True while this is the open session of its port, subscriptions of a dropped session receive nothing"""
+        return self._sessions.get(self.port) is self and self.is_alive
+
+    @classmethod
+    def is_ready(cls, port: str) -> bool:
+        """True when port has an open session that completed setup, so it is known to answer AT commands"""
+        session = cls._sessions.get(port)
+        return session is not None and session.synced
+
+    def _parse_response(
+        self,
+        lines: List[str],
+        status: ATResultCode,
+        cmd_id_response: Optional[str] = None,
+    ) -> ATResponse:
+        if not cmd_id_response:
+            return ATResponse(status=status, data=[lines] if len(lines) > 1 else None)
+
+        prefix = f"{cmd_id_response}:"
+        return ATResponse(
+            status=status,
+            data=[split_fields(line, len(prefix)) for line in lines if line.startswith(prefix)],
+        )
+
+    async def _wait_rx(self, timeout: float) -> None:
+        """Wait until new bytes arrive from the modem or timeout is reached"""
+        self._rx_event.clear()
         try:
-            iter_delay = 0.1
-            max_iter = int(self.ser.timeout / iter_delay)
-            # We should read till one of ATResultCode be found and if we have a cmd_id_response we should also wait it
-            for _ in range(0, max_iter):
-                buffer += self.ser.read_all().decode("ascii")
+            await asyncio.wait_for(self._rx_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        if self._rx_error is not None:
+            raise SerialSafeReadFailed(f"Serial device at {self.port} is not readable anymore") from self._rx_error
+
+    async def _read_final(self, prefix: Optional[str], deadline: float) -> Tuple[List[str], ATResultCode]:
+        """
+        Consume received lines till a final result code, and the prefix line if given, are found.
+        Returns the lines including the final one, errors are returned as soon as found.
+        """
+        lines: List[str] = []
+        status: Optional[ATResultCode] = None
+        while (remaining := deadline - self._loop.time()) > 0:
+            while self._lines:
+                line = self._lines.popleft()
+                lines.append(line)
+
+                code = final_result_code(line)
+                if code == ATResultCode.ERROR:
+                    return lines, code
+                if code is not None:
+                    status = code
+                elif prefix and line.startswith(prefix):
+                    prefix = None
+
+                # Lines left belong to the next pipelined command, they can arrive in the same read
+                if status is not None and prefix is None:
+                    return lines, status
+
+            await self._wait_rx(remaining)
+
+        # No final result code in time, modem may be out of sync with us so next borrow should run setup again
+        self.synced = False
+        raise SerialSafeReadFailed("Max timeout reached while waiting for response")
+
+    async def _read_final_timed(self, key: str, prefix: Optional[str]) -> Tuple[List[str], ATResultCode]:
+        """Same as _read_final using the learned timeout of the command and recording its latency"""
+        timeout = self._latency.timeout(self.model, key)
+        started = self._loop.time()
+        try:
+            result = await self._read_final(prefix, started + timeout)
+        except SerialSafeReadFailed:
+            # Timeouts are counted so a too tight timeout grows, a dead port says nothing about the command
+            if self._rx_error is None:
+                self._latency.record_timeout(self.model, key)
+            raise
 
-                if ATResultCode.ERROR.value in buffer:
-                    raise SerialSafeReadFailed("Error found in response")
+        self._latency.record(self.model, key, self._loop.time() - started)
+        return result
 
-                if any(code.value in buffer for code in ATResultCode):
-                    if cmd_id_response is None or cmd_id_response in buffer:
-                        return self._parse_response(buffer, cmd_id_response)
-                await asyncio.sleep(iter_delay)
+    async def _cmd_read_response(self, key: str, cmd_id_response: Optional[str] = None) -> ATResponse:
+        try:
+            # We should read till one of ATResultCode be found and if we have a cmd_id_response we should also wait it
+            prefix = f"{cmd_id_response}:" if cmd_id_response else None
+            lines, status = await self._read_final_timed(key, prefix)
 
-            raise SerialSafeReadFailed("Max timeout reached while waiting for response")
+            if status == ATResultCode.ERROR:
+                raise SerialSafeReadFailed(f"Error found in response: {lines[-1]}")
+            return self._parse_response(lines, status, cmd_id_response)
         except Exception as e:
             raise SerialSafeReadFailed(f"Failed to read all bytes from serial device at {self.port}, {traceback.print_exc(e)}") from e
 
     def _safe_serial_write(self, data: str) -> None:
-        bytes_written = self.ser.write(data.encode("ascii"))
+        encoded = data.encode("ascii")
+        if self._transcript is not None:
+            self._transcript.write(ATDirection.TX, encoded)
+        bytes_written = self.ser.write(encoded)
         self.ser.flush()
         if bytes_written != len(data):
+            self.synced = False
             raise SerialSafeWriteFailed(f"Failed to write all bytes to serial device at {self.port}")
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._close()
+        # Serial level errors usually mean the device is gone (hotplug), so we drop the session instead of keeping it
+        if exc_type is not None and issubclass(exc_type, (serial.SerialException, OSError)):
+            self.invalidate()
+        self.release()
 
     def __del__(self):
         self._close()
 
+    def _prepare_command(self, expected_prefixes: Tuple[str, ...], raw_response: bool = False) -> None:
+        # Since the session is kept open, discard anything left from previous commands like late URCs
+        self.ser.reset_input_buffer()
+        self._rx.clear()
+        self._framer.clear()
+        self._lines.clear()
+        self._expected_prefixes = expected_prefixes
+        self._capture_raw = raw_response
+
+    @staticmethod
+    def _expected_cmd_id(command: Enum, cmd_id_response: bool) -> Optional[str]:
+        # If commands have AT+ it should include in response it, for async commands like AT+QPING
+        # that will return OK as soon as hit, but after some time return the result as +QPING: ......
+        return f"+{command.value.split('+')[1]}" if "AT+" in command.value and cmd_id_response else None
+
     async def raw_command(
         self,
         command: str,
-        delay: Optional[int] = 0.3,
+        delay: Optional[float] = 0.3,
         cmd_id_response: Optional[str] = None,
         raw_response: bool = False
     ) -> ATResponse:
-        self._safe_serial_write(f"{command}\r\n")
-
-        # When we don't have a response to wait for, we should wait before reading, average is 300ms
-        if cmd_id_response is None:
-            await asyncio.sleep(delay)
-
-        return self.ser.read_all().decode("ascii") if raw_response else (await self._cmd_read_response(cmd_id_response))
+        key = latency_key(command)
+        self._prepare_command((f"{cmd_id_response}:",) if cmd_id_response else (), raw_response)
+        try:
+            self._safe_serial_write(f"{command}\r\n")
+
+            # Structured responses wake up as soon as the final result code arrives
+            if not raw_response:
+                return await self._cmd_read_response(key, cmd_id_response)
+
+            # Raw ones wait the requested delay, or till the final result code using the learned timeout if no delay
+            if delay is not None:
+                await asyncio.sleep(delay)
+            else:
+                try:
+                    await self._read_final_timed(key, None)
+                except SerialSafeReadFailed:
+                    # Whatever was received is still useful for who asked a raw response
+                    pass
+            response = self._rx.decode("ascii")
+            self._rx.clear()
+            return response
+        finally:
+            self._expected_prefixes = ()
+            self._capture_raw = False
 
     async def command(
         self,
@@ -184,20 +571,46 @@ class ATCommander:
         divider: ATDivider = ATDivider.UNDEFINED,
         data: str = "",
         cmd_id_response: bool = True,
-        delay: float = 0.3,
+        delay: Optional[float] = 0.3,
         raw_response: bool = False,
     ) -> ATResponse:
-        # If commands have AT+ it should include in response it, for async commands like AT+QPING
-        # that will return OK as soon as hit, but after some time return the result as +QPING: ......
-        expected_cmd_id = f"+{command.value.split('+')[1]}" if "AT+" in command.value and cmd_id_response else None
-
         return await self.raw_command(
             f"{command.value}{divider.value}{data}\r\n",
-            cmd_id_response=expected_cmd_id,
+            cmd_id_response=self._expected_cmd_id(command, cmd_id_response),
             delay=delay,
             raw_response=raw_response,
         )
 
+    async def batch(self, commands: List[ATBatchCommand]) -> List[ATResponse]:
+        """
+        Send all commands back-to-back without waiting for each response, saving one round-trip per command.
+        Every response is delimited by its own final result code, so a failing command is returned with ERROR
+        status and its error line while the others are still parsed.
+        NOTE: Should not be used with commands answering after the final result code (e.g. AT+QPING) or
+        commands aborted by incoming characters (e.g. AT+COPS=?).
+        """
+        cmd_ids = [self._expected_cmd_id(command.command, command.cmd_id_response) for command in commands]
+        lines_to_send = [f"{command.command.value}{command.divider.value}{command.data}" for command in commands]
+        self._prepare_command(tuple(f"{cmd_id}:" for cmd_id in cmd_ids if cmd_id))
+        try:
+            self._safe_serial_write("".join(f"{line}\r\n" for line in lines_to_send))
+
+            responses: List[ATResponse] = []
+            for cmd_id, line in zip(cmd_ids, lines_to_send):
+                try:
+                    # Latency of each command is measured from the end of the previous response
+                    lines, status = await self._read_final_timed(latency_key(line), None)
+                except Exception as e:
+                    raise SerialSafeReadFailed(f"Failed to read batch responses from {self.port}") from e
+
+                if status == ATResultCode.ERROR:
+                    responses.append(ATResponse(status=status, error=lines[-1]))
+                else:
+                    responses.append(self._parse_response(lines, status, cmd_id))
+            return responses
+        finally:
+            self._expected_prefixes = ()
+
     async def check_ok(self) -> bool:
         response = await self.command(ATCommand.AT, delay=0.1)
         return response.status == ATResultCode.OK
@@ -242,7 +655,10 @@ class ATCommander:
         return await self.command(ATCommand.CONFIGURE_CLOCK, ATDivider.QUESTION)
 
     async def reboot_modem(self) -> ATResponse:
-        return await self.command(ATCommand.CONFIGURE_FUNCTIONALITY, ATDivider.EQ, '1,1', cmd_id_response=False)
+        response = await self.command(ATCommand.CONFIGURE_FUNCTIONALITY, ATDivider.EQ, '1,1', cmd_id_response=False)
+        # Modem will re-enumerate its USB ports, so this session can't be reused
+        self.invalidate()
+        return response
 
     async def disable_modem(self) -> ATResponse:
         return await self.command(ATCommand.CONFIGURE_FUNCTIONALITY, ATDivider.EQ, '4,0', cmd_id_response=False)
@@ -251,4 +667,7 @@ class ATCommander:
         return await self.command(ATCommand.CONFIGURE_FUNCTIONALITY, ATDivider.QUESTION)
 
     async def reset_to_factory(self) -> ATResponse:
-        return await self.command(ATCommand.RESET_TO_FACTORY, ATDivider.UNDEFINED, '0', cmd_id_response=False)
+        response = await self.command(ATCommand.RESET_TO_FACTORY, ATDivider.UNDEFINED, '0', cmd_id_response=False)
+        # Factory defaults enable echo and restore terminators, so setup must run on next borrow
+        self.synced = False
+        return response
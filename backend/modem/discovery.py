@@ -0,0 +1,80 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from commonwealth.utils.Singleton import Singleton
+from loguru import logger
+
+from config import SETTINGS_FOLDER
+
+
+class ATPortIndex(metaclass=Singleton):
+    """
+    Persisted index of the ttys that answered AT for each (usb device path, adapter class), so steady state calls
+    skip probing, and of the one of them unsolicited result codes are sent to. An entry is dropped when the ttys of
+    the device change (hotplug) or a handshake fails.
+    """
+
+    def __init__(self, file_path: Path = SETTINGS_FOLDER / "at_ports.json") -> None:
+        self.file_path = file_path
+        # Key is "<usb device path>|<adapter>", value has the AT ports and all device ttys when they were found, and
+        # the URC port once known
+        self._entries: Dict[str, Dict] = {}
+        self._load()
+
+    @staticmethod
+    def _key(device: str, adapter: str) -> str:
+        return f"{device}|{adapter}"
+
+    def _load(self) -> None:
+        try:
+            self._entries = json.loads(self.file_path.read_text())
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Discarding AT port index from {self.file_path}: {e}")
+
+    def _save(self) -> None:
+        try:
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.file_path.with_suffix(".tmp")
+            temp_path.write_text(json.dumps(self._entries))
+            os.replace(temp_path, self.file_path)
+        except Exception as e:
+            logger.error(f"Failed to save AT port index to {self.file_path}: {e}")
+
+    def get(self, device: str, adapter: str, ttys: List[str]) -> Optional[List[str]]:
+        """Returns the known AT ports if the device still has the same ttys it had when they were found"""
+        entry = self._entries.get(self._key(device, adapter))
+        if entry is None or "ports" not in entry:
+            return None
+
+        if sorted(ttys) != entry["ttys"]:
+            # Device was replugged or re-enumerated, tty names may point to other interfaces now
+            self.forget(device, adapter)
+            return None
+        return list(entry["ports"])
+
+    def set(self, device: str, adapter: str, ports: List[str], ttys: List[str]) -> None:
+        entry = {"ports": ports, "ttys": sorted(ttys)}
+        key = self._key(device, adapter)
+        if self._entries.get(key) != entry:
+            self._entries[key] = entry
+            self._save()
+
+    def get_urc_port(self, device: str, adapter: str, ttys: List[str]) -> Optional[str]:
+        """Returns the known URC port if the device still has the same ttys it had when its AT ports were found"""
+        if self.get(device, adapter, ttys) is None:
+            return None
+        return self._entries[self._key(device, adapter)].get("urc_port")
+
+    def set_urc_port(self, device: str, adapter: str, port: str) -> None:
+        entry = self._entries.get(self._key(device, adapter))
+        if entry is not None and entry.get("urc_port") != port:
+            entry["urc_port"] = port
+            self._save()
+
+    def forget(self, device: str, adapter: str) -> None:
+        if self._entries.pop(self._key(device, adapter), None) is not None:
+            self._save()
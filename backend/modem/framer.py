@@ -0,0 +1,41 @@
+from typing import List, Optional
+
+
+class ATLineFramer:
+    """
+    Incrementally split the byte stream received from the modem into complete lines.
+    Bytes are kept until a line terminator arrives, so each line is emitted exactly once and never re-scanned.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[str]:
+        self._buffer += data
+
+        # Only the part until the last terminator is complete, the remaining stays for next feed
+        end = max(self._buffer.rfind(b"\n"), self._buffer.rfind(b"\r"))
+        if end == -1:
+            return []
+
+        complete = self._buffer[:end + 1]
+        del self._buffer[:end + 1]
+
+        # Works with \r\n, \n and \r terminators, empty lines are only separators in AT responses
+        return [line.decode("ascii", errors="replace") for line in complete.splitlines() if line.strip()]
+
+    def clear(self) -> None:
+        self._buffer.clear()
+
+
+def split_fields(line: str, start: int) -> List[Optional[str]]:
+    """
+    Split the payload of a "+CMD: a,b,"c"" line starting at index start in its fields.
+    Quotes are dropped and "-" fields are returned as None.
+    """
+    # NOTE: Commas inside quotes are also split on purpose, some parsers rely on it, e.g. +CCLK "date,time"
+    payload = line[start:].lstrip(" ")
+    return [
+        field if field != "-" else None
+        for field in payload.replace('"', "").split(",")
+    ]
@@ -0,0 +1,108 @@
+import asyncio
+import socket
+from typing import Dict, Optional
+
+from commonwealth.utils.Singleton import Singleton
+from loguru import logger
+
+from modem.modem import Modem
+
+NETLINK_KOBJECT_UEVENT = 15
+# Kernel uevents multicast group, udev re-broadcasts on another one with its own header
+_KERNEL_UEVENT_GROUP = 1
+# Subsystems whose events may add or remove a modem port
+_WATCHED_SUBSYSTEMS = {"tty", "usb", "usb-serial"}
+# A modem plug is a burst of events, one for each interface and tty, so the scan waits for it to settle
+SETTLE_DELAY = 0.5
+# Fallback scan for events we could not receive or missed, also the only source when netlink is not available
+RECONCILE_INTERVAL = 60
+
+
+def parse_uevent(data: bytes) -> Dict[str, str]:
+    """Parse a kernel uevent datagram, "ACTION@DEVPATH" followed by NUL separated KEY=VALUE pairs"""
+    fields: Dict[str, str] = {}
+    for part in data.split(b"\0")[1:]:
+        key, separator, value = part.partition(b"=")
+        if separator:
+            fields[key.decode(errors="replace")] = value.decode(errors="replace")
+    return fields
+
+
+class ModemHotplugMonitor(metaclass=Singleton):
+    """
+    Keeps the registry of detected modems in Modem up to date from kernel uevents, so API requests look modems
+    up in memory instead of scanning sysfs. A slow periodic scan reconciles anything missed.
+    """
+
+    def __init__(self) -> None:
+        self._socket: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending_refresh: Optional[asyncio.TimerHandle] = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        Modem.refresh_devices()
+
+        try:
+            self._socket = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            self._socket.setblocking(False)
+            self._socket.bind((0, _KERNEL_UEVENT_GROUP))
+            loop.add_reader(self._socket.fileno(), self._on_uevent)
+        except OSError as e:
+            logger.warning(f"Kernel uevents not available, modems are only detected by periodic scan: {e}")
+            if self._socket is not None:
+                self._socket.close()
+            self._socket = None
+
+        self._reconcile_task = loop.create_task(self._reconcile())
+
+    def stop(self) -> None:
+        if self._socket is not None and self._loop is not None:
+            self._loop.remove_reader(self._socket.fileno())
+            self._socket.close()
+            self._socket = None
+        if self._pending_refresh is not None:
+            self._pending_refresh.cancel()
+            self._pending_refresh = None
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            self._reconcile_task = None
+        Modem.clear_devices()
+
+    def _on_uevent(self) -> None:
+        relevant = False
+        while True:
+            try:
+                data = self._socket.recv(8192)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                # Receive buffer overflow loses events, a full scan covers whatever they were
+                logger.warning(f"Lost kernel uevents: {e}")
+                relevant = True
+                break
+            relevant = relevant or parse_uevent(data).get("SUBSYSTEM") in _WATCHED_SUBSYSTEMS
+
+        if relevant:
+            self.request_refresh()
+
+    def request_refresh(self) -> None:
+        """Scan again once events stop arriving for SETTLE_DELAY"""
+        if self._loop is None:
+            return
+        if self._pending_refresh is not None:
+            self._pending_refresh.cancel()
+        self._pending_refresh = self._loop.call_later(SETTLE_DELAY, self._refresh)
+
+    def _refresh(self) -> None:
+        self._pending_refresh = None
+        try:
+            Modem.refresh_devices()
+        except Exception as e:
+            logger.error(f"Failed to refresh connected modems: {e}")
+
+    async def _reconcile(self) -> None:
+        while True:
+            await asyncio.sleep(RECONCILE_INTERVAL)
+            self._refresh()
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict
+
+from commonwealth.utils.Singleton import Singleton
+from loguru import logger
+
+from config import SETTINGS_FOLDER
+
+# Timeout used until enough samples are recorded for a command
+DEFAULT_TIMEOUT = 5.0
+# Learned timeouts are p99 * margin, clamped between floor and ceiling
+TIMEOUT_MARGIN = 3.0
+TIMEOUT_FLOOR = 0.5
+TIMEOUT_CEILING = 180.0
+MIN_SAMPLES = 20
+MAX_SAMPLES = 200
+# Each run of this many consecutive timeouts raises the timeout of a command by one learned timeout, up to the max
+# steps. Raises are kept in memory only and dropped on the next answer in time, which is recorded as a sample.
+TIMEOUTS_PER_STEP = 3
+MAX_TIMEOUT_STEPS = 3
+# Minimum interval in seconds between writes of the learned values to disk
+SAVE_INTERVAL = 300
+
+# Max response times from Quectel manuals for commands slower than the default, used while nothing is learned
+_MAX_RESPONSE_TIMES: Dict[str, float] = {
+    "AT+COPS=?": 180.0,
+    "AT+COPS=": 180.0,
+    "AT+CGATT=": 140.0,
+    "AT+CGACT=": 150.0,
+    "AT+QIACT=": 150.0,
+    "AT+CFUN=": 15.0,
+}
+
+_KEY_PATTERN = re.compile(r'(AT[^=?\r\n]*)(=\?|\?|=)?("[^"]*")?')
+
+
+def latency_key(command: str) -> str:
+    """
+    Key used to group latencies of a command line, command and divider plus the first quoted parameter if any,
+    e.g. AT+CSQ, AT+COPS=?, AT+QENG="servingcell", AT+CGDCONT=
+    """
+    match = _KEY_PATTERN.match(command.strip())
+    return "".join(part for part in match.groups() if part) if match else command.strip()
+
+
+class ATLatencyTracker(metaclass=Singleton):
+    """
+    Records response latency by modem model and command to derive per-command timeouts, fast commands fail fast on
+    a hung modem while slow ones get the time they need. Learned values are persisted to survive restarts.
+    """
+
+    def __init__(self, file_path: Path = SETTINGS_FOLDER / "at_latency.json") -> None:
+        self.file_path = file_path
+        self._samples: Dict[str, Dict[str, Deque[float]]] = {}
+        self._timeouts: Dict[str, Dict[str, float]] = {}
+        # Consecutive timeouts by model and command
+        self._timeout_streaks: Dict[str, Dict[str, int]] = {}
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.file_path.read_text())
+            for model, commands in data.get("models", {}).items():
+                for key, samples in commands.items():
+                    self._samples.setdefault(model, {})[key] = deque(samples, maxlen=MAX_SAMPLES)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Discarding learned AT latencies from {self.file_path}: {e}")
+
+    def timeout(self, model: str, key: str) -> float:
+        timeout = self._learned_timeout(model, key)
+        steps = min(self._timeout_streaks.get(model, {}).get(key, 0) // TIMEOUTS_PER_STEP, MAX_TIMEOUT_STEPS)
+        return min(timeout * (1 + steps), TIMEOUT_CEILING)
+
+    def _learned_timeout(self, model: str, key: str) -> float:
+        cached = self._timeouts.get(model, {}).get(key)
+        if cached is not None:
+            return cached
+
+        samples = self._samples.get(model, {}).get(key)
+        if not samples or len(samples) < MIN_SAMPLES:
+            return max(_MAX_RESPONSE_TIMES.get(key, DEFAULT_TIMEOUT), DEFAULT_TIMEOUT)
+
+        ordered = sorted(samples)
+        p99 = ordered[min(len(ordered) - 1, math.ceil(0.99 * len(ordered)) - 1)]
+        timeout = min(max(p99 * TIMEOUT_MARGIN, TIMEOUT_FLOOR), TIMEOUT_CEILING)
+        self._timeouts.setdefault(model, {})[key] = timeout
+        return timeout
+
+    def record_timeout(self, model: str, key: str) -> None:
+        """Record a command that got no answer in time, it is not a latency sample and is not persisted"""
+        streaks = self._timeout_streaks.setdefault(model, {})
+        streaks[key] = streaks.get(key, 0) + 1
+        if streaks[key] % TIMEOUTS_PER_STEP == 0 and streaks[key] // TIMEOUTS_PER_STEP <= MAX_TIMEOUT_STEPS:
+            logger.warning(f"{key} of {model} timed out {streaks[key]} times in a row, raising its timeout.")
+
+    def record(self, model: str, key: str, latency: float) -> None:
+        """Record the latency of a command answered in time"""
+        self._timeout_streaks.get(model, {}).pop(key, None)
+        samples = self._samples.setdefault(model, {}).setdefault(key, deque(maxlen=MAX_SAMPLES))
+        samples.append(round(latency, 4))
+        self._timeouts.get(model, {}).pop(key, None)
+        self._dirty = True
+
+        if time.monotonic() - self._last_save > SAVE_INTERVAL:
+            self._last_save = time.monotonic()
+            asyncio.get_running_loop().run_in_executor(None, self._write, self._snapshot())
+
+    def _snapshot(self) -> str:
+        self._dirty = False
+        return json.dumps({
+            "models": {
+                model: {key: list(samples) for key, samples in commands.items()}
+                for model, commands in self._samples.items()
+            }
+        })
+
+    def _write(self, content: str) -> None:
+        try:
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.file_path.with_suffix(".tmp")
+            temp_path.write_text(content)
+            os.replace(temp_path, self.file_path)
+        except Exception as e:
+            logger.error(f"Failed to save learned AT latencies to {self.file_path}: {e}")
+
+    def save(self) -> None:
+        """Write learned values to disk if anything changed since last save"""
+        if self._dirty:
+            self._write(self._snapshot())
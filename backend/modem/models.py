@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from pydantic import BaseModel
 
@@ -25,6 +25,36 @@ class ModemDeviceDetails(ModemDevice):
     imsi: Optional[str] = None
 
 
+class ATQueueClassStats(BaseModel):
+    queued: int
+    served: int
+    timeouts: int
+    # Wait times in seconds between asking for the AT port and getting it
+    avg_wait: float
+    max_wait: float
+    last_wait: float
+
+
+class ATPortQueueStats(BaseModel):
+    port: str
+    busy: bool
+    # Stats by priority class, e.g. interactive, diagnostics and background
+    classes: Dict[str, ATQueueClassStats]
+
+
+class ModemStatusField(BaseModel):
+    value: Any = None
+    # Seconds since the value was read from the modem, None if it was not read yet
+    age: Optional[float] = None
+    # Error of the last read, value is then the last one read successfully
+    error: Optional[str] = None
+
+
+class ModemStatus(BaseModel):
+    id: str
+    fields: Dict[str, ModemStatusField]
+
+
 class ModemClockDetails(BaseModel):
     date: str
     time: str
@@ -90,6 +120,10 @@ class ServingCellInfo(BaseModel):
     signal_inr_db: Optional[int] = None
     up_bandwidth_mhz: Optional[int] = None
     dl_bandwidth_mhz: Optional[int] = None
+    # LTE only, RSRQ, RSSI and E-UTRA band
+    signal_rsrq_db: Optional[int] = None
+    signal_rssi_dbm: Optional[int] = None
+    band: Optional[int] = None
 
 
 class NeighborCellType(Enum):
@@ -184,6 +218,48 @@ class ModemSignalQuality(BaseModel):
     signal_strength_dbm: int
     bit_error_rate: int
 
+
+class SignalHistoryMetric(BaseModel):
+    min: List[Optional[float]]
+    max: List[Optional[float]]
+    mean: List[Optional[float]]
+
+
+class ModemSignalHistory(BaseModel):
+    """
+    Sampled signal and serving cell data downsampled to buckets of resolution seconds, lists have one value for each
+    bucket. Metrics are rsrp, rsrq, sinr, rssi (dBm / dB) and csq (CSQ in dBm), None when not reported in the bucket.
+    """
+    resolution: float
+    # Start of each bucket, seconds since epoch
+    timestamps: List[float]
+    samples: List[int]
+    metrics: Dict[str, SignalHistoryMetric]
+    # Last value seen in each bucket
+    rat: List[Optional[AccessTechnology]]
+    cell_id: List[Optional[int]]
+    band: List[Optional[int]]
+
+# Data usage related
+
+class DataUsageBucket(Enum):
+    RAW = "raw"
+    HOUR = "hour"
+    DAY = "day"
+
+
+class DataUsagePoint(BaseModel):
+    # Start of the bucket, or time of the read for raw, seconds since epoch
+    timestamp: float
+    # Bytes received and transmitted in the bucket, or since the previous read for raw
+    rx: int
+    tx: int
+
+
+class DataUsageHistory(BaseModel):
+    bucket: DataUsageBucket
+    points: List[DataUsagePoint]
+
 # Network related
 
 class OperatorSelectionMode(Enum):
@@ -216,3 +292,26 @@ class OperatorInfo(BaseModel):
     format: OperatorFormat
     operator: str
     act: OperatorAct
+
+
+class NetworkRegistrationStatus(Enum):
+    NOT_REGISTERED = "0"
+    HOME = "1"
+    SEARCHING = "2"
+    DENIED = "3"
+    UNKNOWN = "4"
+    ROAMING = "5"
+
+
+class NetworkRegistration(BaseModel):
+    status: NetworkRegistrationStatus
+    # Location area (CREG) or tracking area (CEREG) code and cell id in hex, reported while registered
+    area_code: Optional[str] = None
+    cell_id: Optional[str] = None
+    act: Optional[OperatorAct] = None
+
+
+class ModemRegistration(BaseModel):
+    # Circuit switched (+CREG) and EPS (+CEREG) registration, None if the modem does not report it
+    cs: Optional[NetworkRegistration] = None
+    eps: Optional[NetworkRegistration] = None
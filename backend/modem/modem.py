@@ -1,17 +1,24 @@
 import abc
 import hashlib
+import os
 import re
+from dataclasses import dataclass, field
+from datetime import datetime
 from functools import wraps
-from typing import Any, Callable, List, Optional, Tuple, Type, Self, cast
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Self, cast
 
-from commonwealth.settings.manager import PydanticManager
-from config import SERVICE_NAME
-from settings import SettingsV1, DataUsageSettings, DataUsageControlSettings, ModemsSettings
+from persistence import SettingsPersistence
+from settings import SettingsV2, DataUsageSettings, DataUsageControlSettings, ModemsSettings
 from serial.tools.list_ports_linux import SysFS
 
-from modem.at import ATCommander, ATDivider, ATCommand
-from modem.exceptions import InvalidModemDevice, InexistentModemPosition
+from modem.at import ATCommander, ATDivider, ATCommand, ATURC
+from modem.exceptions import InvalidModemDevice, InexistentModemPosition, SerialSafeReadFailed
+from modem.scheduler import ATPortScheduler
+from modem.usage import DataUsageStore
 from modem.models import (
+    ATPortQueueStats,
+    DataUsageBucket,
+    DataUsageHistory,
     ModemDeviceDetails,
     ModemCellInfo,
     ModemClockDetails,
@@ -19,6 +26,10 @@ from modem.models import (
     ModemSignalQuality,
     ModemSIMStatus,
     ModemFunctionality,
+    ModemRegistration,
+    NetworkRegistration,
+    NetworkRegistrationStatus,
+    OperatorAct,
     OperatorInfo,
     PDPContext,
     PDPAuthentication,
@@ -26,39 +37,146 @@ from modem.models import (
     USBNetMode,
     PDPType,
 )
-from utils import arr_to_model, get_modem_descriptors
+from utils import arr_to_model, get_modem_descriptors, row_decoder
+
+# Registration unsolicited result codes and the field of ModemRegistration they update
+REGISTRATION_URCS: Dict[str, str] = {"+CREG:": "cs", "+CEREG:": "eps"}
+
+
+@dataclass
+class _ModemIdentity:
+    # tty nodes and their inodes when read, nodes are recreated with new inodes when the modem is replugged
+    fingerprint: Tuple[Tuple[str, int], ...]
+    # Last SIM status seen, IMSI and settings looked up by IMEI may change when it changes
+    sim_status: Optional[ModemSIMStatus] = None
+    # Results of identity methods by method name
+    values: Dict[str, Any] = field(default_factory=dict)
+
+
+def _network_registration(fields: List[Optional[str]]) -> NetworkRegistration:
+    """Registration from <stat>[,<lac>,<ci>[,<AcT>]] fields, as in +CREG and +CEREG with n=2"""
+    return NetworkRegistration(
+        status=NetworkRegistrationStatus(fields[0]),
+        area_code=fields[1] if len(fields) > 1 else None,
+        cell_id=fields[2] if len(fields) > 2 else None,
+        act=OperatorAct(fields[3]) if len(fields) > 3 and fields[3] else None,
+    )
+
+
+class _RegistrationWatch:
+    """
+    Registration of a modem kept up to date by the +CREG and +CEREG unsolicited result codes received by a session,
+    valid while that session stays open and the modem does not restart (which disables them again).
+    """
+
+    def __init__(self, commander: ATCommander) -> None:
+        self.commander = commander
+        self.registration = ModemRegistration()
+        self._subscriptions = [commander.subscribe(prefix) for prefix in (*REGISTRATION_URCS, "RDY")]
+
+    def apply(self, prefix: str, fields: List[Optional[str]]) -> None:
+        setattr(self.registration, REGISTRATION_URCS[prefix], _network_registration(fields))
+
+    def update(self) -> bool:
+        """Applies the URCs received so far, False when they can not be trusted anymore and should be enabled again"""
+        if not self.commander.is_pooled:
+            self.close()
+            return False
+        for subscription in self._subscriptions:
+            urcs: List[ATURC] = subscription.pending()
+            if subscription.prefix == "RDY" and urcs:
+                self.close()
+                return False
+            for urc in urcs:
+                try:
+                    self.apply(subscription.prefix, urc.data)
+                except ValueError:
+                    continue
+        return True
+
+    def close(self) -> None:
+        for subscription in self._subscriptions:
+            self.commander.unsubscribe(subscription)
 
 
 class Modem(abc.ABC):
-    _manager: PydanticManager = PydanticManager(SERVICE_NAME, SettingsV1)
-
     # This allow other modules to set a backup position in case the modem does not provide one
     _external_position: Optional[Tuple[float, float]] = None
 
+    # Static identity data by device, only read again from the modem after reboot, factory reset, hotplug or SIM change
+    _identities: Dict[str, _ModemIdentity] = {}
+
+    # Registration by device, updated by unsolicited result codes instead of polling
+    _registrations: Dict[str, _RegistrationWatch] = {}
+
+    # Adapters by USB (vendor id, product id), adapters register themselves by declaring usb_ids
+    _adapters: Dict[Tuple[int, int], List[Type["Modem"]]] = {}
+
+    # USB (vendor id, product id) pairs handled by the adapter, and text of the USB product string telling apart
+    # adapters of modems sharing the same ids
+    usb_ids: Tuple[Tuple[int, int], ...] = ()
+    usb_product: str = ""
+
+    # Detected modems by id, kept up to date by the hotplug monitor while it runs, None means scan on every call
+    _devices: Optional[Dict[str, "Modem"]] = None
+
     @property
-    def _settings(self) -> SettingsV1:
-        return cast(SettingsV1, self._manager.settings)
+    def _settings(self) -> SettingsV2:
+        return SettingsPersistence().settings
 
-    @staticmethod
-    def connected_devices() -> List["Modem"]:
-        def get_all_subclasses(cls: Type) -> List[Type]:
-            subclasses = cls.__subclasses__()
-            for subclass in subclasses:
-                subclasses.extend(get_all_subclasses(subclass))
-            return subclasses
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        # Only adapters declaring their own USB ids are registered, base classes shared by adapters are not
+        for usb_id in cls.__dict__.get("usb_ids", ()):
+            Modem._adapters.setdefault(usb_id, []).append(cls)
+
+    @classmethod
+    def _adapter_for(cls, ports: List[SysFS]) -> Optional[Type["Modem"]]:
+        port = ports[0]
+        candidates = cls._adapters.get((port.vid, port.pid))
+        if not candidates:
+            return None
+        product = port.product or ""
+        return next((adapter for adapter in candidates if adapter.usb_product in product), None)
 
+    @staticmethod
+    def _scan_devices() -> List["Modem"]:
         descriptors = get_modem_descriptors()
-        all_modem_classes = get_all_subclasses(Modem)
+
+        # Forget identities of unplugged modems
+        for device in set(Modem._identities) - set(descriptors):
+            Modem._identities.pop(device)
+        for device in set(Modem._registrations) - set(descriptors):
+            Modem._registrations.pop(device).close()
+
         return [
-            modem
-            for subclass in all_modem_classes
+            adapter(device, ports)
             for device, ports in descriptors.items()
-            if (modem := subclass(device, ports))._detected()
+            if (adapter := Modem._adapter_for(ports)) is not None
         ]
 
+    @staticmethod
+    def refresh_devices() -> None:
+        """Scan sysfs again and replace the registry of detected modems"""
+        Modem._devices = {modem.id: modem for modem in Modem._scan_devices()}
+
+    @staticmethod
+    def clear_devices() -> None:
+        """Stop using the registry, every call scans sysfs again"""
+        Modem._devices = None
+
+    @staticmethod
+    def connected_devices() -> List["Modem"]:
+        if Modem._devices is not None:
+            return list(Modem._devices.values())
+        return Modem._scan_devices()
+
     @classmethod
     def get_device(cls, id: str) -> Type["Modem"]:
-        modem = next((modem for modem in cls.connected_devices() if modem.id == id), None)
+        if Modem._devices is not None:
+            modem = Modem._devices.get(id)
+        else:
+            modem = next((modem for modem in cls._scan_devices() if modem.id == id), None)
         if not modem:
             raise InvalidModemDevice(f"Device {id} not found in any implementation.")
 
@@ -74,11 +192,8 @@ class Modem(abc.ABC):
         self.product: Optional[str] = ports[0].product if len(ports) > 0 else None
 
     @abc.abstractmethod
-    def _detected(self) -> bool:
-        return False
-
-    @abc.abstractmethod
-    async def at_commander(self) -> ATCommander:
+    async def at_commander(self, urc: bool = False) -> ATCommander:
+        """Borrowed AT session, urc asks for the port the modem sends unsolicited result codes to"""
         raise NotImplementedError
 
     @staticmethod
@@ -90,6 +205,66 @@ class Modem(abc.ABC):
                 return await func(self, cmd, *args, **kwargs)
         return wrapper
 
+    @staticmethod
+    def with_urc_at_commander(func: Callable[..., Any]) -> Callable[..., Any]:
+        """Same as with_at_commander on the URC port, for commands answered with unsolicited result codes"""
+        @wraps(func)
+        async def wrapper(self: Self, *args: Any, **kwargs: Any) -> Any:
+            cmd = await self.at_commander(urc=True)
+            with cmd:
+                return await func(self, cmd, *args, **kwargs)
+        return wrapper
+
+    @staticmethod
+    def cached_identity(func: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Serve the result of func from memory after the first call, for data that only changes when the modem is
+        swapped, the SIM changes or the firmware is flashed. Should be applied on top of with_at_commander so cached
+        calls never wait for the AT port.
+        """
+        @wraps(func)
+        async def wrapper(self: Self, *args: Any, **kwargs: Any) -> Any:
+            identity = self._identity()
+            if func.__name__ not in identity.values:
+                identity.values[func.__name__] = await func(self, *args, **kwargs)
+            return identity.values[func.__name__]
+        return wrapper
+
+    def _ports_fingerprint(self) -> Tuple[Tuple[str, int], ...]:
+        def inode(path: str) -> int:
+            try:
+                return os.stat(path).st_ino
+            except OSError:
+                return 0
+        return tuple((port.device, inode(port.device)) for port in self.ports)
+
+    def _identity(self) -> _ModemIdentity:
+        fingerprint = self._ports_fingerprint()
+        identity = self._identities.get(self.device)
+        if identity is None or identity.fingerprint != fingerprint:
+            identity = self._identities[self.device] = _ModemIdentity(fingerprint=fingerprint)
+        return identity
+
+    def invalidate_identity(self) -> None:
+        """Identity data is read again from the modem on next call"""
+        self._identities.pop(self.device, None)
+
+    def _track_sim_status(self, status: ModemSIMStatus) -> None:
+        """Adapters call it with every SIM status read, a change invalidates the identity data"""
+        identity = self._identity()
+        if identity.sim_status is not None and identity.sim_status != status:
+            self.invalidate_identity()
+            identity = self._identity()
+        identity.sim_status = status
+
+    def get_at_queue_stats(self) -> List[ATPortQueueStats]:
+        """Queue depth and wait times by priority class of the AT ports of this modem that were used"""
+        return [
+            ATPortScheduler.get(port.device).stats()
+            for port in self.ports
+            if port.device in ATPortScheduler._schedulers
+        ]
+
     @classmethod
     def set_external_positioning(cls, latitude: float, longitude: float) -> None:
         cls._external_position = (latitude, longitude)
@@ -105,14 +280,14 @@ class Modem(abc.ABC):
             modem = ModemsSettings(
                 identifier=imei,
                 configured=False,
-                data_usage=DataUsageSettings(),
+                data_usage=DataUsageControlSettings(),
             )
 
         return modem
 
     def _save_modem_settings(self, modem: ModemsSettings) -> None:
         self._settings.modems[modem.identifier] = modem
-        self._manager.save()
+        SettingsPersistence().mark_dirty()
 
     # Common AT commands, we supply a basic implementation for all modems but can be overridden if needed by device
 
@@ -122,15 +297,39 @@ class Modem(abc.ABC):
         modem.data_usage.data_limit = control.data_limit
         modem.data_usage.data_reset_day = control.data_reset_day
         self._save_modem_settings(modem)
-        return cast(DataUsageSettings, modem.data_usage)
+        return self._data_usage_details(modem)
 
     async def get_data_usage_details(self) -> DataUsageSettings:
+        return self._data_usage_details(self._fetch_modem_settings(await self.get_imei()))
+
+    def _data_usage_details(self, modem: ModemsSettings) -> DataUsageSettings:
+        log = DataUsageStore().log(modem.identifier)
+        last_reset = (
+            datetime.strptime(modem.data_usage.last_reset_date, "%Y-%m-%d").timestamp()
+            if modem.data_usage.last_reset_date
+            else float("-inf")
+        )
+        return DataUsageSettings(
+            **modem.data_usage.model_dump(),
+            data_used=log.last[1:] if log.last else (0, 0),
+            data_points=log.daily_totals(last_reset),
+        )
+
+    async def record_data_usage(self) -> DataUsageSettings:
+        """Reads the data counters of the modem into its data usage log"""
         modem = self._fetch_modem_settings(await self.get_imei())
-        return cast(DataUsageSettings, modem.data_usage)
+        rx, tx = await self.get_data_usage()
+        DataUsageStore().log(modem.identifier).append(rx, tx)
+        return self._data_usage_details(modem)
+
+    async def get_data_usage_history(self, start: float, end: float, bucket: DataUsageBucket) -> DataUsageHistory:
+        modem = self._fetch_modem_settings(await self.get_imei())
+        return DataUsageStore().log(modem.identifier).history(start, end, bucket)
 
     @with_at_commander
     async def reboot(self, cmd: ATCommander) -> None:
         await cmd.reboot_modem()
+        self.invalidate_identity()
 
     @with_at_commander
     async def disable(self, cmd: ATCommander) -> None:
@@ -144,20 +343,51 @@ class Modem(abc.ABC):
     @with_at_commander
     async def factory_reset(self, cmd: ATCommander) -> None:
         await cmd.reset_to_factory()
+        self.invalidate_identity()
 
     @with_at_commander
     async def get_pdp_info(self, cmd: ATCommander) -> List[PDPContext]:
         response = await cmd.get_pdp_info()
 
-        return [
-            arr_to_model(info, PDPContext)
-            for info in response.data
-        ]
+        return row_decoder(PDPContext).decode_many(response.data)
 
     @with_at_commander
     async def get_operator_info(self, cmd: ATCommander) -> OperatorInfo:
         return arr_to_model((await cmd.get_operator_info()).data[0], OperatorInfo)
 
+    async def get_registration(self) -> ModemRegistration:
+        """
+        Network registration, tracked through the +CREG and +CEREG unsolicited result codes. Only the first read and
+        the ones after the modem restarted or its URC session was closed go to the modem.
+        """
+        watch = self._registrations.get(self.device)
+        if watch is None or not watch.update():
+            watch = self._registrations[self.device] = await self._watch_registration()
+        return watch.registration
+
+    @with_urc_at_commander
+    async def _watch_registration(self, cmd: ATCommander) -> _RegistrationWatch:
+        # Subscribed before enabling, so a change between enabling and reading the current state is not missed
+        watch = _RegistrationWatch(cmd)
+        try:
+            for prefix, command in (
+                ("+CREG:", ATCommand.NETWORK_REGISTRATION),
+                ("+CEREG:", ATCommand.EPS_NETWORK_REGISTRATION),
+            ):
+                try:
+                    # Expected: OK and then +CREG: 2,<stat>[,<lac>,<ci>[,<AcT>]]
+                    await cmd.command(command, ATDivider.EQ, "2", cmd_id_response=False)
+                    response = await cmd.command(command, ATDivider.QUESTION)
+                except SerialSafeReadFailed:
+                    # e.g. modems without LTE have no +CEREG
+                    continue
+                watch.apply(prefix, response.data[0][1:])
+        except Exception:
+            watch.close()
+            raise
+        watch.update()
+        return watch
+
     @with_at_commander
     async def get_signal_strength(self, cmd: ATCommander) -> ModemSignalQuality:
         data = cast(
@@ -171,6 +401,10 @@ class Modem(abc.ABC):
 
     @with_at_commander
     async def set_apn(self, cmd: ATCommander, profile: int, apn: str, protocol: Optional[PDPType] = PDPType.IP) -> None:
+        await self._set_apn(cmd, profile, apn, protocol)
+
+    async def _set_apn(self, cmd: ATCommander, profile: int, apn: str, protocol: Optional[PDPType] = PDPType.IP) -> None:
+        # Used by methods that already hold the AT port, borrowing it again would wait for ourselves
         await cmd.command(
             ATCommand.CONFIGURE_PDP_CONTEXT,
             ATDivider.EQ,
@@ -180,7 +414,7 @@ class Modem(abc.ABC):
 
     @with_at_commander
     async def set_pdp_authentication(self, cmd: ATCommander, profile: int, authentication: PDPAuthentication) -> None:
-        await self.set_apn(profile, authentication.apn, authentication.protocol)
+        await self._set_apn(cmd, profile, authentication.apn, authentication.protocol)
 
         if authentication.username is None or authentication.password is None:
             return
@@ -211,6 +445,7 @@ class Modem(abc.ABC):
             gmt_offset=int(time_str.group(2)) / 4,
         )
 
+    @cached_identity
     @with_at_commander
     async def get_imei(self, cmd: ATCommander) -> str:
         return (await cmd.get_imei()).data[0][0]
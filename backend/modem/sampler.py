@@ -0,0 +1,182 @@
+import math
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Optional, Tuple, cast
+
+from commonwealth.utils.Singleton import Singleton
+
+from modem.models import (
+    AccessTechnology,
+    ModemCellInfo,
+    ModemSignalHistory,
+    ModemSignalQuality,
+    SignalHistoryMetric,
+)
+from modem.modem import Modem
+from modem.status import STATUS_FIELDS, ModemStatusMonitor
+
+SAMPLE_INTERVAL = STATUS_FIELDS["signal"][1]
+# 24 hours at SAMPLE_INTERVAL, about 250 kB for each modem
+HISTORY_CAPACITY = 8640
+# Downsampled history never has more buckets than this, the resolution is raised to fit
+MAX_BUCKETS = 1000
+
+METRICS = ("rsrp", "rsrq", "sinr", "rssi", "csq")
+# Value stored in the integer columns when the modem did not report it
+_MISSING = -32768
+_RATS = list(AccessTechnology)
+# +CSQ: 99 (not known) once converted by Modem.get_signal_strength
+_CSQ_UNKNOWN_DBM = 2 * 99 - 113
+
+
+def _reduce(values: array) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    """Min, max and mean of the reported values, the common case of all or none reported never leaves C"""
+    missing = values.count(_MISSING)
+    if missing == len(values):
+        return None, None, None
+    if missing:
+        values = array(values.typecode, [value for value in values if value != _MISSING])
+    return min(values), max(values), round(sum(values) / len(values), 2)
+
+
+class SignalHistory:
+    """
+    Signal and serving cell samples of a modem in fixed size ring buffers, one array for each column, so memory does
+    not grow with uptime. Timestamps are monotonic, wall clock jumps (NTP sync on boards without RTC) do not break
+    their order and are only applied when the history is read.
+    """
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY) -> None:
+        self.capacity = capacity
+        self._timestamps = array("d", [0.0]) * capacity
+        self._metrics = {name: array("h", [_MISSING]) * capacity for name in METRICS}
+        self._rats = array("b", [-1]) * capacity
+        self._cell_ids = array("q", [-1]) * capacity
+        self._bands = array("h", [_MISSING]) * capacity
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(
+        self,
+        metrics: Dict[str, Optional[int]],
+        rat: Optional[AccessTechnology],
+        cell_id: Optional[int],
+        band: Optional[int],
+        timestamp: Optional[float] = None,
+    ) -> None:
+        index = self._next
+        self._timestamps[index] = time.monotonic() if timestamp is None else timestamp
+        for name, column in self._metrics.items():
+            value = metrics.get(name)
+            column[index] = _MISSING if value is None else value
+        self._rats[index] = -1 if rat is None else _RATS.index(rat)
+        self._cell_ids[index] = -1 if cell_id is None else cell_id
+        self._bands[index] = _MISSING if band is None else band
+
+        self._next = (index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _ordered(self, column: array) -> array:
+        if self._count < self.capacity:
+            return column[:self._count]
+        return column[self._next:] + column[:self._next]
+
+    def downsample(self, since: Optional[float], resolution: float) -> ModemSignalHistory:
+        """Min, max and mean of each metric in buckets of resolution seconds, for samples taken after since (epoch)"""
+        wall_offset = time.time() - time.monotonic()
+        timestamps = self._ordered(self._timestamps)
+        start = bisect_left(timestamps, since - wall_offset) if since is not None else 0
+        timestamps = timestamps[start:]
+        if len(timestamps) > 1:
+            resolution = max(resolution, (timestamps[-1] - timestamps[0]) / MAX_BUCKETS)
+
+        # Buckets are aligned to multiples of resolution in wall clock, so consecutive reads give the same buckets
+        buckets = []
+        low = 0
+        while low < len(timestamps):
+            bucket_start = math.floor((timestamps[low] + wall_offset) / resolution) * resolution
+            high = max(bisect_left(timestamps, bucket_start + resolution - wall_offset, low), low + 1)
+            buckets.append((bucket_start, low, high))
+            low = high
+
+        history = ModemSignalHistory(
+            resolution=resolution,
+            timestamps=[bucket_start for bucket_start, _, _ in buckets],
+            samples=[high - low for _, low, high in buckets],
+            metrics={},
+            rat=[],
+            cell_id=[],
+            band=[],
+        )
+        for name, column in self._metrics.items():
+            values = self._ordered(column)[start:]
+            reduced = [_reduce(values[low:high]) for _, low, high in buckets]
+            history.metrics[name] = SignalHistoryMetric(
+                min=[minimum for minimum, _, _ in reduced],
+                max=[maximum for _, maximum, _ in reduced],
+                mean=[mean for _, _, mean in reduced],
+            )
+
+        rats, cell_ids, bands = (self._ordered(column)[start:] for column in (self._rats, self._cell_ids, self._bands))
+        for _, _, high in buckets:
+            history.rat.append(_RATS[rats[high - 1]] if rats[high - 1] >= 0 else None)
+            history.cell_id.append(cell_ids[high - 1] if cell_ids[high - 1] >= 0 else None)
+            history.band.append(bands[high - 1] if bands[high - 1] != _MISSING else None)
+        return history
+
+
+class ModemSignalSampler(metaclass=Singleton):
+    """
+    Keeps the signal quality and serving cell of every connected modem in a SignalHistory for each modem. Samples
+    come from the status monitor, which keeps them fresh independently of the frontend polling, so sampling costs
+    no serial traffic of its own.
+    """
+
+    def __init__(self) -> None:
+        self._histories: Dict[str, SignalHistory] = {}
+
+    def start(self) -> None:
+        ModemStatusMonitor().keep_fresh("cell", "signal")
+        ModemStatusMonitor().add_listener(self._on_status)
+
+    def stop(self) -> None:
+        ModemStatusMonitor().remove_listener(self._on_status)
+
+    def history(self, modem_id: str, since: Optional[float], resolution: float) -> ModemSignalHistory:
+        # Modems not sampled yet have an empty history
+        history = self._histories.get(modem_id) or SignalHistory(capacity=1)
+        return history.downsample(since, resolution)
+
+    def _on_status(self, modem_id: str, field: str, value: Any) -> None:
+        # Cell is read right before signal, so each signal read is a sample of both
+        if field != "signal":
+            return
+
+        # Histories of modems that are gone are dropped, so memory stays bounded by the connected ones
+        connected = {modem.id for modem in Modem.connected_devices()}
+        for gone in [history_id for history_id in self._histories if history_id not in connected]:
+            del self._histories[gone]
+
+        signal = cast(ModemSignalQuality, value)
+        metrics: Dict[str, Optional[int]] = {
+            "csq": signal.signal_strength_dbm if signal.signal_strength_dbm != _CSQ_UNKNOWN_DBM else None,
+        }
+
+        cell_info = cast(Optional[ModemCellInfo], ModemStatusMonitor().value(modem_id, "cell"))
+        serving_cell = cell_info.serving_cell if cell_info is not None else None
+        if serving_cell is not None and serving_cell.rat == AccessTechnology.LTE:
+            metrics["rsrp"] = serving_cell.signal_quality_dbm
+            metrics["rsrq"] = serving_cell.signal_rsrq_db
+            metrics["sinr"] = serving_cell.signal_inr_db
+            metrics["rssi"] = serving_cell.signal_rssi_dbm
+
+        self._histories.setdefault(modem_id, SignalHistory()).append(
+            metrics,
+            rat=serving_cell.rat if serving_cell else None,
+            cell_id=serving_cell.cell_id if serving_cell else None,
+            band=serving_cell.band if serving_cell else None,
+        )
@@ -0,0 +1,167 @@
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Deque, Dict, Iterator, List, Optional
+
+from modem.exceptions import ATConnectionTimeout
+from modem.models import ATPortQueueStats, ATQueueClassStats
+
+
+class ATPriority(IntEnum):
+    INTERACTIVE = 0
+    DIAGNOSTICS = 1
+    BACKGROUND = 2
+
+
+# How many grants each class gets per round while others are waiting, lower classes never starve
+_PRIORITY_WEIGHTS: Dict[ATPriority, int] = {
+    ATPriority.INTERACTIVE: 4,
+    ATPriority.DIAGNOSTICS: 2,
+    ATPriority.BACKGROUND: 1,
+}
+
+# Priority of AT commands issued by the current task, API calls are interactive unless told otherwise
+_current_priority: ContextVar[ATPriority] = ContextVar("at_priority", default=ATPriority.INTERACTIVE)
+
+
+@contextmanager
+def at_priority(priority: ATPriority) -> Iterator[None]:
+    """All AT ports borrowed inside this block by the current task are queued with the given priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class _ClassStats:
+    def __init__(self) -> None:
+        self.served = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def add(self, wait: float) -> None:
+        self.served += 1
+        self.total_wait += wait
+        self.last_wait = wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+class ATPortScheduler:
+    """
+    Grants exclusive use of an AT port to one task at a time. Waiters are queued by priority class and served
+    with a weighted round robin, so interactive requests go first without starving background ones.
+    """
+    _schedulers: Dict[str, "ATPortScheduler"] = {}
+
+    def __init__(self, port: str) -> None:
+        self.port = port
+        self.busy = False
+        self._waiters: Dict[ATPriority, Deque[asyncio.Future]] = {priority: deque() for priority in ATPriority}
+        self._credits: Dict[ATPriority, int] = dict(_PRIORITY_WEIGHTS)
+        self._stats: Dict[ATPriority, _ClassStats] = {priority: _ClassStats() for priority in ATPriority}
+
+    @classmethod
+    def get(cls, port: str) -> "ATPortScheduler":
+        scheduler = cls._schedulers.get(port)
+        if scheduler is None:
+            scheduler = cls._schedulers[port] = cls(port)
+        return scheduler
+
+    @classmethod
+    def is_busy(cls, port: str) -> bool:
+        scheduler = cls._schedulers.get(port)
+        return scheduler is not None and scheduler.busy
+
+    @classmethod
+    def least_loaded(cls, ports: List[str]) -> str:
+        """Port with fewer tasks holding or waiting for it, ties keep the given order"""
+        return min(ports, key=lambda port: cls.get(port).load)
+
+    @property
+    def load(self) -> int:
+        return int(self.busy) + sum(len(waiters) for waiters in self._waiters.values())
+
+    async def acquire(self, priority: Optional[ATPriority] = None, timeout: Optional[float] = None) -> None:
+        """
+        Wait for the port to be free, priority defaults to the one of the current task. Raises ATConnectionTimeout
+        if not granted before timeout, timeout of 0 only takes the port if it is free.
+        """
+        priority = _current_priority.get() if priority is None else priority
+        loop = asyncio.get_running_loop()
+
+        if not self.busy and not any(self._waiters.values()):
+            self.busy = True
+            self._stats[priority].add(0.0)
+            return
+
+        if timeout is not None and timeout <= 0:
+            self._stats[priority].timeouts += 1
+            raise ATConnectionTimeout(f"AT port {self.port} is busy")
+
+        started = loop.time()
+        waiter = loop.create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as error:
+            if waiter.done() and not waiter.cancelled():
+                # Port was granted right when we gave up, pass it along
+                self.release()
+            elif waiter in self._waiters[priority]:
+                self._waiters[priority].remove(waiter)
+
+            if isinstance(error, asyncio.TimeoutError):
+                self._stats[priority].timeouts += 1
+                raise ATConnectionTimeout(f"Timeout waiting for AT port {self.port}") from error
+            raise
+
+        self._stats[priority].add(loop.time() - started)
+
+    def release(self) -> None:
+        """Give the port to the next waiter or mark it as free"""
+        priority = self._next_priority()
+        while priority is not None:
+            waiter = self._waiters[priority].popleft()
+            if not waiter.done():
+                # Port ownership is transferred, so it stays busy
+                waiter.set_result(None)
+                return
+            priority = self._next_priority()
+        self.busy = False
+
+    def _next_priority(self) -> Optional[ATPriority]:
+        candidates = [priority for priority in ATPriority if self._waiters[priority]]
+        if not candidates:
+            return None
+
+        for priority in candidates:
+            if self._credits[priority] > 0:
+                self._credits[priority] -= 1
+                return priority
+
+        # Every waiting class used its share, start a new round
+        self._credits = dict(_PRIORITY_WEIGHTS)
+        self._credits[candidates[0]] -= 1
+        return candidates[0]
+
+    def stats(self) -> ATPortQueueStats:
+        return ATPortQueueStats(
+            port=self.port,
+            busy=self.busy,
+            classes={
+                priority.name.lower(): ATQueueClassStats(
+                    queued=len(self._waiters[priority]),
+                    served=stats.served,
+                    timeouts=stats.timeouts,
+                    avg_wait=stats.total_wait / stats.served if stats.served else 0.0,
+                    max_wait=stats.max_wait,
+                    last_wait=stats.last_wait,
+                )
+                for priority, stats in self._stats.items()
+            },
+        )
@@ -0,0 +1,186 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from commonwealth.utils.Singleton import Singleton
+from loguru import logger
+
+from modem.models import ModemStatus, ModemStatusField
+from modem.modem import Modem
+from modem.scheduler import ATPriority, at_priority
+
+# Status field: Modem method reading it and freshness budget in seconds, the age after which it is read again.
+# Fields are read in this order, cell goes right before signal so listeners of signal also have a fresh cell.
+STATUS_FIELDS: Dict[str, Tuple[str, float]] = {
+    "details": ("get_mt_info", 300),
+    "sim_status": ("get_sim_status", 10),
+    "cell": ("get_cell_info", 10),
+    "signal": ("get_signal_strength", 10),
+    "operator": ("get_operator_info", 30),
+    # Served from the registration URCs, only the first read goes to the modem
+    "registration": ("get_registration", 5),
+    "pdp": ("get_pdp_info", 30),
+    "functionality": ("get_functionality", 30),
+    "clock": ("get_clock", 60),
+    "data_usage": ("get_data_usage_details", 60),
+}
+# Fields are only kept fresh while someone asks for them, so an idle UI costs no serial traffic
+WATCH_TIMEOUT = 120
+# The scheduler checks the budgets this often
+TICK_INTERVAL = 1
+# A request for fields that were never read waits this long for the scheduler to read them
+FIRST_READ_TIMEOUT = 5
+
+
+class _FieldState:
+    __slots__ = ("value", "updated", "attempted", "error", "requested")
+
+    def __init__(self) -> None:
+        self.value: Any = None
+        # Last successful read and last read, monotonic
+        self.updated: Optional[float] = None
+        self.attempted: Optional[float] = None
+        self.error: Optional[str] = None
+        self.requested: Optional[float] = None
+
+
+class ModemStatusMonitor(metaclass=Singleton):
+    """
+    Server side snapshot of the status of each connected modem. A single task reads each field from the modem when
+    it is older than its freshness budget, requests are served from memory, so any number of clients cost no extra
+    serial traffic.
+    """
+
+    def __init__(self) -> None:
+        self._snapshots: Dict[str, Dict[str, _FieldState]] = {}
+        # Fields kept fresh even when nobody asks for them, e.g. for the signal sampler
+        self._pinned: Set[str] = set()
+        self._listeners: List[Callable[[str, str, Any], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._round_done = asyncio.Event()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._task = loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def keep_fresh(self, *fields: str) -> None:
+        self._pinned.update(fields)
+
+    def add_listener(self, listener: Callable[[str, str, Any], None]) -> None:
+        """Listener is called with modem id, field and value each time a field is read"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, str, Any], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _snapshot(self, modem_id: str) -> Dict[str, _FieldState]:
+        snapshot = self._snapshots.get(modem_id)
+        if snapshot is None:
+            snapshot = self._snapshots[modem_id] = {field: _FieldState() for field in STATUS_FIELDS}
+        return snapshot
+
+    def watch(self, modem_id: str, fields: Iterable[str]) -> None:
+        """Keep fields of a modem fresh for the next WATCH_TIMEOUT seconds"""
+        snapshot = self._snapshot(modem_id)
+        now = time.monotonic()
+        for field in fields:
+            snapshot[field].requested = now
+            if snapshot[field].attempted is None:
+                # Fields nobody asked for before are read by the next round, which is started right away
+                self._wakeup.set()
+
+    async def status(self, modem: Modem, fields: Optional[Iterable[str]] = None) -> ModemStatus:
+        fields = list(fields) if fields is not None else list(STATUS_FIELDS)
+        unknown = [field for field in fields if field not in STATUS_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown status fields: {', '.join(unknown)}")
+
+        self.watch(modem.id, fields)
+        snapshot = self._snapshot(modem.id)
+
+        deadline = time.monotonic() + FIRST_READ_TIMEOUT
+        while any(snapshot[field].attempted is None for field in fields) and self._task is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._round_done.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        now = time.monotonic()
+        return ModemStatus(
+            id=modem.id,
+            fields={
+                field: ModemStatusField(
+                    value=snapshot[field].value,
+                    age=round(now - snapshot[field].updated, 3) if snapshot[field].updated is not None else None,
+                    error=snapshot[field].error,
+                )
+                for field in fields
+            },
+        )
+
+    def value(self, modem_id: str, field: str) -> Any:
+        """Last value read of a field, None if it was not read"""
+        snapshot = self._snapshots.get(modem_id)
+        return snapshot[field].value if snapshot is not None else None
+
+    async def _run(self) -> None:
+        # Refreshing should always give way to user requests on the AT ports
+        with at_priority(ATPriority.BACKGROUND):
+            while True:
+                await self._refresh()
+                round_done, self._round_done = self._round_done, asyncio.Event()
+                round_done.set()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), TICK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _refresh(self) -> None:
+        modems = Modem.connected_devices()
+
+        connected = {modem.id for modem in modems}
+        for modem_id in list(self._snapshots):
+            if modem_id not in connected:
+                del self._snapshots[modem_id]
+
+        for modem in modems:
+            snapshot = self._snapshot(modem.id)
+            for field, (method, budget) in STATUS_FIELDS.items():
+                state = snapshot[field]
+                now = time.monotonic()
+                watched = field in self._pinned or (
+                    state.requested is not None and now - state.requested < WATCH_TIMEOUT
+                )
+                if not watched or (state.attempted is not None and now - state.attempted < budget):
+                    continue
+                await self._read(modem, field, method, state)
+
+    async def _read(self, modem: Modem, field: str, method: str, state: _FieldState) -> None:
+        try:
+            value = await getattr(modem, method)()
+        except Exception as e:
+            # Failed reads are also retried after the budget, the last good value is kept meanwhile
+            state.error = str(e) or type(e).__name__
+            state.attempted = time.monotonic()
+            logger.debug(f"Failed to read {field} of modem {modem.id}: {state.error}")
+            return
+
+        state.value = value
+        state.error = None
+        state.updated = state.attempted = time.monotonic()
+        for listener in list(self._listeners):
+            try:
+                listener(modem.id, field, value)
+            except Exception as e:
+                logger.error(f"Status listener failed on {field} of modem {modem.id}: {e}")
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional, Tuple
+
+from commonwealth.utils.Singleton import Singleton
+from pydantic_core import to_json
+
+from modem.status import ModemStatusMonitor
+
+# Status fields pushed to stream subscribers
+STREAM_FIELDS = ("signal", "cell", "sim_status", "operator", "registration", "data_usage", "functionality")
+# Deltas kept for subscribers resuming from a sequence number, older ones get a snapshot instead
+BACKLOG_SIZE = 256
+# Idle streams send a heartbeat this often, it also keeps the streamed fields watched in the status monitor
+HEARTBEAT_INTERVAL = 15
+
+
+class StreamFormat(Enum):
+    NDJSON = "ndjson"
+    SSE = "sse"
+
+
+# Sequence number and the event encoded as NDJSON and as SSE
+_Entry = Tuple[int, Tuple[bytes, bytes]]
+
+
+def _encode(seq: int, event: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    """Event as NDJSON line and SSE message, encoded once and shared by all subscribers"""
+    payload = to_json(event)
+    return payload + b"\n", b"id: %d\ndata: %s\n\n" % (seq, payload)
+
+
+class _ModemStream:
+    def __init__(self, modem_id: str) -> None:
+        self.modem_id = modem_id
+        self.seq = 0
+        self._values: Dict[str, Any] = {}
+        self._backlog: Deque[_Entry] = deque(maxlen=BACKLOG_SIZE)
+        # Replaced on each publish, subscribers wait on the current one and then read the backlog
+        self._published = asyncio.Event()
+
+    def publish(self, field: str, value: Any) -> None:
+        if field in self._values and self._values[field] == value:
+            return
+        self._values[field] = value
+        self.seq += 1
+        event = {"type": "delta", "seq": self.seq, "time": time.time(), "fields": {field: value}}
+        self._backlog.append((self.seq, _encode(self.seq, event)))
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    def _snapshot(self) -> Tuple[bytes, bytes]:
+        monitor = ModemStatusMonitor()
+        for field in STREAM_FIELDS:
+            if field not in self._values and monitor.value(self.modem_id, field) is not None:
+                self._values[field] = monitor.value(self.modem_id, field)
+        event = {
+            "type": "snapshot",
+            "seq": self.seq,
+            "time": time.time(),
+            "fields": {field: self._values.get(field) for field in STREAM_FIELDS},
+        }
+        return _encode(self.seq, event)
+
+    def _after(self, seq: int) -> Optional[List[_Entry]]:
+        """Backlog entries after seq, None if some of them were already dropped"""
+        if seq == self.seq:
+            return []
+        if seq > self.seq or not self._backlog or self._backlog[0][0] > seq + 1:
+            return None
+        start = seq + 1 - self._backlog[0][0]
+        return [self._backlog[index] for index in range(start, len(self._backlog))]
+
+    async def events(self, since: Optional[int], stream_format: StreamFormat) -> AsyncGenerator[bytes, None]:
+        encoding = 1 if stream_format == StreamFormat.SSE else 0
+        monitor = ModemStatusMonitor()
+        monitor.watch(self.modem_id, STREAM_FIELDS)
+
+        last = -1 if since is None else since
+        while True:
+            pending = self._after(last)
+            if pending is None:
+                # New subscriber, or resuming from a sequence that is gone, starts from the whole state
+                last = self.seq
+                yield self._snapshot()[encoding]
+                continue
+            if pending:
+                for seq, encoded in pending:
+                    last = seq
+                    yield encoded[encoding]
+                continue
+
+            try:
+                await asyncio.wait_for(self._published.wait(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield _encode(self.seq, {"type": "heartbeat", "seq": self.seq, "time": time.time()})[encoding]
+            monitor.watch(self.modem_id, STREAM_FIELDS)
+
+
+class ModemStatusStreams(metaclass=Singleton):
+    """
+    Pushes changes of the status fields of each modem to any number of subscribers. Changes come from the status
+    monitor, each one is encoded once and numbered, subscribers can resume after a sequence number.
+    """
+
+    def __init__(self) -> None:
+        self._streams: Dict[str, _ModemStream] = {}
+        ModemStatusMonitor().add_listener(self._on_status)
+
+    def _on_status(self, modem_id: str, field: str, value: Any) -> None:
+        stream = self._streams.get(modem_id)
+        if stream is not None and field in STREAM_FIELDS:
+            stream.publish(field, value)
+
+    def subscribe(
+        self, modem_id: str, since: Optional[int] = None, stream_format: StreamFormat = StreamFormat.NDJSON
+    ) -> AsyncGenerator[bytes, None]:
+        """Events of a modem, from a snapshot or from the changes after since if they are still kept"""
+        stream = self._streams.get(modem_id)
+        if stream is None:
+            stream = self._streams[modem_id] = _ModemStream(modem_id)
+        return stream.events(since, stream_format)
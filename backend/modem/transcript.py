@@ -0,0 +1,183 @@
+import asyncio
+import fcntl
+import os
+import struct
+import termios
+import time
+from collections import deque
+from datetime import datetime
+from enum import IntEnum
+from pathlib import Path
+from typing import BinaryIO, Deque, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+# File header: magic, version, wall clock time of the first record and length of the port name that follows it
+_HEADER = struct.Struct("<4sBdH")
+_MAGIC = b"ATTR"
+_VERSION = 1
+# Record: seconds since the first record, direction and length of the payload that follows it
+_RECORD = struct.Struct("<dBH")
+_MAX_PAYLOAD = 0xFFFF
+# Buffered records are flushed to disk at most this often, so a crash loses at most this much of the transcript
+FLUSH_INTERVAL = 1.0
+
+
+class ATDirection(IntEnum):
+    TX = 0
+    RX = 1
+
+
+class ATTranscriptWriter:
+    """
+    Append-only binary log of the bytes written to and read from an AT port, with their monotonic timestamps.
+    """
+
+    def __init__(self, path: Path, port: str) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: Optional[BinaryIO] = open(path, "wb")
+        name = port.encode()
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, time.time(), len(name)) + name)
+        self._started = time.monotonic()
+        self._last_flush = self._started
+
+    @classmethod
+    def for_port(cls, folder: Path, port: str) -> "ATTranscriptWriter":
+        return cls(folder / f"{os.path.basename(port)}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.attr", port)
+
+    def write(self, direction: ATDirection, data: bytes) -> None:
+        if self._file is None or not data:
+            return
+        now = time.monotonic()
+        for i in range(0, len(data), _MAX_PAYLOAD):
+            chunk = data[i:i + _MAX_PAYLOAD]
+            self._file.write(_RECORD.pack(now - self._started, direction, len(chunk)) + chunk)
+        if now - self._last_flush > FLUSH_INTERVAL:
+            self._last_flush = now
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_transcript(path: Path) -> Tuple[str, float, List[Tuple[float, ATDirection, bytes]]]:
+    """Returns the port, wall clock start time and records (timestamp, direction, payload) of a transcript"""
+    data = path.read_bytes()
+    magic, version, started, name_length = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"{path} is not an AT transcript of version {_VERSION}")
+    offset = _HEADER.size
+    port = data[offset:offset + name_length].decode()
+    offset += name_length
+
+    records = []
+    # A transcript cut by a crash may end in the middle of a record, which is dropped
+    while offset + _RECORD.size <= len(data):
+        timestamp, direction, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        if offset + length > len(data):
+            break
+        records.append((timestamp, ATDirection(direction), data[offset:offset + length]))
+        offset += length
+    return port, started, records
+
+
+def _exchanges(
+    records: List[Tuple[float, ATDirection, bytes]]
+) -> Iterator[Tuple[Optional[bytes], List[Tuple[float, bytes]]]]:
+    """Group records by TX, each with the RX that followed it and their delay relative to that TX"""
+    tx: Optional[bytes] = None
+    tx_time = records[0][0] if records else 0.0
+    rx: List[Tuple[float, bytes]] = []
+    for timestamp, direction, payload in records:
+        if direction == ATDirection.TX:
+            yield tx, rx
+            tx, tx_time, rx = payload, timestamp, []
+        else:
+            rx.append((timestamp - tx_time, payload))
+    yield tx, rx
+
+
+class ATReplayTransport:
+    """
+    Serial-like transport answering with the RX of a recorded transcript. Every write releases the RX that followed
+    the matching TX in the recording, with the recorded delays divided by speed (0 replays without delays), so the
+    AT stack goes through the same code path as with the modem that was recorded.
+    The read side is a pipe, which lets the event loop watch it as it does with a tty.
+    """
+
+    def __init__(self, path: Path, speed: float = 1.0) -> None:
+        self.path = path
+        self.speed = speed
+        self.timeout: Optional[float] = 0
+        self.port, _, records = read_transcript(path)
+        exchanges = list(_exchanges(records))
+        # RX before the first TX (e.g. URCs) is released as soon as the port is opened
+        self._exchanges: Deque[Tuple[Optional[bytes], List[Tuple[float, bytes]]]] = deque(exchanges[1:])
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+        self.is_open = True
+        self._pending: Deque[List[Tuple[float, bytes]]] = deque([exchanges[0][1]])
+        self._player: Optional[asyncio.Task] = None
+        self._wake_player()
+
+    def _wake_player(self) -> None:
+        if self._player is None or self._player.done():
+            self._player = asyncio.get_running_loop().create_task(self._play())
+
+    async def _play(self) -> None:
+        # A single player keeps the RX order of the recording even when writes come faster than the replay
+        while self._pending and self.is_open:
+            elapsed = 0.0
+            for delay, payload in self._pending.popleft():
+                if self.speed > 0 and delay > elapsed:
+                    await asyncio.sleep((delay - elapsed) / self.speed)
+                    elapsed = delay
+                if not self.is_open:
+                    return
+                os.write(self._write_fd, payload)
+
+    def write(self, data: bytes) -> int:
+        if not self._exchanges:
+            logger.warning(f"Replay of {self.path} has no more recorded exchanges, ignoring {data!r}")
+            return len(data)
+        recorded, rx = self._exchanges.popleft()
+        if recorded != data:
+            logger.warning(f"Replay of {self.path} diverged, expected {recorded!r} but got {data!r}")
+        self._pending.append(rx)
+        self._wake_player()
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        try:
+            return os.read(self._read_fd, size)
+        except BlockingIOError:
+            return b""
+
+    def read_all(self) -> bytes:
+        return self.read(self.in_waiting or 1)
+
+    @property
+    def in_waiting(self) -> int:
+        buffer = bytearray(4)
+        fcntl.ioctl(self._read_fd, termios.FIONREAD, buffer)
+        return struct.unpack("<I", buffer)[0]
+
+    def fileno(self) -> int:
+        return self._read_fd
+
+    def flush(self) -> None:
+        pass
+
+    def reset_input_buffer(self) -> None:
+        # Whatever is in the pipe was read by the recorded session too, dropping it would break the replay
+        pass
+
+    def close(self) -> None:
+        if self.is_open:
+            self.is_open = False
+            os.close(self._read_fd)
+            os.close(self._write_fd)
@@ -0,0 +1,222 @@
+import functools
+import math
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from commonwealth.utils.Singleton import Singleton
+
+from config import SETTINGS_FOLDER
+from modem.models import DataUsageBucket, DataUsageHistory, DataUsagePoint
+
+# Record: wall clock time and the RX / TX byte counters of the modem at that time
+_RECORD = struct.Struct("<dQQ")
+# Rollup bucket sizes in seconds, buckets are aligned to local time
+ROLLUPS = {DataUsageBucket.HOUR: 3600, DataUsageBucket.DAY: 86400}
+
+_Record = Tuple[float, int, int]
+
+
+@functools.lru_cache(maxsize=4096)
+def _utc_offset(hour: int) -> int:
+    return time.localtime(hour * 3600).tm_gmtoff
+
+
+def bucket_start(timestamp: float, size: int) -> float:
+    """Start of the bucket of size seconds, aligned to local time, holding timestamp"""
+    if math.isinf(timestamp):
+        return timestamp
+    offset = _utc_offset(int(timestamp // 3600))
+    return (timestamp + offset) // size * size - offset
+
+
+def _delta(previous: Optional[_Record], current: _Record) -> Tuple[int, int]:
+    """
+    Bytes transferred between two records, counters going back mean the modem counters were reset. The first record
+    of a log has no previous one, its counters are all transferred since the last reset.
+    """
+    if previous is None:
+        return current[1], current[2]
+    rx = current[1] - previous[1] if current[1] >= previous[1] else current[1]
+    tx = current[2] - previous[2] if current[2] >= previous[2] else current[2]
+    return rx, tx
+
+
+class _RecordFile:
+    """
+    Append-only file of fixed size records ordered by time, read through mmap with binary search, so queries only
+    touch the records in their range.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "ab")
+        # A record cut by a crash is dropped, appends then start at a record boundary again
+        size = self._file.tell()
+        if size % _RECORD.size:
+            self._file.truncate(size - size % _RECORD.size)
+            self._file.seek(0, os.SEEK_END)
+
+    def __len__(self) -> int:
+        return self._file.tell() // _RECORD.size
+
+    def append(self, timestamp: float, rx: int, tx: int) -> None:
+        self._file.write(_RECORD.pack(timestamp, rx, tx))
+        self._file.flush()
+
+    def last(self) -> Optional[_Record]:
+        count = len(self)
+        if not count:
+            return None
+        with open(self.path, "rb") as file:
+            file.seek((count - 1) * _RECORD.size)
+            return _RECORD.unpack(file.read(_RECORD.size))
+
+    def records(self, start: float = float("-inf"), end: float = float("inf"), previous: bool = False) -> List[_Record]:
+        """Records with start <= timestamp < end, and the one before them if previous"""
+        count = len(self)
+        if not count:
+            return []
+        with open(self.path, "rb") as file, \
+                mmap.mmap(file.fileno(), count * _RECORD.size, access=mmap.ACCESS_READ) as data:
+            first = self._bisect(data, count, start)
+            last = self._bisect(data, count, end)
+            if previous and first > 0:
+                first -= 1
+            return list(_RECORD.iter_unpack(data[first * _RECORD.size:last * _RECORD.size]))
+
+    @staticmethod
+    def _bisect(data: mmap.mmap, count: int, timestamp: float) -> int:
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if _RECORD.unpack_from(data, middle * _RECORD.size)[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class DataUsageLog:
+    """
+    Data usage of a modem: a log of its byte counters, appended each time they are read, and hourly and daily
+    rollups of the bytes transferred in each bucket. Rollups hold complete buckets, the current ones are kept in
+    memory and rebuilt from the log on start.
+    """
+
+    def __init__(self, folder: Path, modem_id: str) -> None:
+        self._log = _RecordFile(folder / f"{modem_id}.usage")
+        self._rollups = {bucket: _RecordFile(folder / f"{modem_id}.{bucket.value}.usage") for bucket in ROLLUPS}
+        self._last = self._log.last()
+        # Current bucket of each rollup as [start, rx, tx]
+        self._current: Dict[DataUsageBucket, Optional[List]] = {bucket: None for bucket in ROLLUPS}
+        for bucket in ROLLUPS:
+            self._rebuild(bucket)
+
+    def __len__(self) -> int:
+        return len(self._log)
+
+    @property
+    def last(self) -> Optional[_Record]:
+        return self._last
+
+    def _rebuild(self, bucket: DataUsageBucket) -> None:
+        # Buckets after the last complete one are rolled up again from the log, including any lost on a crash
+        size = ROLLUPS[bucket]
+        last_rollup = self._rollups[bucket].last()
+        previous = None
+        for record in self._log.records(last_rollup[0] if last_rollup else float("-inf"), previous=True):
+            if last_rollup is None or bucket_start(record[0], size) > last_rollup[0]:
+                self._accumulate(bucket, record[0], _delta(previous, record))
+            previous = record
+
+    def _accumulate(self, bucket: DataUsageBucket, timestamp: float, delta: Tuple[int, int]) -> None:
+        start = bucket_start(timestamp, ROLLUPS[bucket])
+        current = self._current[bucket]
+        # Wall clock going back keeps adding to the current bucket, rollups stay ordered
+        if current is not None and start > current[0]:
+            self._rollups[bucket].append(*current)
+            current = None
+        if current is None:
+            current = self._current[bucket] = [start, 0, 0]
+        current[1] += delta[0]
+        current[2] += delta[1]
+
+    def append(self, rx: int, tx: int, timestamp: Optional[float] = None) -> None:
+        record = (time.time() if timestamp is None else timestamp, rx, tx)
+        delta = _delta(self._last, record)
+        self._log.append(*record)
+        for bucket in ROLLUPS:
+            self._accumulate(bucket, record[0], delta)
+        self._last = record
+
+    def history(self, start: float, end: float, bucket: DataUsageBucket) -> DataUsageHistory:
+        """Bytes transferred in each bucket between start and end, raw gives them between consecutive reads"""
+        if bucket == DataUsageBucket.RAW:
+            records = self._log.records(start, end, previous=True)
+            previous = records.pop(0) if records and records[0][0] < start else None
+            points = []
+            for record in records:
+                rx, tx = _delta(previous, record)
+                points.append(DataUsagePoint(timestamp=record[0], rx=rx, tx=tx))
+                previous = record
+            return DataUsageHistory(bucket=bucket, points=points)
+
+        size = ROLLUPS[bucket]
+        records = self._rollups[bucket].records(bucket_start(start, size), end)
+        current = self._current[bucket]
+        if current is not None and bucket_start(start, size) <= current[0] < end:
+            records.append(tuple(current))
+        return DataUsageHistory(
+            bucket=bucket,
+            points=[DataUsagePoint(timestamp=timestamp, rx=rx, tx=tx) for timestamp, rx, tx in records],
+        )
+
+    def daily_totals(self, since: float) -> Dict[str, Tuple[int, int]]:
+        """Bytes transferred from since until the end of each day, by local date"""
+        totals: Dict[str, Tuple[int, int]] = {}
+        rx_total, tx_total = 0, 0
+        for point in self.history(since, float("inf"), DataUsageBucket.DAY).points:
+            rx_total += point.rx
+            tx_total += point.tx
+            totals[datetime.fromtimestamp(point.timestamp).strftime("%Y-%m-%d")] = (rx_total, tx_total)
+        return totals
+
+    def import_daily_counters(self, counters: Dict[str, Tuple[int, int]]) -> None:
+        """Imports counters by local date, as kept in settings before the log, as read at the end of each day"""
+        for date, (rx, tx) in sorted(counters.items()):
+            timestamp = datetime.strptime(date, "%Y-%m-%d").replace(hour=23, minute=59, second=59).timestamp()
+            if self._last is None or timestamp > self._last[0]:
+                self.append(rx, tx, timestamp)
+
+    def close(self) -> None:
+        self._log.close()
+        for rollup in self._rollups.values():
+            rollup.close()
+
+
+class DataUsageStore(metaclass=Singleton):
+    """Data usage logs of all modems, by modem identifier (IMEI)"""
+
+    def __init__(self, folder: Path = SETTINGS_FOLDER / "usage") -> None:
+        self.folder = folder
+        self._logs: Dict[str, DataUsageLog] = {}
+
+    def log(self, modem_id: str) -> DataUsageLog:
+        log = self._logs.get(modem_id)
+        if log is None:
+            log = self._logs[modem_id] = DataUsageLog(self.folder, modem_id)
+        return log
+
+    def close(self) -> None:
+        for log in self._logs.values():
+            log.close()
+        self._logs.clear()
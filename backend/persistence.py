@@ -0,0 +1,90 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Optional, cast
+
+from commonwealth.settings.manager import PydanticManager
+from commonwealth.utils.Singleton import Singleton
+from loguru import logger
+
+from config import SERVICE_NAME
+from settings import SettingsV2
+
+# Changes within this window are written together
+WRITE_DELAY = 2.0
+
+
+def write_atomically(path: Path, content: str) -> None:
+    """Write to a temporary file, sync it and rename it over path, so a power cut leaves the old or the new file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(temp_path, "w") as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    directory = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+class SettingsPersistence(metaclass=Singleton):
+    """
+    Single owner of the service settings, shared by modems and the cell fetcher. Changes only mark settings as dirty,
+    they are written once WRITE_DELAY after the first change, serialized on the event loop and written atomically in an
+    executor.
+    """
+
+    def __init__(self) -> None:
+        self._manager = PydanticManager(SERVICE_NAME, SettingsV2)
+        self._dirty = False
+        self._pending: Optional[asyncio.TimerHandle] = None
+        self._writing: Optional[asyncio.Future] = None
+
+    @property
+    def settings(self) -> SettingsV2:
+        return cast(SettingsV2, self._manager.settings)
+
+    def mark_dirty(self) -> None:
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside the event loop (e.g. scripts) there is nothing to coalesce with
+            self._write(self._dump())
+            return
+        if self._pending is None:
+            self._pending = loop.call_later(WRITE_DELAY, self._start_write)
+
+    def _start_write(self) -> None:
+        self._pending = None
+        if self._writing is not None and not self._writing.done():
+            # Changes during a write are picked by the next one
+            self._pending = asyncio.get_running_loop().call_later(WRITE_DELAY, self._start_write)
+            return
+        if self._dirty:
+            self._writing = asyncio.get_running_loop().run_in_executor(None, self._write, self._dump())
+
+    def _dump(self) -> str:
+        # Serialized on the event loop thread, the only one changing settings, only the file write goes elsewhere
+        self._dirty = False
+        return self.settings.model_dump_json(indent=2)
+
+    def _write(self, content: str) -> None:
+        try:
+            write_atomically(Path(self._manager.settings_file_path()), content)
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"Failed to save settings: {e}")
+
+    async def flush(self) -> None:
+        """Write pending changes now, used on shutdown"""
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        if self._writing is not None:
+            await self._writing
+        if self._dirty:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, self._dump())
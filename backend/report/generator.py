@@ -10,9 +10,10 @@ from urllib.parse import quote
 import aiohttp
 
 from config import BLUE_OS_HOST
-from modem.at import ATCommand, ATDivider
+from modem.at import ATCommand, ATDivider, ATURC
 from modem.adapters.quectel.at import QuectelATCommand
 from modem.modem import Modem
+from modem.scheduler import ATPriority, at_priority
 
 COMMANDER_API = f"http://{BLUE_OS_HOST}:9100/v1.0/command/host"
 
@@ -32,6 +33,21 @@ def sanitize_iccid(output: str) -> str:
     return re.sub(r'\b(\d{6})\d{9,14}(\d{4})\b', r'\1*****\2', output)
 
 
+# --- URC completion checks ---
+
+def ping_finished(urcs: List[ATURC]) -> bool:
+    """+QPING per ping lines have 5 fields, the statistics line or an error line ends the ping."""
+    return len(urcs[-1].data) != 5
+
+
+def dns_resolved(urcs: List[ATURC]) -> bool:
+    """+QIURC: "dnsgip",<err>,<IP_count>,<DNS_ttl> header is followed by one line per resolved IP."""
+    header = urcs[0].data
+    if len(header) < 3 or header[1] != "0":
+        return True
+    return len(urcs) > int(header[2])
+
+
 # --- Step definition ---
 
 @dataclass
@@ -44,8 +60,12 @@ class ReportStep:
     data: str = ""
     shell_command: Optional[str] = None
     internal_handler: Optional[Callable[..., str]] = field(default=None, repr=False)
-    delay: float = 1.0
+    # None waits for the final result code using the timeout learned for the command
+    delay: Optional[float] = None
     sanitizer: Optional[Callable[[str], str]] = field(default=None, repr=False)
+    # For commands that answer OK and deliver results later as URCs, delay becomes the max time waiting them
+    urc: Optional[str] = None
+    urc_until: Optional[Callable[[List[ATURC]], bool]] = field(default=None, repr=False)
 
     @property
     def command_str(self) -> str:
@@ -60,10 +80,10 @@ class ReportStep:
 
 def read_manager_settings(modem: Modem) -> str:
     try:
-        return modem._manager.settings.model_dump_json(indent=2)
+        return modem._settings.model_dump_json(indent=2)
     except Exception:
         try:
-            return json.dumps(modem._manager.settings.dict(), indent=2)
+            return json.dumps(modem._settings.dict(), indent=2)
         except Exception as e:
             return f"ERROR reading settings: {e}"
 
@@ -84,8 +104,8 @@ DIAGNOSTIC_STEPS: List[ReportStep] = [
     ReportStep("SIM status - CCID",                 StepType.AT, S_MODEM, at_command=ATCommand.SIM_CARD_IDENTIFICATION, sanitizer=sanitize_iccid),
     ReportStep("RF signal quality (CSQ)",           StepType.AT, S_MODEM, at_command=ATCommand.CHECK_SIGNAL_QUALITY),
     ReportStep("RF signal quality (QCSQ)",          StepType.AT, S_MODEM, at_command=QuectelATCommand.SIGNAL_QUALITY),
-    ReportStep("Serving cell info",                 StepType.AT, S_MODEM, at_command=QuectelATCommand.ENGINEER_MODE, divider=ATDivider.EQ, data='"servingcell"', delay=2.0),
-    ReportStep("Network registration (COPS)",       StepType.AT, S_MODEM, at_command=ATCommand.CONFIGURE_OPERATOR, divider=ATDivider.QUESTION, delay=2.0),
+    ReportStep("Serving cell info",                 StepType.AT, S_MODEM, at_command=QuectelATCommand.ENGINEER_MODE, divider=ATDivider.EQ, data='"servingcell"'),
+    ReportStep("Network registration (COPS)",       StepType.AT, S_MODEM, at_command=ATCommand.CONFIGURE_OPERATOR, divider=ATDivider.QUESTION),
     ReportStep("Network registration (CREG)",       StepType.AT, S_MODEM, at_command=ATCommand.NETWORK_REGISTRATION, divider=ATDivider.QUESTION),
     ReportStep("Network registration (CGREG)",      StepType.AT, S_MODEM, at_command=ATCommand.GPRS_NETWORK_REGISTRATION, divider=ATDivider.QUESTION),
     ReportStep("Network registration (CEREG)",      StepType.AT, S_MODEM, at_command=ATCommand.EPS_NETWORK_REGISTRATION, divider=ATDivider.QUESTION),
@@ -93,13 +113,13 @@ DIAGNOSTIC_STEPS: List[ReportStep] = [
     ReportStep("PDP context configuration",         StepType.AT, S_MODEM, at_command=ATCommand.CONFIGURE_PDP_CONTEXT, divider=ATDivider.QUESTION),
     ReportStep("PDP attachment state",              StepType.AT, S_MODEM, at_command=ATCommand.PS_ATTACH, divider=ATDivider.QUESTION),
     ReportStep("PDP activation state",              StepType.AT, S_MODEM, at_command=ATCommand.PDP_CONTEXT_ACTIVATE, divider=ATDivider.QUESTION),
-    ReportStep("PDP context read dynamic params",   StepType.AT, S_MODEM, at_command=ATCommand.PDP_CONTEXT_READ_DYNAMIC, delay=2.0),
+    ReportStep("PDP context read dynamic params",   StepType.AT, S_MODEM, at_command=ATCommand.PDP_CONTEXT_READ_DYNAMIC),
     ReportStep("Quectel data stack state",          StepType.AT, S_MODEM, at_command=QuectelATCommand.TCP_PDP_CONTEXT, divider=ATDivider.QUESTION),
     ReportStep("USB networking mode",               StepType.AT, S_MODEM, at_command=QuectelATCommand.CONFIGURATION, divider=ATDivider.EQ, data='"usbnet"'),
     ReportStep("Roaming configuration",             StepType.AT, S_MODEM, at_command=QuectelATCommand.CONFIGURATION, divider=ATDivider.EQ, data='"roamservice"'),
-    ReportStep("Ping 8.8.8.8",                     StepType.AT, S_MODEM, at_command=QuectelATCommand.PING, divider=ATDivider.EQ, data='1,"8.8.8.8"', delay=12.0),
-    ReportStep("Ping google.com",                   StepType.AT, S_MODEM, at_command=QuectelATCommand.PING, divider=ATDivider.EQ, data='1,"google.com",10,1,1', delay=12.0),
-    ReportStep("DNS resolution test",               StepType.AT, S_MODEM, at_command=QuectelATCommand.DNS_RESOLVE, divider=ATDivider.EQ, data='1,"google.com"', delay=8.0),
+    ReportStep("Ping 8.8.8.8",                     StepType.AT, S_MODEM, at_command=QuectelATCommand.PING, divider=ATDivider.EQ, data='1,"8.8.8.8"', delay=12.0, urc="+QPING", urc_until=ping_finished),
+    ReportStep("Ping google.com",                   StepType.AT, S_MODEM, at_command=QuectelATCommand.PING, divider=ATDivider.EQ, data='1,"google.com",10,1,1', delay=12.0, urc="+QPING", urc_until=ping_finished),
+    ReportStep("DNS resolution test",               StepType.AT, S_MODEM, at_command=QuectelATCommand.DNS_RESOLVE, divider=ATDivider.EQ, data='1,"google.com"', delay=8.0, urc="+QIURC", urc_until=dns_resolved),
     # BlueOS Connectivity Diagnostic
     ReportStep("Network interfaces (link)",         StepType.SHELL, S_BLUEOS, shell_command="ip link"),
     ReportStep("Network interfaces (addr)",         StepType.SHELL, S_BLUEOS, shell_command="ip addr"),
@@ -146,6 +166,8 @@ class ReportGenerator:
         self.events.append(event)
 
     async def _run_at_command(self, cmd, step: ReportStep) -> str:
+        if step.urc:
+            return await self._run_at_command_with_urc(cmd, step)
         try:
             return await cmd.command(
                 step.at_command,
@@ -158,6 +180,26 @@ class ReportGenerator:
         except Exception as e:
             return f"ERROR: {e}"
 
+    async def _run_at_command_with_urc(self, cmd, step: ReportStep) -> str:
+        try:
+            with cmd.subscribe(step.urc) as subscription:
+                response = await cmd.command(step.at_command, step.divider, step.data, cmd_id_response=False)
+                urcs = await subscription.collect(step.urc_until, timeout=step.delay)
+
+            lines = response.data[0] if response.data else [response.status.value]
+            return "\n".join(lines + [urc.line for urc in urcs])
+        except Exception as e:
+            return f"ERROR: {e}"
+
+    async def _run_at_step(self, step: ReportStep) -> str:
+        # Port is borrowed per step, so user requests can be served between steps of the report
+        try:
+            # Steps answered with URCs need the port the modem sends them to
+            with await self.modem.at_commander(urc=step.urc is not None) as cmd:
+                return await self._run_at_command(cmd, step)
+        except Exception as e:
+            return f"ERROR: {e}"
+
     async def _run_shell_command(self, command: str) -> str:
         try:
             url = f"{COMMANDER_API}?command={quote(command)}&i_know_what_i_am_doing=true"
@@ -176,6 +218,10 @@ class ReportGenerator:
             return f"ERROR: {e}"
 
     async def _run(self) -> None:
+        with at_priority(ATPriority.DIAGNOSTICS):
+            await self._run_steps()
+
+    async def _run_steps(self) -> None:
         total = len(DIAGNOSTIC_STEPS)
         report_lines = [
             "Modem Connectivity Diagnostic Report",
@@ -185,11 +231,11 @@ class ReportGenerator:
             "",
         ]
 
-        cmd = None
         at_available = True
 
         try:
-            cmd = await self.modem.at_commander()
+            with await self.modem.at_commander():
+                pass
         except Exception as e:
             self._emit({"type": "error", "message": f"Failed to connect to modem AT port: {e}"})
             at_available = False
@@ -213,8 +259,8 @@ class ReportGenerator:
                 })
 
                 if step.step_type == StepType.AT:
-                    if at_available and cmd:
-                        output = await self._run_at_command(cmd, step)
+                    if at_available:
+                        output = await self._run_at_step(step)
                     else:
                         output = "SKIPPED: AT port unavailable"
                 elif step.step_type == StepType.SHELL:
@@ -246,9 +292,6 @@ class ReportGenerator:
         except Exception as e:
             self._emit({"type": "error", "message": str(e)})
             report_lines.append(f"\nFATAL ERROR: {e}")
-        finally:
-            if cmd:
-                cmd._close()
 
         self.full_report = "\n".join(report_lines)
         self._emit({"type": "report_complete", "report": self.full_report})
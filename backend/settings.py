@@ -1,6 +1,6 @@
 from typing import Any, Dict, Tuple, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from commonwealth.settings.settings import PydanticSettings
 
@@ -8,6 +8,8 @@ class CellLocationSettings(BaseModel):
     latitude: float
     longitude: float
     range: int
+    # Radio as named by OpenCelliD (GSM, UMTS, LTE...), None when not known
+    radio: Optional[str] = None
 
 
 class DataUsageControlSettings(BaseModel):
@@ -21,6 +23,9 @@ class DataUsageControlSettings(BaseModel):
 
 
 class DataUsageSettings(DataUsageControlSettings):
+    """
+    Control settings together with the usage, which is not stored in settings but read from the data usage log.
+    """
     def total_data_used(self) -> int:
         return self.data_used[0] + self.data_used[1]
 
@@ -30,16 +35,22 @@ class DataUsageSettings(DataUsageControlSettings):
     data_points: Dict[str, Tuple[int, int]] = {}
 
 
-class ModemsSettings(BaseModel):
+class ModemsSettingsV1(BaseModel):
     identifier: str
     configured: bool
     data_usage: DataUsageSettings
 
 
+class ModemsSettings(BaseModel):
+    identifier: str
+    configured: bool
+    data_usage: DataUsageControlSettings
+
+
 class SettingsV1(PydanticSettings):
     # We store seen cells in dict with keys mcc, mnc, lac, cell_id
     seen_cells: Dict[int, Dict[int, Dict[int, Dict[int, CellLocationSettings]]]] = {}
-    modems: Dict[str, ModemsSettings] = {}
+    modems: Dict[str, ModemsSettingsV1] = {}
 
     def migrate(self, data: Dict[str, Any]) -> None:
         if data["VERSION"] == SettingsV1.STATIC_VERSION:
@@ -49,3 +60,39 @@ class SettingsV1(PydanticSettings):
             super().migrate(data)
 
         data["VERSION"] = SettingsV1.STATIC_VERSION
+
+
+class SettingsV2(SettingsV1):
+    """
+    Seen cells and data usage moved out of settings to the seen cells store and the data usage logs, so settings
+    writes do not grow with them.
+    """
+    # Only filled by files of older versions, migrate moves them to the seen cells store
+    seen_cells: Dict[int, Dict[int, Dict[int, Dict[int, CellLocationSettings]]]] = Field(default={}, exclude=True)
+    modems: Dict[str, ModemsSettings] = {}  # type: ignore[assignment]
+
+    def migrate(self, data: Dict[str, Any]) -> None:
+        if data["VERSION"] == SettingsV2.STATIC_VERSION:
+            return
+
+        if data["VERSION"] < SettingsV2.STATIC_VERSION:
+            super().migrate(data)
+
+        # Stores import settings models, so they are only imported once settings are
+        from cells.store import SeenCellsStore
+        from modem.usage import DataUsageStore
+
+        seen_cells = data.pop("seen_cells", None)
+        if seen_cells:
+            SeenCellsStore().import_nested(seen_cells)
+
+        for modem in data.get("modems", {}).values():
+            data_usage = modem.get("data_usage", {})
+            data_usage.pop("data_used", None)
+            data_points = data_usage.pop("data_points", None)
+            log = DataUsageStore().log(modem["identifier"])
+            # A log already written belongs to a newer run, its usage is more complete than the daily points
+            if data_points and not len(log):
+                log.import_daily_counters({date: tuple(point) for date, point in data_points.items()})
+
+        data["VERSION"] = SettingsV2.STATIC_VERSION
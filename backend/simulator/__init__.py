@@ -0,0 +1,3 @@
+from simulator.quectel import QuectelSimulator, SimulatorConfig
+
+__all__ = ["QuectelSimulator", "SimulatorConfig"]
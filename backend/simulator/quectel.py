@@ -0,0 +1,409 @@
+import os
+import re
+import threading
+import time
+import tty
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from serial.tools.list_ports_linux import SysFS
+
+from modem.hotplug import ModemHotplugMonitor
+from modem.latency import latency_key
+from utils import add_virtual_modem_descriptors, remove_virtual_modem_descriptors
+
+_COMMAND_PATTERN = re.compile(r"(AT[^=?]*)(=\?|\?|=)?(.*)")
+
+# Interfaces of EG25-G / EC25 in the order the kernel enumerates them, only AT ones answer commands
+_INTERFACES: List[Tuple[str, bool]] = [("DM", False), ("NMEA", False), ("AT", True), ("Modem", True)]
+# Interfaces selected by AT+QURCCFG="urcport", URCs are sent there whatever port sent the command
+_URC_PORTS: Dict[str, int] = {"usbat": 2, "usbmodem": 3}
+
+_SERVING_CELL = '"servingcell","NOCONN","LTE","FDD",724,05,1A2B30C,264,1650,3,5,5,4F2B,-97,-11,-64,13,34'
+
+_NEIGHBOUR_CELLS = [
+    '"neighbourcell intra","LTE",1650,264,-11,-97,-64,13,34,6,8,4,62',
+    '"neighbourcell intra","LTE",1650,118,-15,-104,-71,2,21,6,8,4,62',
+    '"neighbourcell inter","LTE",3050,87,-12,-95,-66,9,36,4,10,5',
+    '"neighbourcell inter","LTE",9410,20,-19,-112,-80,-5,13,2,12,6',
+    '"neighbourcell","WCDMA",10713,1,22,14,91,-930,-80,10',
+    '"neighbourcell","GSM",512,3,-,-,-,-,-,48,4',
+]
+
+
+@dataclass
+class SimulatorConfig:
+    """
+    Behaviour of the simulated modem. Latencies are in seconds, command_latency is keyed as in modem.latency, e.g.
+    AT+CSQ or AT+QENG="servingcell", and overrides the default latency for matching commands.
+    """
+    product: str = "EG25-G"
+    revision: str = "EG25GGBR07A08M2G"
+    imei: str = "869710030000001"
+    imsi: str = "724110000000001"
+    iccid: str = "89551100000000000001"
+    serial_number: str = "MPY00A00A0000001"
+    latency: float = 0.005
+    command_latency: Dict[str, float] = field(default_factory=lambda: {"AT+COPS=?": 3.0})
+    # Quirks of a modem fresh from power up, ATCommander.setup should cope with them
+    echo: bool = True
+    s3: int = 13
+    s4: int = 10
+    # Split responses in chunks of this size with a delay between them, as seen on slow USB hosts, 0 disables
+    chunk_size: int = 0
+    chunk_delay: float = 0.001
+    ping_time: float = 0.05
+    reboot_time: float = 0.5
+    # Bytes sent and received per second, shown by the packet data counter
+    data_rate: Tuple[int, int] = (2000, 8000)
+
+
+class _SimulatedPort:
+    def __init__(
+        self, answers: bool, on_line: Callable[["_SimulatedPort", str], None], terminator: Callable[[], bytes]
+    ) -> None:
+        self.answers = answers
+        self._on_line = on_line
+        # Command line terminator, read on every line as ATS3 changes it
+        self._terminator = terminator
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.device = os.ttyname(self.slave)
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"simulator-{self.device}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def close(self) -> None:
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def write(self, data: bytes, chunk_size: int = 0, chunk_delay: float = 0.0) -> None:
+        with self._write_lock:
+            try:
+                if chunk_size <= 0:
+                    os.write(self.master, data)
+                    return
+                for i in range(0, len(data), chunk_size):
+                    os.write(self.master, data[i:i + chunk_size])
+                    time.sleep(chunk_delay)
+            except OSError:
+                pass
+
+    def _run(self) -> None:
+        buffer = b""
+        while True:
+            try:
+                buffer += os.read(self.master, 1024)
+            except OSError:
+                return
+            if not self.answers:
+                # Diagnostic and NMEA ports ignore AT commands
+                buffer = b""
+                continue
+            while True:
+                end = buffer.find(self._terminator())
+                if end == -1:
+                    break
+                line, buffer = buffer[:end + 1], buffer[end + 1:]
+                self._on_line(self, line.decode("ascii", errors="replace"))
+
+
+class QuectelSimulator:
+    """
+    Pseudo-terminal backed Quectel EG25-G / EC25 speaking the AT dialect used by ATCommander and QuectelLTEBase.
+    While running, its ports are listed by utils.get_modem_descriptors as a USB device, so Modem.connected_devices
+    detects it as any real modem.
+    """
+
+    def __init__(self, config: Optional[SimulatorConfig] = None, index: int = 1) -> None:
+        self.config = config or SimulatorConfig()
+        self.device = f"/sys/devices/platform/simulator/usb1/1-{index}"
+        # Every command line received, in order, to check what the AT stack sends
+        self.received: List[str] = []
+
+        self.echo = self.config.echo
+        self.s3 = self.config.s3
+        self.s4 = self.config.s4
+        self.functionality = 1
+        self.usbnet = 0
+        self.urcport = "usbat"
+        # Presentation mode (n) of the registration commands, URCs are sent while it is not 0
+        self.registration_urcs: Dict[str, int] = {"AT+CREG": 0, "AT+CEREG": 0}
+        self.pdp_contexts: Dict[int, Tuple[str, str]] = {1: ("IP", "zap.vivo.com.br")}
+        self._counters_since = time.monotonic()
+
+        self._ports: List[_SimulatedPort] = []
+        self._handlers: Dict[Tuple[str, str], Callable[[_SimulatedPort, str], Optional[List[str]]]] = {
+            ("AT", ""): lambda port, args: [],
+            ("ATI", ""): lambda port, args: ["Quectel", self._model, f"Revision: {self.config.revision}"],
+            ("AT+GMI", ""): lambda port, args: ["Quectel"],
+            ("AT+GMM", ""): lambda port, args: [self._model],
+            ("AT+GMR", ""): lambda port, args: [self.config.revision],
+            ("AT+CVERSION", ""): lambda port, args: [
+                f"VERSION: {self.config.revision}", "Apr 16 2020 20:32:01", "Authors: QCT"
+            ],
+            ("AT+CGSN", ""): lambda port, args: [self.config.imei],
+            ("AT+CGSN", "="): self._serial_number,
+            ("AT+CIMI", ""): lambda port, args: [self.config.imsi],
+            ("AT+CCID", ""): lambda port, args: [f"+CCID: {self.config.iccid}"],
+            ("AT+CPIN", "?"): lambda port, args: ["+CPIN: READY"],
+            ("AT+QSIMSTAT", "?"): lambda port, args: ["+QSIMSTAT: 0,1"],
+            ("AT+CSQ", ""): lambda port, args: ["+CSQ: 22,99"],
+            ("AT+QCSQ", ""): lambda port, args: ['+QCSQ: "LTE",-64,-97,134,-11'],
+            ("AT+QNWINFO", ""): lambda port, args: ['+QNWINFO: "FDD LTE","72406","LTE BAND 3",1650'],
+            ("AT+COPS", "?"): lambda port, args: ['+COPS: 0,0,"VIVO",7'],
+            ("AT+COPS", "=?"): lambda port, args: ['+COPS: (2,"VIVO","VIVO","72406",7),(3,"CLARO","CLARO","72405",7)'],
+            ("AT+COPS", "="): lambda port, args: [],
+            ("AT+CREG", "?"): lambda port, args: [self._registration("AT+CREG", query=True)],
+            ("AT+CREG", "="): lambda port, args: self._set_registration_urcs("AT+CREG", args),
+            ("AT+CGREG", "?"): lambda port, args: ["+CGREG: 0,1"],
+            ("AT+CEREG", "?"): lambda port, args: [self._registration("AT+CEREG", query=True)],
+            ("AT+CEREG", "="): lambda port, args: self._set_registration_urcs("AT+CEREG", args),
+            ("AT+CGATT", "?"): lambda port, args: ["+CGATT: 1"],
+            ("AT+CGACT", "?"): lambda port, args: ["+CGACT: 1,1"],
+            ("AT+QIACT", "?"): lambda port, args: ['+QIACT: 1,1,1,"10.0.0.2"'],
+            ("AT+CGCONTRDP", ""): lambda port, args: ['+CGCONTRDP: 1,5,"zap.vivo.com.br","10.0.0.2.255.255.255.0"'],
+            ("AT+CGDCONT", "?"): lambda port, args: [
+                f'+CGDCONT: {cid},"{pdp_type}","{apn}","0.0.0.0",0,0,0,0'
+                for cid, (pdp_type, apn) in sorted(self.pdp_contexts.items())
+            ],
+            ("AT+CGDCONT", "="): self._set_pdp_context,
+            ("AT+CGAUTH", "="): lambda port, args: [],
+            ("AT+QICSGP", "="): lambda port, args: [],
+            ("AT+CCLK", "?"): lambda port, args: [f'+CCLK: "{datetime.now().strftime("%y/%m/%d,%H:%M:%S")}-12"'],
+            ("AT+CTZU", "="): lambda port, args: [],
+            ("AT+CMEE", "="): lambda port, args: [],
+            ("AT+CFUN", "?"): lambda port, args: [f"+CFUN: {self.functionality}"],
+            ("AT+CFUN", "="): self._set_functionality,
+            ("AT+QENG", "="): self._engineering_mode,
+            ("AT+QCFG", "="): self._configuration,
+            ("AT+QGDCNT", "?"): self._data_counter,
+            ("AT+QGDCNT", "="): self._reset_data_counter,
+            ("AT+QAUGDCNT", "="): lambda port, args: [],
+            ("AT+QPING", "="): self._ping,
+            ("AT+QIDNSGIP", "="): self._resolve,
+            ("AT+QURCCFG", "="): self._urc_configuration,
+            ("ATS3", "="): lambda port, args: self._set_register("s3", args),
+            ("ATS4", "="): lambda port, args: self._set_register("s4", args),
+            ("ATS5", "="): lambda port, args: [],
+        }
+
+    @property
+    def _model(self) -> str:
+        return self.config.product.split("-")[0]
+
+    @property
+    def ports(self) -> List[str]:
+        return [port.device for port in self._ports]
+
+    def descriptors(self) -> List[SysFS]:
+        """USB descriptors of the simulated ports, as pyserial would build them from sysfs"""
+        descriptors = []
+        for number, port in enumerate(self._ports):
+            info = SysFS(port.device)
+            info.usb_device_path = self.device
+            info.usb_interface_path = f"{self.device}/{os.path.basename(self.device)}:1.{number}"
+            info.subsystem = "usb-serial"
+            info.vid = 0x2C7C
+            info.pid = 0x0125
+            info.serial_number = None
+            info.location = os.path.basename(info.usb_interface_path)
+            info.manufacturer = "Quectel"
+            info.product = self.config.product
+            info.interface = _INTERFACES[number][0]
+            info.apply_usb_info()
+            descriptors.append(info)
+        return descriptors
+
+    def start(self) -> "QuectelSimulator":
+        self._ports = [_SimulatedPort(answers, self._on_line, lambda: bytes([self.s3])) for _, answers in _INTERFACES]
+        for port in self._ports:
+            port.start()
+        add_virtual_modem_descriptors(self.device, self.descriptors())
+        # As the kernel would announce a plugged modem
+        ModemHotplugMonitor().request_refresh()
+        return self
+
+    def stop(self) -> None:
+        remove_virtual_modem_descriptors(self.device)
+        ModemHotplugMonitor().request_refresh()
+        for port in self._ports:
+            port.close()
+        self._ports = []
+
+    def __enter__(self) -> "QuectelSimulator":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:  # type: ignore
+        self.stop()
+
+    def _write_lines(self, port: _SimulatedPort, lines: List[str]) -> None:
+        terminator = chr(self.s3) + chr(self.s4)
+        data = "".join(f"{terminator}{line}{terminator}" for line in lines)
+        port.write(data.encode("ascii"), self.config.chunk_size, self.config.chunk_delay)
+
+    def _send_urc_later(self, delay: float, line: str) -> None:
+        timer = threading.Timer(delay, self._write_lines, (self._ports[_URC_PORTS[self.urcport]], [line]))
+        timer.daemon = True
+        timer.start()
+
+    def _on_line(self, port: _SimulatedPort, raw: str) -> None:
+        if self.echo:
+            port.write(raw.encode("ascii"))
+
+        line = raw.strip(chr(self.s3) + "\r\n")
+        if not line:
+            return
+        self.received.append(line)
+
+        time.sleep(self.config.command_latency.get(latency_key(line), self.config.latency))
+
+        lines = self._handle(port, line)
+        if lines is None:
+            self._write_lines(port, ["ERROR"])
+            return
+        self._write_lines(port, lines + ["OK"])
+
+    def _handle(self, port: _SimulatedPort, line: str) -> Optional[List[str]]:
+        upper = line.upper()
+        # Basic commands carry their argument without divider
+        if upper in ("ATE0", "ATE1", "ATE"):
+            self.echo = upper == "ATE1"
+            return []
+        if upper in ("AT&F", "AT&F0"):
+            self.echo = True
+            return []
+
+        match = _COMMAND_PATTERN.fullmatch(line)
+        if match is None:
+            return None
+        command, divider, args = match.group(1).upper(), match.group(2) or "", match.group(3)
+        handler = self._handlers.get((command, divider))
+        if handler is None:
+            return None
+        return handler(port, args)
+
+    def _set_register(self, name: str, args: str) -> Optional[List[str]]:
+        # Characters of S3 and S4 are ASCII codes, from 0 to 127
+        if not args.isdigit() or int(args) > 127:
+            return None
+        setattr(self, name, int(args))
+        return []
+
+    def _serial_number(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        if args == "0":
+            return [f"+CGSN: {self.config.serial_number}"]
+        if args == "1":
+            return [f"+CGSN: {self.config.imei}"]
+        return None
+
+    def _set_pdp_context(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        fields = [value.strip('"') for value in args.split(",")]
+        if len(fields) < 3 or not fields[0].isdigit():
+            return None
+        self.pdp_contexts[int(fields[0])] = (fields[1], fields[2])
+        return []
+
+    def _registration(self, command: str, query: bool = False) -> str:
+        """+CREG / +CEREG line, registered on the serving cell with full functionality, the query also has n"""
+        n = self.registration_urcs[command]
+        fields = ["1", "4F2B", "1A2B30C", "7"] if self.functionality == 1 else ["0"]
+        if n < 2:
+            fields = fields[:1]
+        if query:
+            fields.insert(0, str(n))
+        return f"{command[2:]}: {','.join(fields)}"
+
+    def _set_registration_urcs(self, command: str, args: str) -> Optional[List[str]]:
+        if args not in ("0", "1", "2"):
+            return None
+        self.registration_urcs[command] = int(args)
+        return []
+
+    def _set_functionality(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        fields = args.split(",")
+        if fields[0] not in ("0", "1", "4"):
+            return None
+        registered = self.functionality == 1
+        self.functionality = int(fields[0])
+        if len(fields) > 1 and fields[1] == "1":
+            # Reset, modem comes back with factory echo and URCs disabled and announces it with RDY
+            self.functionality = 1
+            self.echo = self.config.echo
+            self.registration_urcs = dict.fromkeys(self.registration_urcs, 0)
+            self._send_urc_later(self.config.reboot_time, "RDY")
+        elif registered != (self.functionality == 1):
+            for command, n in self.registration_urcs.items():
+                if n:
+                    self._send_urc_later(self.config.latency, self._registration(command))
+        return []
+
+    def _engineering_mode(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        if args == '"servingcell"':
+            return [f"+QENG: {_SERVING_CELL}"]
+        if args == '"neighbourcell"':
+            return [f"+QENG: {cell}" for cell in _NEIGHBOUR_CELLS]
+        return None
+
+    def _configuration(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        fields = args.split(",")
+        if fields[0] == '"usbnet"':
+            if len(fields) == 1:
+                return [f'+QCFG: "usbnet",{self.usbnet}']
+            self.usbnet = int(fields[1])
+            return []
+        if fields[0] == '"roamservice"':
+            return ['+QCFG: "roamservice",255,1'] if len(fields) == 1 else []
+        return None
+
+    def _urc_configuration(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        fields = [value.strip('"') for value in args.split(",")]
+        if fields[0] != "urcport":
+            return None
+        if len(fields) == 1:
+            return [f'+QURCCFG: "urcport","{self.urcport}"']
+        if fields[1] not in _URC_PORTS:
+            return None
+        self.urcport = fields[1]
+        return []
+
+    def _data_counter(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        elapsed = time.monotonic() - self._counters_since
+        sent, received = (int(rate * elapsed) for rate in self.config.data_rate)
+        return [f"+QGDCNT: {sent},{received}"]
+
+    def _reset_data_counter(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        if args == "1":
+            self._counters_since = time.monotonic()
+        elif args != "0":
+            return None
+        return []
+
+    def _ping(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        # AT+QPING=<contextID>,"<host>"[,<timeout>[,<pingnum>]], replies come later as +QPING URCs
+        fields = args.split(",")
+        if len(fields) < 2:
+            return None
+        count = int(fields[3]) if len(fields) > 3 else 4
+        time_ms = max(1, int(self.config.ping_time * 1000))
+        for i in range(count):
+            self._send_urc_later(self.config.ping_time * (i + 1), f'+QPING: 0,"8.8.8.8",32,{time_ms},255')
+        self._send_urc_later(
+            self.config.ping_time * (count + 1),
+            f"+QPING: 0,{count},{count},0,{time_ms},{time_ms},{time_ms}",
+        )
+        return []
+
+    def _resolve(self, port: _SimulatedPort, args: str) -> Optional[List[str]]:
+        # AT+QIDNSGIP=<contextID>,"<hostname>", addresses come later as +QIURC: "dnsgip" URCs
+        if len(args.split(",")) < 2:
+            return None
+        self._send_urc_later(self.config.ping_time, '+QIURC: "dnsgip",0,1,600')
+        self._send_urc_later(self.config.ping_time * 2, '+QIURC: "dnsgip","142.250.79.46"')
+        return []
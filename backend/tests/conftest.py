@@ -0,0 +1,62 @@
+"""
+Fixtures shared by the tests, run from backend folder: python -m pytest
+Async tests use the anyio plugin installed with fastapi, on asyncio only.
+"""
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+
+import pytest
+from commonwealth.utils.Singleton import Singleton
+
+from cells.offline import OfflineCellIndex
+from cells.store import SeenCellsStore
+from modem import ATCommander, Modem
+from modem.discovery import ATPortIndex
+from modem.latency import ATLatencyTracker
+from modem.scheduler import ATPortScheduler
+from modem.usage import DataUsageStore
+from simulator import QuectelSimulator, SimulatorConfig
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path: Path) -> Iterator[None]:
+    """Every test gets its own persisted files in tmp_path, and no sessions, port queues or cached modem data"""
+    Singleton._instances.clear()
+    ATPortIndex(tmp_path / "at_ports.json")
+    ATLatencyTracker(tmp_path / "at_latency.json")
+    DataUsageStore(tmp_path / "usage")
+    SeenCellsStore(tmp_path / "seen_cells.db")
+    OfflineCellIndex(tmp_path / "opencellid.cells")
+    yield
+    ATCommander.close_all()
+    ATPortScheduler._schedulers.clear()
+    Modem._identities.clear()
+    Modem._registrations.clear()
+    DataUsageStore().close()
+    SeenCellsStore().close()
+    OfflineCellIndex().close()
+    Singleton._instances.clear()
+
+
+@pytest.fixture
+def simulator_config() -> SimulatorConfig:
+    """Fast simulator, modules override this fixture to test other quirks"""
+    return SimulatorConfig(latency=0.001, ping_time=0.01, reboot_time=0.1)
+
+
+@pytest.fixture
+async def simulator(simulator_config: SimulatorConfig) -> AsyncIterator[QuectelSimulator]:
+    with QuectelSimulator(simulator_config) as simulator:
+        yield simulator
+        # Sessions are closed while their event loop is still running
+        ATCommander.close_all()
+
+
+@pytest.fixture
+def modem(simulator: QuectelSimulator) -> Modem:
+    return next(modem for modem in Modem.connected_devices() if modem.device == simulator.device)
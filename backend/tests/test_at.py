@@ -0,0 +1,67 @@
+import pytest
+
+from modem.at import ATCommander, ATResultCode
+from simulator import QuectelSimulator, SimulatorConfig
+
+pytestmark = pytest.mark.anyio
+
+
+def at_port(simulator: QuectelSimulator) -> str:
+    return simulator.ports[2]
+
+
+async def test_setup_disables_echo_of_a_fresh_modem(simulator: QuectelSimulator) -> None:
+    assert simulator.echo
+
+    with await ATCommander.borrow(at_port(simulator)) as session:
+        response = await session.get_signal_strength()
+
+    assert simulator.received == ["AT", "ATE0", "AT+CSQ"]
+    assert not simulator.echo
+    assert response.status == ATResultCode.OK
+    assert response.data == [["22", "99"]]
+
+
+async def test_sessions_are_reused_between_borrows(simulator: QuectelSimulator) -> None:
+    with await ATCommander.borrow(at_port(simulator)) as first:
+        await first.check_ok()
+    with await ATCommander.borrow(at_port(simulator)) as second:
+        await second.check_ok()
+
+    assert first is second
+    assert ATCommander.is_ready(at_port(simulator))
+    # Setup ran only once
+    assert simulator.received == ["AT", "ATE0", "AT", "AT"]
+
+
+async def test_echo_is_disabled_again_on_every_setup(simulator: QuectelSimulator) -> None:
+    with await ATCommander.borrow(at_port(simulator)) as session:
+        await session.raw_command("AT&F", delay=None)
+    assert simulator.echo
+
+    # As after a RDY, the modem still answers AT but echo is back
+    session.synced = False
+    simulator.received.clear()
+    with await ATCommander.borrow(at_port(simulator)) as session:
+        response = await session.get_modem_functionality()
+
+    assert simulator.received == ["AT", "ATE0", "AT+CFUN?"]
+    assert not simulator.echo
+    assert response.data == [["1"]]
+
+
+@pytest.mark.parametrize(
+    "simulator_config",
+    [
+        SimulatorConfig(latency=0.001, s3=10, s4=13),
+        SimulatorConfig(latency=0.001, chunk_size=3),
+        SimulatorConfig(latency=0.001, echo=False, s4=13),
+    ],
+    ids=["swapped-terminators", "chunked", "no-echo-cr-terminators"],
+)
+async def test_responses_are_framed_whatever_the_terminators(simulator: QuectelSimulator) -> None:
+    with await ATCommander.borrow(at_port(simulator)) as session:
+        response = await session.get_operator_info()
+
+    assert response.status == ATResultCode.OK
+    assert response.data == [["0", "0", "VIVO", "7"]]
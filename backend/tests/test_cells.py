@@ -0,0 +1,211 @@
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import anyio
+import pytest
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+import cells.cells
+import cells.store
+from cells import CellFetcher
+from cells.store import SeenCellsStore
+from settings import CellLocationSettings
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeResponse:
+    def __init__(self, url: str, status: int, body: Any) -> None:
+        self.url = URL(url)
+        self.status = status
+        self._body = body
+
+    async def __aenter__(self) -> "FakeResponse":
+        # Answers on a later loop iteration, as requests sent at once are in flight together
+        await anyio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            request = aiohttp.RequestInfo(self.url, "GET", CIMultiDictProxy(CIMultiDict()), self.url)
+            raise aiohttp.ClientResponseError(request, (), status=self.status)
+
+    async def json(self, content_type: Optional[str] = "application/json") -> Any:
+        return self._body
+
+
+class FakeSession:
+    """OpenCelliD answering every request with the same status and JSON body"""
+
+    closed = False
+
+    def __init__(self, status: int = 200, body: Any = None) -> None:
+        self.status = status
+        self.body = body
+        self.urls: List[str] = []
+
+    def get(self, url: str, **kwargs: Any) -> FakeResponse:
+        self.urls.append(url)
+        return FakeResponse(url, self.status, self.body)
+
+
+def fake_opencellid(status: int = 200, body: Any = None) -> FakeSession:
+    session = FakeSession(status, body)
+    CellFetcher()._session = session  # type: ignore[assignment]
+    return session
+
+
+def location(latitude: float, longitude: float, radio: Optional[str] = "LTE") -> CellLocationSettings:
+    return CellLocationSettings(latitude=latitude, longitude=longitude, range=1000, radio=radio)
+
+
+def point(longitude: float, latitude: float, radio: str) -> Dict[str, Any]:
+    """GeoJSON feature of a cell, as returned by OpenCelliD getCells"""
+    return {
+        "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+        "properties": {"range": 500, "radio": radio},
+    }
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Dict[str, float]:
+    now = {"time": 1_000_000.0}
+    monkeypatch.setattr(cells.store, "time", SimpleNamespace(time=lambda: now["time"]))
+    return now
+
+
+def test_cells_are_found_by_identity_and_area() -> None:
+    store = SeenCellsStore()
+    store.put(724, 5, 20267, 1, location(-22.90, -43.20))
+    store.put(724, 5, 20267, 2, location(-22.95, -43.25, radio=None))
+    store.put(724, 5, 20267, 3, location(-23.50, -46.60))
+
+    assert store.get(724, 5, 20267, 2) == location(-22.95, -43.25, radio=None)
+    assert store.get(724, 5, 20267, 4) is None
+    assert sorted(key for key, _ in store.within(-23.0, -22.8, -43.3, -43.1)) == [
+        (724, 5, 20267, 1),
+        (724, 5, 20267, 2),
+    ]
+
+    # A cell seen again at another place moves in the index and keeps the radio it had
+    store.put(724, 5, 20267, 1, location(-23.51, -46.61, radio=None))
+    assert len(store) == 3
+    assert [key for key, _ in store.within(-23.0, -22.8, -43.3, -43.1)] == [(724, 5, 20267, 2)]
+    assert store.get(724, 5, 20267, 1) == location(-23.51, -46.61)
+
+
+def test_least_recently_seen_cells_are_evicted(clock: Dict[str, float]) -> None:
+    store = SeenCellsStore()
+    store.capacity = 10
+    for cell_id in range(10):
+        clock["time"] += 1
+        store.put(1, 1, 1, cell_id, location(cell_id / 100, cell_id / 100))
+
+    # Seen again, long enough after it was stored to be written
+    clock["time"] += cells.store.TOUCH_INTERVAL * 2
+    assert store.get(1, 1, 1, 0) is not None
+    store.put(1, 1, 1, 10, location(0.1, 0.1))
+
+    assert len(store) == 9
+    assert store.get(1, 1, 1, 1) is None and store.get(1, 1, 1, 2) is None
+    assert store.get(1, 1, 1, 0) is not None
+    assert sorted(key[3] for key, _ in store.within(-1, 1, -1, 1)) == [0, 3, 4, 5, 6, 7, 8, 9, 10]
+
+
+@pytest.mark.parametrize(
+    "status, body",
+    [(200, {"type": "Error", "message": "Invalid bbox"}), (200, None), (429, None)],
+    ids=["not-a-feature-collection", "empty", "rate-limited"],
+)
+async def test_nearby_cells_fall_back_to_seen_cells(status: int, body: Any) -> None:
+    SeenCellsStore().put(724, 5, 20267, 1, location(-22.901, -43.201))
+    fake_opencellid(status, body)
+
+    nearby = await CellFetcher().fetch_nearby_cells(-22.9, -43.2)
+
+    assert [(cell.latitude, cell.longitude, cell.radio.type) for cell in nearby] == [(-22.901, -43.201, "LTE")]
+
+
+async def test_nearby_cells_from_opencellid_are_not_repeated() -> None:
+    SeenCellsStore().put(724, 5, 20267, 1, location(-22.901, -43.201, radio=None))
+    fake_opencellid(body={
+        "type": "FeatureCollection",
+        "features": [point(-43.201, -22.901, "LTE"), point(-43.195, -22.905, "GSM")],
+    })
+
+    nearby = await CellFetcher().fetch_nearby_cells(-22.9, -43.2)
+
+    assert [(cell.latitude, cell.longitude, cell.range, cell.radio.type) for cell in nearby] == [
+        (-22.901, -43.201, 500, "LTE"),
+        (-22.905, -43.195, 500, "GSM"),
+    ]
+
+
+@pytest.fixture
+def monotonic(monkeypatch: pytest.MonkeyPatch) -> Dict[str, float]:
+    now = {"time": 1_000.0}
+    monkeypatch.setattr(cells.cells, "time", SimpleNamespace(monotonic=lambda: now["time"]))
+    return now
+
+
+async def test_concurrent_lookups_of_a_cell_share_one_request() -> None:
+    session = fake_opencellid(body={"lat": -22.9, "lon": -43.2, "range": 1000, "radio": "LTE"})
+    fetcher = CellFetcher()
+
+    results: List[Optional[CellLocationSettings]] = []
+
+    async def fetch() -> None:
+        results.append(await fetcher.fetch_cell(724, 5, 20267, 1))
+
+    async with anyio.create_task_group() as tasks:
+        for _ in range(10):
+            tasks.start_soon(fetch)
+
+    assert results == [location(-22.9, -43.2)] * 10
+    assert len(session.urls) == 1
+    # Then it is a seen cell
+    assert await fetcher.fetch_cell(724, 5, 20267, 1) == location(-22.9, -43.2)
+    assert len(session.urls) == 1
+
+
+async def test_unknown_cells_are_asked_again_after_a_growing_delay(monotonic: Dict[str, float]) -> None:
+    session = fake_opencellid(status=404)
+    fetcher = CellFetcher()
+
+    assert await fetcher.fetch_cell(724, 5, 20267, 1) is None
+    assert await fetcher.fetch_cell(724, 5, 20267, 1) is None
+    assert len(session.urls) == 1
+
+    monotonic["time"] += cells.cells.NEGATIVE_TTL
+    assert await fetcher.fetch_cell(724, 5, 20267, 1) is None
+    assert len(session.urls) == 2
+
+    # Second miss, twice the delay
+    monotonic["time"] += cells.cells.NEGATIVE_TTL
+    assert await fetcher.fetch_cell(724, 5, 20267, 1) is None
+    assert len(session.urls) == 2
+    monotonic["time"] += cells.cells.NEGATIVE_TTL
+    assert await fetcher.fetch_cell(724, 5, 20267, 1) is None
+    assert len(session.urls) == 3
+
+
+@pytest.mark.parametrize("status", [429, 401, 403, 500])
+async def test_refused_lookups_back_off_without_remembering_the_cell(monotonic: Dict[str, float], status: int) -> None:
+    session = fake_opencellid(status=status)
+    fetcher = CellFetcher()
+
+    assert await fetcher.fetch_cell(724, 5, 20267, 1) is None
+    # Other cells are not asked while backing off, and neither are nearby cells
+    assert await fetcher.fetch_cell(724, 5, 20267, 2) is None
+    assert await fetcher.fetch_nearby_cells(-22.9, -43.2) == []
+    assert len(session.urls) == 1
+
+    monotonic["time"] += cells.cells.UNREACHABLE_BACKOFF
+    session.status, session.body = 200, {"lat": -22.9, "lon": -43.2, "range": 1000, "radio": "LTE"}
+    assert await fetcher.fetch_cell(724, 5, 20267, 1) == location(-22.9, -43.2)
+    assert len(session.urls) == 2
@@ -0,0 +1,33 @@
+from modem.framer import ATLineFramer, split_fields
+
+
+def test_lines_are_emitted_once_complete() -> None:
+    framer = ATLineFramer()
+    assert framer.feed(b"\r\n+CSQ: 2") == []
+    assert framer.feed(b"2,99\r\n\r\nOK") == ["+CSQ: 22,99"]
+    assert framer.feed(b"\r\n") == ["OK"]
+
+
+def test_any_terminator_splits_and_empty_lines_are_dropped() -> None:
+    assert ATLineFramer().feed(b"\r\nATI\r\r\nQuectel\nEG25\r\n\r\n\r\nOK\r\n") == ["ATI", "Quectel", "EG25", "OK"]
+
+
+def test_response_split_in_chunks_gives_the_same_lines() -> None:
+    response = b'\r\n+QENG: "servingcell","NOCONN","LTE","FDD",724,05\r\n\r\nOK\r\n'
+    whole = ATLineFramer().feed(response)
+
+    framer = ATLineFramer()
+    chunked = [line for i in range(0, len(response), 3) for line in framer.feed(response[i:i + 3])]
+    assert chunked == whole == ['+QENG: "servingcell","NOCONN","LTE","FDD",724,05', "OK"]
+
+
+def test_clear_drops_a_partial_line() -> None:
+    framer = ATLineFramer()
+    framer.feed(b"+CSQ: 22")
+    framer.clear()
+    assert framer.feed(b"OK\r\n") == ["OK"]
+
+
+def test_split_fields_drops_quotes_and_missing_values() -> None:
+    line = '+QENG: "neighbourcell","GSM",512,3,-,-,48'
+    assert split_fields(line, len("+QENG:")) == ["neighbourcell", "GSM", "512", "3", None, None, "48"]
@@ -0,0 +1,87 @@
+import json
+from pathlib import Path
+
+import pytest
+from commonwealth.utils.Singleton import Singleton
+
+from modem.latency import (
+    DEFAULT_TIMEOUT,
+    MIN_SAMPLES,
+    TIMEOUT_CEILING,
+    TIMEOUT_FLOOR,
+    TIMEOUT_MARGIN,
+    ATLatencyTracker,
+    latency_key,
+)
+
+MODEL = "LTEEG25G"
+
+
+@pytest.mark.parametrize(
+    "command, key",
+    [
+        ("AT+CSQ", "AT+CSQ"),
+        ("AT+COPS=?", "AT+COPS=?"),
+        ('AT+QENG="servingcell"', 'AT+QENG="servingcell"'),
+        ('AT+CGDCONT=1,"IP","zap.vivo.com.br"', "AT+CGDCONT="),
+        ("AT+CFUN?\r\n", "AT+CFUN?"),
+    ],
+)
+def test_latency_key_groups_command_lines(command: str, key: str) -> None:
+    assert latency_key(command) == key
+
+
+def test_known_slow_commands_get_their_manual_timeout_until_learned() -> None:
+    tracker = ATLatencyTracker()
+    assert tracker.timeout(MODEL, "AT+CSQ") == DEFAULT_TIMEOUT
+    assert tracker.timeout(MODEL, "AT+COPS=?") == 180.0
+
+    for _ in range(MIN_SAMPLES - 1):
+        tracker.record(MODEL, "AT+CSQ", 0.5)
+    assert tracker.timeout(MODEL, "AT+CSQ") == DEFAULT_TIMEOUT
+
+
+def test_learned_timeout_is_clamped() -> None:
+    tracker = ATLatencyTracker()
+    for _ in range(MIN_SAMPLES):
+        tracker.record(MODEL, "AT+CSQ", 0.01)
+        tracker.record(MODEL, "AT+QENG=", 0.4)
+        tracker.record(MODEL, "AT+COPS=?", 100.0)
+
+    assert tracker.timeout(MODEL, "AT+CSQ") == TIMEOUT_FLOOR
+    assert tracker.timeout(MODEL, "AT+QENG=") == pytest.approx(0.4 * TIMEOUT_MARGIN)
+    assert tracker.timeout(MODEL, "AT+COPS=?") == TIMEOUT_CEILING
+
+
+def test_timeout_streaks_raise_the_timeout_in_steps_until_an_answer() -> None:
+    tracker = ATLatencyTracker()
+    for _ in range(MIN_SAMPLES):
+        tracker.record(MODEL, "AT+QENG=", 0.4)
+    learned = tracker.timeout(MODEL, "AT+QENG=")
+
+    timeouts = []
+    for _ in range(13):
+        tracker.record_timeout(MODEL, "AT+QENG=")
+        timeouts.append(tracker.timeout(MODEL, "AT+QENG="))
+    # A step every 3 timeouts in a row, 3 steps at most
+    assert timeouts == pytest.approx([learned] * 2 + [2 * learned] * 3 + [3 * learned] * 3 + [4 * learned] * 5)
+    assert tracker.timeout(MODEL, "AT+CSQ") == DEFAULT_TIMEOUT
+
+    tracker.record(MODEL, "AT+QENG=", 0.4)
+    assert tracker.timeout(MODEL, "AT+QENG=") == pytest.approx(learned)
+
+
+def test_only_latency_samples_are_persisted(tmp_path: Path) -> None:
+    tracker = ATLatencyTracker()
+    for _ in range(MIN_SAMPLES):
+        tracker.record(MODEL, "AT+QENG=", 0.4)
+    for _ in range(3):
+        tracker.record_timeout(MODEL, "AT+QENG=")
+    tracker.save()
+
+    saved = json.loads((tmp_path / "at_latency.json").read_text())
+    assert saved == {"models": {MODEL: {"AT+QENG=": [0.4] * MIN_SAMPLES}}}
+
+    Singleton._instances.pop(ATLatencyTracker)
+    reloaded = ATLatencyTracker(tmp_path / "at_latency.json")
+    assert reloaded.timeout(MODEL, "AT+QENG=") == pytest.approx(0.4 * TIMEOUT_MARGIN)
@@ -0,0 +1,145 @@
+import gzip
+import random
+from pathlib import Path
+from typing import AsyncIterator, Dict, Sequence, Tuple
+
+import pytest
+
+import cells.offline
+from cells import CellFetcher
+from cells.offline import OfflineCellIndex, import_opencellid
+
+pytestmark = pytest.mark.anyio
+
+HEADER = "radio,mcc,net,area,cell,unit,lon,lat,range,samples,changeable,created,updated,averageSignal"
+
+Cell = Tuple[int, int, int, int]
+
+
+def dataset(rows: int = 200) -> Dict[Cell, Tuple[float, float, str]]:
+    """Cells around Rio de Janeiro, spread over a few grid cells of the index"""
+    generator = random.Random(1)
+    cells_by_key = {}
+    while len(cells_by_key) < rows:
+        key = (
+            generator.choice([724, 722]),
+            generator.randint(0, 10),
+            generator.randint(0, 65535),
+            generator.randint(0, 2**28 - 1),
+        )
+        cells_by_key[key] = (
+            round(generator.uniform(-23.1, -22.7), 5),
+            round(generator.uniform(-43.5, -43.1), 5),
+            generator.choice(["GSM", "UMTS", "LTE"]),
+        )
+    return cells_by_key
+
+
+def write_dump(path: Path, cells_by_key: Dict[Cell, Tuple[float, float, str]], extra: Sequence[str] = ()) -> Path:
+    lines = [HEADER] + [
+        f"{radio},{mcc},{mnc},{lac},{cell_id},0,{longitude},{latitude},1000,5,1,0,0,0"
+        for (mcc, mnc, lac, cell_id), (latitude, longitude, radio) in cells_by_key.items()
+    ] + list(extra)
+    with gzip.open(path, "wt") as file:
+        file.write("\n".join(lines) + "\n")
+    return path
+
+
+@pytest.fixture
+def small_runs(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Many runs merged in several passes, as a full dump would be
+    monkeypatch.setattr(cells.offline, "RUN_SIZE", 7)
+    monkeypatch.setattr(cells.offline, "MERGE_FAN_IN", 2)
+
+
+def test_imported_cells_are_found_by_identity(tmp_path: Path, small_runs: None) -> None:
+    cells_by_key = dataset()
+    dump = write_dump(
+        tmp_path / "dump.csv.gz",
+        cells_by_key,
+        extra=[
+            # Repeated cell, unknown radio, 5G cell id too large for the index and a malformed row
+            "LTE,724,5,20267,27567116,0,-43.2,-22.9,1000,5,1,0,0,0",
+            "LTE,724,5,20267,27567116,0,-43.3,-22.8,1000,5,1,0,0,0",
+            "WIMAX,724,5,1,1,0,-43.2,-22.9,1000,5,1,0,0,0",
+            "NR,724,5,1,68719476735,0,-43.2,-22.9,1000,5,1,0,0,0",
+            "garbage line",
+        ],
+    )
+
+    assert import_opencellid(dump, tmp_path / "opencellid.cells") == len(cells_by_key) + 1
+    index = OfflineCellIndex()
+    index.reload()
+
+    assert len(index) == len(cells_by_key) + 1
+    for (mcc, mnc, lac, cell_id), (latitude, longitude, radio) in cells_by_key.items():
+        location = index.get(mcc, mnc, lac, cell_id)
+        assert location is not None
+        assert (location.latitude, location.longitude) == pytest.approx((latitude, longitude), abs=1e-4)
+        assert (location.range, location.radio) == (1000, radio)
+    assert index.get(724, 5, 20267, 27567116) is not None
+    assert index.get(724, 5, 1, 1) is None
+    assert index.get(724, 5, 20267, 27567117) is None
+
+
+def test_cells_within_a_box_are_the_ones_inside_it(tmp_path: Path, small_runs: None) -> None:
+    cells_by_key = dataset()
+    import_opencellid(write_dump(tmp_path / "dump.csv.gz", cells_by_key), tmp_path / "opencellid.cells")
+    index = OfflineCellIndex()
+    index.reload()
+
+    for box in [(-23.0, -22.8, -43.4, -43.2), (-22.95, -22.9, -43.31, -43.29), (-23.2, -22.6, -43.6, -43.0)]:
+        min_lat, max_lat, min_lon, max_lon = box
+        expected = sorted(
+            (latitude, longitude)
+            for latitude, longitude, _ in cells_by_key.values()
+            if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon
+        )
+        found = sorted((round(cell.latitude, 5), round(cell.longitude, 5)) for cell in index.within(*box))
+        assert found == pytest.approx(expected, abs=1e-4)
+    assert index.within(10.0, 11.0, 10.0, 11.0) == []
+
+
+def test_import_does_not_depend_on_run_size(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    folder = tmp_path / "import"
+    folder.mkdir()
+    dump = write_dump(folder / "dump.csv.gz", dataset())
+    import_opencellid(dump, folder / "single-run.cells")
+    monkeypatch.setattr(cells.offline, "RUN_SIZE", 3)
+    monkeypatch.setattr(cells.offline, "MERGE_FAN_IN", 3)
+    import_opencellid(dump, folder / "many-runs.cells")
+
+    # Only the import time in the header differs
+    header = cells.offline._HEADER.size
+    assert (folder / "single-run.cells").read_bytes()[header:] == (folder / "many-runs.cells").read_bytes()[header:]
+    # Temporary runs are removed
+    assert sorted(path.name for path in folder.iterdir()) == ["dump.csv.gz", "many-runs.cells", "single-run.cells"]
+
+
+async def test_uploaded_dataset_answers_nearby_cells(tmp_path: Path) -> None:
+    cells_by_key = dataset()
+    data = write_dump(tmp_path / "dump.csv.gz", cells_by_key).read_bytes()
+
+    async def chunks() -> AsyncIterator[bytes]:
+        for start in range(0, len(data), 1000):
+            yield data[start:start + 1000]
+
+    index = OfflineCellIndex()
+    await index.import_dataset(chunks(), mccs=[722])
+
+    info = index.info()
+    assert info.cells == sum(1 for mcc, *_ in cells_by_key if mcc == 722)
+    assert info.imported is not None and not info.importing
+    nearby = await CellFetcher().fetch_nearby_cells(-22.9, -43.3, range=0.2)
+    assert len(nearby) == info.cells
+
+
+def test_damaged_dataset_is_ignored(tmp_path: Path) -> None:
+    import_opencellid(write_dump(tmp_path / "dump.csv.gz", dataset()), tmp_path / "opencellid.cells")
+    with open(tmp_path / "opencellid.cells", "r+b") as file:
+        file.truncate(100)
+
+    index = OfflineCellIndex()
+    index.reload()
+    assert len(index) == 0
+    assert index.get(724, 5, 20267, 27567116) is None
@@ -0,0 +1,66 @@
+import anyio
+import pytest
+
+from modem import Modem
+from modem.at import ATCommand, ATCommander, ATDivider
+from modem.models import ModemRegistration, NetworkRegistrationStatus
+from simulator import QuectelSimulator
+
+pytestmark = pytest.mark.anyio
+
+
+async def registration_status(modem: Modem, status: NetworkRegistrationStatus) -> ModemRegistration:
+    """Registration once it reaches status, URCs arrive on their own after the command changing it"""
+    with anyio.fail_after(1):
+        while True:
+            registration = await modem.get_registration()
+            if registration.eps is not None and registration.eps.status == status:
+                return registration
+            await anyio.sleep(0.01)
+
+
+async def test_urcs_are_routed_to_subscribers_and_responses_to_commands(simulator: QuectelSimulator) -> None:
+    urc_port = simulator.ports[2]
+    with await ATCommander.borrow(urc_port) as session:
+        with session.subscribe("+CEREG:") as subscription:
+            await session.command(ATCommand.EPS_NETWORK_REGISTRATION, ATDivider.EQ, "2", cmd_id_response=False)
+            response = await session.command(ATCommand.EPS_NETWORK_REGISTRATION, ATDivider.QUESTION)
+            assert response.data == [["2", "1", "4F2B", "1A2B30C", "7"]]
+            assert subscription.pending() == []
+
+            await session.disable_modem()
+            urc = await subscription.get(timeout=1)
+
+    assert urc.line == "+CEREG: 0"
+    assert urc.data == ["0"]
+
+
+@pytest.mark.parametrize("urc_port", ["usbat", "usbmodem"])
+async def test_registration_is_tracked_from_urcs(simulator: QuectelSimulator, modem: Modem, urc_port: str) -> None:
+    simulator.urcport = urc_port
+
+    registration = await modem.get_registration()
+    assert registration.eps is not None and registration.cs is not None
+    assert registration.eps.status == NetworkRegistrationStatus.HOME
+    assert (registration.eps.area_code, registration.eps.cell_id) == ("4F2B", "1A2B30C")
+    assert simulator.received[-4:] == ["AT+CREG=2", "AT+CREG?", "AT+CEREG=2", "AT+CEREG?"]
+
+    sent = len(simulator.received)
+    await modem.get_registration()
+    assert len(simulator.received) == sent
+
+    await modem.disable()
+    registration = await registration_status(modem, NetworkRegistrationStatus.NOT_REGISTERED)
+    assert registration.cs is not None and registration.cs.status == NetworkRegistrationStatus.NOT_REGISTERED
+    assert simulator.received[sent:] == ["AT+CFUN=4,0"]
+
+
+async def test_registration_urcs_are_enabled_again_after_a_reboot(simulator: QuectelSimulator, modem: Modem) -> None:
+    await modem.get_registration()
+    await modem.reboot()
+
+    with anyio.fail_after(1):
+        while simulator.registration_urcs["AT+CEREG"] != 2:
+            await modem.get_registration()
+            await anyio.sleep(0.02)
+    assert simulator.received[-2:] == ["AT+CEREG=2", "AT+CEREG?"]
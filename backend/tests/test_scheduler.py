@@ -0,0 +1,76 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from modem.exceptions import ATConnectionTimeout
+from modem.scheduler import ATPortScheduler, ATPriority, at_priority
+
+pytestmark = pytest.mark.anyio
+
+I, D, B = ATPriority.INTERACTIVE, ATPriority.DIAGNOSTICS, ATPriority.BACKGROUND
+
+
+async def test_waiters_are_served_by_weighted_round_robin() -> None:
+    scheduler = ATPortScheduler.get("/dev/ttyUSB2")
+    await scheduler.acquire(I)
+    served: List[ATPriority] = []
+
+    async def use(priority: ATPriority) -> None:
+        await scheduler.acquire(priority)
+        served.append(priority)
+        scheduler.release()
+
+    tasks = [asyncio.ensure_future(use(priority)) for priority in [B] * 3 + [D] * 3 + [I] * 6]
+    await asyncio.sleep(0)
+    assert scheduler.load == 13
+
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    # 4 interactive, 2 diagnostics and 1 background per round, background is never starved
+    assert served == [I, I, I, I, D, D, B, I, I, D, B, B]
+    assert not scheduler.busy
+
+
+async def test_busy_port_times_out_and_leaves_the_queue() -> None:
+    scheduler = ATPortScheduler.get("/dev/ttyUSB2")
+    await scheduler.acquire()
+
+    with pytest.raises(ATConnectionTimeout):
+        await scheduler.acquire(timeout=0)
+    with pytest.raises(ATConnectionTimeout):
+        await scheduler.acquire(timeout=0.01)
+    assert scheduler.load == 1
+
+    scheduler.release()
+    await scheduler.acquire(timeout=0)
+    assert scheduler.stats().classes["interactive"].timeouts == 2
+
+
+async def test_task_priority_applies_to_its_borrows() -> None:
+    scheduler = ATPortScheduler.get("/dev/ttyUSB2")
+    await scheduler.acquire()
+    served: List[str] = []
+
+    async def background() -> None:
+        with at_priority(B):
+            await scheduler.acquire()
+        served.append("background")
+        scheduler.release()
+
+    async def interactive() -> None:
+        await scheduler.acquire()
+        served.append("interactive")
+        scheduler.release()
+
+    tasks = [asyncio.ensure_future(background()), asyncio.ensure_future(interactive())]
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    assert served == ["interactive", "background"]
+
+
+def test_least_loaded_port_keeps_order_on_ties() -> None:
+    assert ATPortScheduler.least_loaded(["/dev/ttyUSB2", "/dev/ttyUSB3"]) == "/dev/ttyUSB2"
+    ATPortScheduler.get("/dev/ttyUSB2").busy = True
+    assert ATPortScheduler.least_loaded(["/dev/ttyUSB2", "/dev/ttyUSB3"]) == "/dev/ttyUSB3"
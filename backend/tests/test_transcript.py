@@ -0,0 +1,62 @@
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+from serial.tools.list_ports_linux import SysFS
+
+from modem import ATCommander, LTEEG25G, Modem
+from modem.transcript import ATDirection, ATReplayTransport, ATTranscriptWriter, read_transcript
+from simulator import QuectelSimulator
+
+pytestmark = pytest.mark.anyio
+
+ROUNDS = 3
+
+
+async def run_rounds(modem: Modem) -> List[Tuple[object, object]]:
+    return [(await modem.get_signal_strength(), await modem.get_cell_info()) for _ in range(ROUNDS)]
+
+
+def signal_rounds_in(transcript: Path) -> int:
+    _, _, records = read_transcript(transcript)
+    return sum(1 for _, direction, payload in records if direction == ATDirection.TX and payload.startswith(b"AT+CSQ"))
+
+
+async def test_replay_of_a_recorded_session_gives_the_same_results(
+    simulator: QuectelSimulator, modem: Modem, tmp_path: Path
+) -> None:
+    ATCommander.record_transcripts(tmp_path)
+    try:
+        recorded = await run_rounds(modem)
+    finally:
+        ATCommander.record_transcripts(None)
+
+    transcript = max(tmp_path.glob("*.attr"), key=signal_rounds_in)
+    port, _, records = read_transcript(transcript)
+    assert port in simulator.ports
+    # Recording starts with the setup of the session
+    _, direction, payload = records[0]
+    assert (direction, payload.strip()) == (ATDirection.TX, b"AT")
+    assert signal_rounds_in(transcript) == ROUNDS
+
+    replay_port = f"replay:{transcript}"
+    ATCommander.set_transport(replay_port, lambda: ATReplayTransport(transcript, speed=0))
+    try:
+        replayed = await run_rounds(LTEEG25G(replay_port, [SysFS(replay_port)]))
+    finally:
+        ATCommander.set_transport(replay_port, None)
+
+    assert replayed == recorded
+
+
+def test_transcript_cut_in_a_record_keeps_the_complete_ones(tmp_path: Path) -> None:
+    writer = ATTranscriptWriter.for_port(tmp_path, "/dev/ttyUSB2")
+    writer.write(ATDirection.TX, b"AT+CSQ\r\n")
+    writer.write(ATDirection.RX, b"\r\n+CSQ: 22,99\r\n\r\nOK\r\n")
+    writer.close()
+    transcript = next(tmp_path.glob("*.attr"))
+    transcript.write_bytes(transcript.read_bytes()[:-5])
+
+    port, _, records = read_transcript(transcript)
+    assert port == "/dev/ttyUSB2"
+    assert [(direction, payload) for _, direction, payload in records] == [(ATDirection.TX, b"AT+CSQ\r\n")]
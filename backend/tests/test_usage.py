@@ -0,0 +1,128 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
+from cells.store import SeenCellsStore
+from modem.models import DataUsageBucket
+from modem.usage import DataUsageLog, DataUsageStore
+from settings import SettingsV2
+
+MODEM_ID = "869710030000001"
+
+
+def at(day: int, hour: int, minute: int = 0) -> float:
+    """Local time of October 2026, as buckets are aligned to local time"""
+    return datetime(2026, 10, day, hour, minute).timestamp()
+
+
+def fill(log: DataUsageLog) -> None:
+    log.append(100, 10, at(10, 8))
+    log.append(150, 20, at(10, 8, 30))
+    log.append(400, 50, at(10, 9, 15))
+    # Counters reset by the modem
+    log.append(30, 5, at(11, 7))
+
+
+def test_reads_are_counted_from_the_first_one_and_through_counter_resets(tmp_path: Path) -> None:
+    log = DataUsageLog(tmp_path, MODEM_ID)
+    fill(log)
+
+    points = log.history(float("-inf"), float("inf"), DataUsageBucket.RAW).points
+    assert [(point.rx, point.tx) for point in points] == [(100, 10), (50, 10), (250, 30), (30, 5)]
+    # A range starting after the first read counts from the read before it
+    points = log.history(at(10, 9), float("inf"), DataUsageBucket.RAW).points
+    assert [(point.timestamp, point.rx, point.tx) for point in points] == [(at(10, 9, 15), 250, 30), (at(11, 7), 30, 5)]
+
+
+def test_rollups_and_daily_totals(tmp_path: Path) -> None:
+    log = DataUsageLog(tmp_path, MODEM_ID)
+    fill(log)
+
+    hours = log.history(at(10, 0), float("inf"), DataUsageBucket.HOUR).points
+    assert [(point.timestamp, point.rx, point.tx) for point in hours] == [
+        (at(10, 8), 150, 20),
+        (at(10, 9), 250, 30),
+        (at(11, 7), 30, 5),
+    ]
+    assert log.daily_totals(at(10, 0)) == {"2026-10-10": (400, 50), "2026-10-11": (430, 55)}
+    assert log.daily_totals(at(11, 0)) == {"2026-10-11": (30, 5)}
+
+
+def test_current_buckets_are_rebuilt_from_the_log_on_start(tmp_path: Path) -> None:
+    log = DataUsageLog(tmp_path, MODEM_ID)
+    fill(log)
+    expected = log.history(float("-inf"), float("inf"), DataUsageBucket.HOUR)
+    log.close()
+
+    # A record cut by a crash is dropped
+    with open(tmp_path / f"{MODEM_ID}.usage", "ab") as file:
+        file.write(b"\x00" * 7)
+
+    reopened = DataUsageLog(tmp_path, MODEM_ID)
+    assert len(reopened) == 4
+    assert reopened.history(float("-inf"), float("inf"), DataUsageBucket.HOUR) == expected
+    reopened.append(50, 10, at(11, 7, 30))
+    assert reopened.daily_totals(at(11, 0)) == {"2026-10-11": (50, 10)}
+
+
+def test_daily_counters_are_imported_after_the_last_read(tmp_path: Path) -> None:
+    log = DataUsageLog(tmp_path, MODEM_ID)
+    log.append(100, 10, at(10, 12))
+    log.import_daily_counters({"2026-10-09": (50, 5), "2026-10-11": (300, 30), "2026-10-12": (500, 50)})
+
+    assert len(log) == 3
+    assert log.daily_totals(at(10, 0)) == {
+        "2026-10-10": (100, 10),
+        "2026-10-11": (300, 30),
+        "2026-10-12": (500, 50),
+    }
+
+
+def settings_v1(data_points: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "VERSION": 1,
+        "seen_cells": {"724": {"5": {"20267": {"27567116": {"latitude": -22.9, "longitude": -43.2, "range": 1000}}}}},
+        "modems": {
+            MODEM_ID: {
+                "identifier": MODEM_ID,
+                "configured": True,
+                "data_usage": {
+                    "data_control_enabled": True,
+                    "data_limit": 1000,
+                    "data_reset_day": 1,
+                    "last_reset_date": None,
+                    "data_used": [400, 40],
+                    "data_points": data_points,
+                },
+            }
+        },
+    }
+
+
+def test_migration_moves_usage_and_seen_cells_out_of_settings() -> None:
+    data = settings_v1({"2026-10-10": [100, 10], "2026-10-12": [400, 40]})
+    SettingsV2().migrate(data)
+    settings = SettingsV2(**data)
+
+    assert data["VERSION"] == SettingsV2.STATIC_VERSION
+    assert "seen_cells" not in settings.model_dump()
+    assert settings.modems[MODEM_ID].data_usage.model_dump() == {
+        "data_control_enabled": True,
+        "data_limit": 1000,
+        "data_reset_day": 1,
+        "last_reset_date": None,
+    }
+    cell = SeenCellsStore().get(724, 5, 20267, 27567116)
+    assert cell is not None and (cell.latitude, cell.longitude, cell.range) == (-22.9, -43.2, 1000)
+    assert DataUsageStore().log(MODEM_ID).daily_totals(float("-inf")) == {
+        "2026-10-10": (100, 10),
+        "2026-10-12": (400, 40),
+    }
+
+
+def test_migration_keeps_a_log_already_written() -> None:
+    DataUsageStore().log(MODEM_ID).append(700, 70, at(13, 12))
+
+    SettingsV2().migrate(settings_v1({"2026-10-10": [100, 10]}))
+
+    assert DataUsageStore().log(MODEM_ID).daily_totals(float("-inf")) == {"2026-10-13": (700, 70)}
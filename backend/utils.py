@@ -1,8 +1,24 @@
-from typing import Dict, List, Any, Type
+import functools
+from itertools import chain, repeat
+from typing import Dict, List, Any, Tuple, Type
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from serial.tools.list_ports_linux import SysFS, comports
 
+# Ports of modems the kernel does not list, like the simulator, by usb device path
+_virtual_descriptors: Dict[str, List[SysFS]] = {}
+
+
+def add_virtual_modem_descriptors(device: str, ports: List[SysFS]) -> None:
+    """
+    Lists the given ports under device path together with the ones found in sysfs.
+    """
+    _virtual_descriptors[device] = ports
+
+
+def remove_virtual_modem_descriptors(device: str) -> None:
+    _virtual_descriptors.pop(device, None)
+
 
 def get_modem_descriptors() -> Dict[str, List[SysFS]]:
     """
@@ -14,19 +30,45 @@ def get_modem_descriptors() -> Dict[str, List[SysFS]]:
         if port.usb_device_path is not None:
             modem_ports.setdefault(port.usb_device_path, []).append(port)
 
+    modem_ports.update(_virtual_descriptors)
     return modem_ports
 
 
-def arr_to_model(array: List[Any], model: Type) -> Any:
+class RowDecoder:
     """
-    Converts an array to a pydantic model by adding None values to the end of the array.
+    Converts AT response rows to a pydantic model, values are matched to fields by position and missing trailing
+    values are None. Field order and the validator of a list of rows are computed once per model.
     """
-    if not issubclass(model, BaseModel):
-        raise ValueError("Model must be a subclass of pydantic.BaseModel to be expanded")
 
-    data = array + [None] * (len(model.model_fields) - len(array))
+    def __init__(self, model: Type) -> None:
+        if not issubclass(model, BaseModel):
+            raise ValueError("Model must be a subclass of pydantic.BaseModel to be expanded")
+
+        self.model = model
+        self.fields: Tuple[str, ...] = tuple(model.model_fields)
+        self._list_adapter = TypeAdapter(List[model])  # type: ignore[valid-type]
 
-    return model(**dict(zip(list(model.model_fields), data)))
+    def _as_dict(self, row: List[Any]) -> Dict[str, Any]:
+        return dict(zip(self.fields, chain(row, repeat(None))))
+
+    def decode(self, row: List[Any]) -> Any:
+        return self.model.model_validate(self._as_dict(row))
+
+    def decode_many(self, rows: List[List[Any]]) -> List[Any]:
+        """Validates all rows in a single call"""
+        return self._list_adapter.validate_python([self._as_dict(row) for row in rows])
+
+
+@functools.lru_cache(maxsize=None)
+def row_decoder(model: Type) -> RowDecoder:
+    return RowDecoder(model)
+
+
+def arr_to_model(array: List[Any], model: Type) -> Any:
+    """
+    Converts an array to a pydantic model by adding None values to the end of the array.
+    """
+    return row_decoder(model).decode(array)
 
 
 def string_to_unicode_array(input_string: str, total_length: int) -> List[str]:
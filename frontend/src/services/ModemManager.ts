@@ -1,5 +1,7 @@
 import axios from 'axios'
 import {
+  CellCoordinate,
+  CellIdentity,
   CellLocation,
   DataUsageControls,
   DataUsageSettings,
@@ -233,6 +235,54 @@ export async function fetchCellCoordinates(
   return response.data as CellLocation
 }
 
+/**
+ * Locate many cells in one request. Streams NDJSON with one coordinate for each cell to the provided callback,
+ * cached cells first and the others as they are resolved. Returns when all cells are resolved.
+ * @param {CellIdentity[]} cells - Cells to locate
+ * @param {function} onCoordinate - Callback for each cell coordinate, location is null if it is not known
+ * @param {AbortSignal} signal - Optional abort signal to cancel the stream
+ */
+export async function streamCellsCoordinates(
+  cells: CellIdentity[],
+  onCoordinate: (coordinate: CellCoordinate) => void,
+  signal?: AbortSignal,
+): Promise<void> {
+  const response = await window.fetch(`${MODEM_MANAGER_V1_API}/cells/coordinates`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(cells),
+    signal,
+  })
+
+  if (!response.ok) {
+    throw new Error(`Failed to locate cells: ${response.statusText}`)
+  }
+
+  const reader = response.body!.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  // eslint-disable-next-line no-constant-condition
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n')
+    buffer = lines.pop()!
+
+    for (const line of lines) {
+      if (line.trim()) {
+        try {
+          onCoordinate(JSON.parse(line) as CellCoordinate)
+        } catch {
+          // Ignore malformed lines
+        }
+      }
+    }
+  }
+}
+
 export async function fetchNearbyCellsCoordinates(
   lat: number,
   lon: number,
@@ -320,5 +370,6 @@ export default {
   setPDPAuthenticationByProfileById,
   setDataUsageControlById,
   setUSBModeById,
+  streamCellsCoordinates,
   streamReport,
 };
@@ -240,6 +240,18 @@ export interface CellLocation {
   latitude: number
   longitude: number
   range: number
+  radio?: string | null
+}
+
+export interface CellIdentity {
+  mcc: number
+  mnc: number
+  lac: number
+  cell_id: number
+}
+
+export interface CellCoordinate extends CellIdentity {
+  location: CellLocation | null
 }
 
 export interface NearbyCellRadio {